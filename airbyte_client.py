@@ -1,4 +1,13 @@
+import asyncio
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+import urllib3
+from requests.adapters import HTTPAdapter
 
 RESPONSE_CODES = {
     200: "Operation successful",
@@ -7,6 +16,17 @@ RESPONSE_CODES = {
     422: "Invalid input",
 }
 
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = (5, 60)  # (connect, read) in seconds
+ROUTE_TIMEOUTS = {  # routes which launch a connector job on the Airbyte server need a much longer read timeout
+    'api/v1/sources/check_connection': (5, 600),
+    'api/v1/destinations/check_connection': (5, 600),
+    'api/v1/sources/discover_schema': (5, 900),
+}
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5  # seconds, doubled on every attempt
+MAX_BACKOFF = 30
+
 
 class AirbyteResponse:
     def __init__(self, response):
@@ -15,33 +35,156 @@ class AirbyteResponse:
             self.message = RESPONSE_CODES[response.status_code]
         else:
             self.message = "Error: Unrecognized response code"
-        self.payload = response.json()
+        try:
+            self.payload = response.json()
+        except ValueError:  # empty body, as returned by the delete routes, or an html error page from a proxy
+            self.payload = {}
         self.ok = response.ok
         # TODO: include the full response object
 
+    @classmethod
+    def from_payload(cls, payload):
+        """Builds a successful response around a payload served from a cache instead of the API"""
+
+        r = cls.__new__(cls)
+        r.status_code = 200
+        r.message = RESPONSE_CODES[200]
+        r.payload = payload
+        r.ok = True
+        return r
+
+
+def never_sent(error) -> bool:
+    """True if a request failed while connecting, so it can't have reached the server and is safe to send again"""
+
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, 'reason', reason)  # requests wraps urllib3's MaxRetryError, which wraps the cause
+    return isinstance(reason, (urllib3.exceptions.NewConnectionError, urllib3.exceptions.ConnectTimeoutError))
+
+
+def percentile(ordered, q):
+    """Nearest-rank percentile q (0 to 100) of an ordered, non-empty list"""
+
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class RouteStats:
+    """
+    Records every request sent to each route (retries included): its latency, status code (or the name of the
+    exception raised instead), and the bytes sent and received. Shared by the threads of a client.
+    """
+
+    def __init__(self):
+        self.routes = {}  # route -> {'latencies': [seconds], 'statuses': {status: count}, 'sent': n, 'received': n}
+        self.lock = threading.Lock()
+
+    def record(self, route, seconds, status, sent=0, received=0):
+        with self.lock:
+            entry = self.routes.setdefault(route, {'latencies': [], 'statuses': {}, 'sent': 0, 'received': 0})
+            entry['latencies'].append(seconds)
+            entry['statuses'][status] = entry['statuses'].get(status, 0) + 1
+            entry['sent'] += sent
+            entry['received'] += received
+
+    def summary(self) -> dict:
+        """Returns {route: counts, latency percentiles in seconds, bytes and status codes}, slowest route first"""
+
+        r = {}
+        with self.lock:
+            routes = {route: dict(entry, latencies=sorted(entry['latencies'])) for route, entry in self.routes.items()}
+        for route, entry in sorted(routes.items(), key=lambda item: -sum(item[1]['latencies'])):
+            latencies = entry['latencies']
+            r[route] = {'calls': len(latencies),
+                        'errors': sum(count for status, count in entry['statuses'].items()
+                                      if not isinstance(status, int) or status >= 400),
+                        'total_seconds': sum(latencies), 'p50': percentile(latencies, 50),
+                        'p95': percentile(latencies, 95), 'p99': percentile(latencies, 99), 'max': latencies[-1],
+                        'bytes_sent': entry['sent'], 'bytes_received': entry['received'],
+                        'status_codes': {str(status): count for status, count in entry['statuses'].items()}}
+        return r
+
 
 class AirbyteClient:
     """
     Handles interactions with the Airbyte API
+
+    All requests share one pooled, keep-alive session. Connection errors and 5xx responses are retried with jittered
+    exponential backoff. Routes which create objects are only retried on connection errors, since a 5xx response
+    does not guarantee the object was not created.
     """
 
-    def __init__(self, url):
+    def __init__(self, url, pool_size=DEFAULT_POOL_SIZE, timeouts=None, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF):
         self.airbyte_url = url.strip('/') + '/'
+        self.timeouts = {**ROUTE_TIMEOUTS, **(timeouts or {})}
+        self.retries = retries
+        self.backoff = backoff
+        self.discovery_cache = None  # optional cache.DiscoveryCache
+        self.stats = RouteStats()
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session = requests.Session()
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
         print('API connection is healthy: ' + repr(self.health_check().ok))
 
-    def get(self, relative_url) -> AirbyteResponse:
+    def close(self):
+        self.session.close()
+
+    def connection_stats(self) -> dict:
+        """Returns the number of new and reused connections made by this client's connection pool"""
+
+        new = requests_sent = 0
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                new += pool.num_connections
+                requests_sent += pool.num_requests
+        return {'new': new, 'reused': requests_sent - new}
+
+    def request(self, method, relative_url, payload=None, idempotent=True, timeout=None) -> requests.Response:
+        """
+        Sends a request over the pooled session, retrying connection errors and (for idempotent routes) 5xx responses.
+        Non-idempotent routes are only retried when the connection couldn't be made, since a request which was sent
+        before the connection dropped may have been carried out. Raises the last connection error once all retries are
+        exhausted. Every attempt is recorded in self.stats. timeout overrides the route's (connect, read) timeouts for
+        this call only.
+        """
+
         route = self.airbyte_url + relative_url
+        timeout = timeout or self.timeouts.get(relative_url, DEFAULT_TIMEOUT)
+        stats_route = relative_url[len('api/v1/'):] if relative_url.startswith('api/v1/') else relative_url
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                r = self.session.request(method, route, json=payload, timeout=timeout)
+            except requests.exceptions.RequestException as e:
+                self.stats.record(stats_route, time.perf_counter() - start, type(e).__name__)
+                if not isinstance(e, requests.exceptions.ConnectionError) or attempt >= self.retries \
+                        or not (idempotent or never_sent(e)):
+                    raise
+            else:
+                self.stats.record(stats_route, time.perf_counter() - start, r.status_code,
+                                  len(r.request.body or b'') if r.request is not None else 0, len(r.content or b''))
+                if not (idempotent and r.status_code >= 500) or attempt >= self.retries:
+                    return r
+            time.sleep(random.uniform(0, min(MAX_BACKOFF, self.backoff * 2 ** attempt)))
+            attempt += 1
+
+    def get(self, relative_url) -> AirbyteResponse:
         try:
-            r = requests.get(route)
-        except:
-            print('Error: Unable to connect to the Airbyte API at: ' + self.airbyte_url + ' using route ' + route)
+            r = self.request('GET', relative_url)
+        except requests.exceptions.RequestException:
+            print('Error: Unable to connect to the Airbyte API at: ' + self.airbyte_url + ' using route '
+                  + self.airbyte_url + relative_url)
             exit(2)
         return AirbyteResponse(r)
 
-    def post(self, relative_url, payload) -> AirbyteResponse:
-        route = self.airbyte_url + relative_url
-        r = requests.post(route, payload)
-        return AirbyteResponse(r)
+    def post(self, relative_url, payload=None, idempotent=True, timeout=None) -> AirbyteResponse:
+        return AirbyteResponse(self.request('POST', relative_url, payload, idempotent, timeout))
 
     def health_check(self):
         """Route: GET /v1/openapi"""
@@ -49,14 +192,11 @@ class AirbyteClient:
 
     def get_workspace_by_slug(self, slug='default'):
         """Route: POST /v1/workspaces/get_by_slug"""
-        return self.post('api/v1/workspaces/get_by_slug', dict(slug=slug))
+        return self.post('api/v1/workspaces/get_by_slug', {'slug': slug})
 
     def get_workspace_by_id(self, workspace_uuid):
         """Route: POST /v1/workspaces/get"""
-        uuid = None
-        route = self.airbyte_url + 'api/v1/workspaces/get'
-        r = requests.post(route, json={"workspace_id": uuid})
-        return AirbyteResponse(r)
+        return self.post('api/v1/workspaces/get', {'workspaceId': workspace_uuid})
 
     def list_workspaces(self):
         """Route: /v1/workspaces/list"""
@@ -64,98 +204,78 @@ class AirbyteClient:
 
     def get_source_definitions(self):
         """Route: /v1/source_definitions/list"""
-        route = self.airbyte_url + 'api/v1/source_definitions/list'
-        r = requests.post(route)
-        return AirbyteResponse(r)
+        return self.post('api/v1/source_definitions/list')
 
     def get_source_definition_connection_spec(self, source_definition_id):
         """Route: /v1/source_definition_specifications/get"""
-        route = self.airbyte_url + 'api/v1/source_definition_specifications/get'
-        r = requests.post(route, json={'sourceDefinitionId': source_definition_id})
-        return AirbyteResponse(r)
+        return self.post('api/v1/source_definition_specifications/get', {'sourceDefinitionId': source_definition_id})
 
     def get_destination_definitions(self):
         """Route: /v1/destination_definitions/list"""
-        route = self.airbyte_url + 'api/v1/destination_definitions/list'
-        r = requests.post(route)
-        return AirbyteResponse(r)
+        return self.post('api/v1/destination_definitions/list')
 
-    def check_source_connection(self, source_dto):
+    def check_source_connection(self, source_dto, timeout=None):
         """Route: POST /v1/sources/check_connection"""
-        route = self.airbyte_url + 'api/v1/sources/check_connection'
-        payload = {'sourceId': source_dto.source_id}
-        r = requests.post(route, json=payload)
-        if r.status_code == '404':
+        response = self.post('api/v1/sources/check_connection', {'sourceId': source_dto.source_id}, timeout=timeout)
+        if response.status_code == 404:
             print(source_dto.source_id + ': Unable to validate, source not found')
-        return AirbyteResponse(r)
+        return response
 
     def create_source(self, source_dto, workspace) -> AirbyteResponse:
         """ Route: POST /v1/sources/create"""
-        route = self.airbyte_url + 'api/v1/sources/create'
-        connection_spec = self.get_source_definition_connection_spec(source_dto.source_definition_id)
         payload = {'sourceDefinitionId': source_dto.source_definition_id,
                    'workspaceId': workspace['workspaceId'],
                    'connectionConfiguration': source_dto.connection_configuration,
                    'name': source_dto.name}
-        r = requests.post(route, json=payload)
-        return AirbyteResponse(r)
+        return self.post('api/v1/sources/create', payload, idempotent=False)
 
     def delete_source(self, source_dto):
         """Route: POST /v1/sources/delete"""
-        route = self.airbyte_url + 'api/v1/sources/delete'
         payload = {'sourceId': source_dto.source_id}
         print("Deleting source: " + source_dto.source_id)
-        r = requests.post(route, json=payload)
-        return r.ok  # TODO: should return an AirbyteResponse, but Airbyte API returns a different type for this route
+        return AirbyteResponse(self.request('POST', 'api/v1/sources/delete', payload))
 
     def get_configured_sources(self, workspace):
         """Route: POST /v1/sources/list"""
-        route = self.airbyte_url + 'api/v1/sources/list'
-        r = requests.post(route, json={'workspaceId': workspace['workspaceId']})
-        return AirbyteResponse(r)
+        return self.post('api/v1/sources/list', {'workspaceId': workspace['workspaceId']})
 
     def update_source(self, source_dto):
         """Route: POST /v1/sources/update"""
-        route = self.airbyte_url + 'api/v1/sources/update'
         payload = {'sourceId': source_dto.source_id,
                    'connectionConfiguration': source_dto.connection_configuration,
                    'name': source_dto.name}
-        r = requests.post(route, json=payload)
-        return AirbyteResponse(r)
+        return self.post('api/v1/sources/update', payload)
 
     def discover_source_schema(self, source_dto):
         """Route: POST /v1/sources/discover_schema"""
-        route = self.airbyte_url + 'api/v1/sources/discover_schema'
-        payload = {'sourceId': source_dto.source_id}
-        r = requests.post(route, json=payload)
-        return AirbyteResponse(r)
+        if self.discovery_cache is not None:
+            return self.discovery_cache.get_or_discover(source_dto, self.discover_source_schema_uncached)
+        return self.discover_source_schema_uncached(source_dto)
+
+    def discover_source_schema_uncached(self, source_dto):
+        return self.post('api/v1/sources/discover_schema', {'sourceId': source_dto.source_id})
 
-    def check_destination_connection(self, destination_dto):
+    def check_destination_connection(self, destination_dto, timeout=None):
         """Route: POST /v1/destinations/check_connection"""
-        route = self.airbyte_url + 'api/v1/destinations/check_connection'
-        payload = {'destinationId': destination_dto.destination_id}
-        r = requests.post(route, json=payload)
-        if r.status_code == '404':
+        response = self.post('api/v1/destinations/check_connection', {'destinationId': destination_dto.destination_id},
+                             timeout=timeout)
+        if response.status_code == 404:
             print(destination_dto.destination_id + ': Unable to validate, destination not found')
-        return AirbyteResponse(r)
+        return response
 
     def create_destination(self, destination_dto, workspace):
         """ Route: POST /v1/destinations/create"""
-        route = self.airbyte_url + 'api/v1/destinations/create'
         payload = {'destinationDefinitionId': destination_dto.destination_definition_id,
                    'workspaceId': workspace['workspaceId'],
                    'connectionConfiguration': destination_dto.connection_configuration,
                    'name': destination_dto.name}
-        r = requests.post(route, json=payload)
-        return AirbyteResponse(r)
+        return self.post('api/v1/destinations/create', payload, idempotent=False)
 
     def delete_destination(self, destination_dto):
         """Route: POST /v1/destinations/delete"""
-        route = self.airbyte_url + 'api/v1/destinations/delete'
         payload = {'destinationId': destination_dto.destination_id}
         print("Deleting destination: " + destination_dto.destination_id)
-        r = requests.post(route, json=payload)
-        return r.ok  # TODO: should return an AirbyteResponse, but Airbyte API returns a different type for this route
+        return AirbyteResponse(self.request('POST', 'api/v1/destinations/delete', payload))
 
     def list_destinations(self):
         """Route: POST /v1/destinations/list"""
@@ -163,25 +283,23 @@ class AirbyteClient:
 
     def get_configured_destinations(self, workspace):
         """Route: POST /v1/destinations/list"""
-        route = self.airbyte_url + 'api/v1/destinations/list'
-        r = requests.post(route, json={'workspaceId': workspace['workspaceId']})
-        return AirbyteResponse(r)
+        return self.post('api/v1/destinations/list', {'workspaceId': workspace['workspaceId']})
 
     def update_destination(self, destination_dto):
         """Route: POST /v1/destinations/update"""
-        route = self.airbyte_url + 'api/v1/destinations/update'
         payload = {'destinationId': destination_dto.destination_id,
                    'connectionConfiguration': destination_dto.connection_configuration,
                    'name': destination_dto.name}
-        r = requests.post(route, json=payload)
-        return AirbyteResponse(r)
+        return self.post('api/v1/destinations/update', payload)
 
     def create_connection(self, connection_dto, source_dto):
         """Route: POST /v1/connections/create"""
-        route = self.airbyte_url + 'api/v1/connections/create'
         if not connection_dto.sync_catalog:
-            source_schema = self.discover_source_schema(source_dto).payload
-            connection_dto.sync_catalog = source_schema['catalog']
+            discovery = self.discover_source_schema(source_dto)
+            if not discovery.ok:
+                print("Error: unable to discover the schema of source: " + source_dto.name)
+                return discovery
+            connection_dto.sync_catalog = discovery.payload['catalog']
         payload = {
             'name': connection_dto.name,
             'prefix': connection_dto.prefix,
@@ -191,16 +309,13 @@ class AirbyteClient:
             'syncCatalog': connection_dto.sync_catalog,
             'schedule': connection_dto.schedule
         }
-        r = requests.post(route, json=payload)
-        return AirbyteResponse(r)
+        return self.post('api/v1/connections/create', payload, idempotent=False)
 
     def delete_connection(self, connection_dto):
         """Route: POST /v1/connections/delete"""
-        route = self.airbyte_url + 'api/v1/connections/delete'
         payload = {'connectionId': connection_dto.connection_id}
         print("Deleting connection: " + connection_dto.connection_id)
-        r = requests.post(route, json=payload)
-        return r.ok
+        return AirbyteResponse(self.request('POST', 'api/v1/connections/delete', payload))
 
     def reset_conection(self):
         """Route: POST /v1/connections/reset"""
@@ -212,7 +327,6 @@ class AirbyteClient:
 
     def update_connection(self, connection_dto):
         """Route: POST /v1/connections/update"""
-        route = self.airbyte_url + 'api/v1/connections/update'
         payload = {
             'connectionId': connection_dto.connection_id,
             'prefix': connection_dto.prefix,
@@ -220,8 +334,7 @@ class AirbyteClient:
             'syncCatalog': connection_dto.sync_catalog,
             'schedule': connection_dto.schedule
         }
-        r = requests.post(route, json=payload)
-        return AirbyteResponse(r)
+        return self.post('api/v1/connections/update', payload)
 
     def get_connection_state(self):
         """Route: POST /v1/state/get"""
@@ -229,6 +342,102 @@ class AirbyteClient:
 
     def get_configured_connections(self, workspace):
         """Route: POST /v1/connections/list"""
-        route = self.airbyte_url + 'api/v1/connections/list'
-        r = requests.post(route, json={'workspaceId': workspace['workspaceId']})
-        return AirbyteResponse(r)
\ No newline at end of file
+        return self.post('api/v1/connections/list', {'workspaceId': workspace['workspaceId']})
+
+    def get_connection(self, connection_id):
+        """Route: POST /v1/connections/get"""
+        return self.post('api/v1/connections/get', {'connectionId': connection_id})
+
+
+class AsyncAirbyteClient:
+    """
+    Asyncio twin of AirbyteClient. Each route method is a coroutine which runs the matching AirbyteClient call on a
+    worker thread, sharing the wrapped client's connection pool. A semaphore bounds the number of requests in flight.
+    """
+
+    def __init__(self, client: AirbyteClient, concurrency=DEFAULT_POOL_SIZE):
+        self.client = client
+        self.airbyte_url = client.airbyte_url
+        self.concurrency = concurrency
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.semaphore = None  # created on first use, so it belongs to the running event loop
+
+    async def run(self, method, *args):
+        """Runs a blocking client method on the worker pool once a concurrency slot is free"""
+
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        async with self.semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, method, *args)
+
+    def close(self):
+        self.executor.shutdown()
+
+    async def health_check(self):
+        return await self.run(self.client.health_check)
+
+    async def get_workspace_by_slug(self, slug='default'):
+        return await self.run(self.client.get_workspace_by_slug, slug)
+
+    async def get_workspace_by_id(self, workspace_uuid):
+        return await self.run(self.client.get_workspace_by_id, workspace_uuid)
+
+    async def list_workspaces(self):
+        return await self.run(self.client.list_workspaces)
+
+    async def get_source_definitions(self):
+        return await self.run(self.client.get_source_definitions)
+
+    async def get_source_definition_connection_spec(self, source_definition_id):
+        return await self.run(self.client.get_source_definition_connection_spec, source_definition_id)
+
+    async def get_destination_definitions(self):
+        return await self.run(self.client.get_destination_definitions)
+
+    async def check_source_connection(self, source_dto):
+        return await self.run(self.client.check_source_connection, source_dto)
+
+    async def create_source(self, source_dto, workspace):
+        return await self.run(self.client.create_source, source_dto, workspace)
+
+    async def delete_source(self, source_dto):
+        return await self.run(self.client.delete_source, source_dto)
+
+    async def get_configured_sources(self, workspace):
+        return await self.run(self.client.get_configured_sources, workspace)
+
+    async def update_source(self, source_dto):
+        return await self.run(self.client.update_source, source_dto)
+
+    async def discover_source_schema(self, source_dto):
+        return await self.run(self.client.discover_source_schema, source_dto)
+
+    async def check_destination_connection(self, destination_dto):
+        return await self.run(self.client.check_destination_connection, destination_dto)
+
+    async def create_destination(self, destination_dto, workspace):
+        return await self.run(self.client.create_destination, destination_dto, workspace)
+
+    async def delete_destination(self, destination_dto):
+        return await self.run(self.client.delete_destination, destination_dto)
+
+    async def get_configured_destinations(self, workspace):
+        return await self.run(self.client.get_configured_destinations, workspace)
+
+    async def update_destination(self, destination_dto):
+        return await self.run(self.client.update_destination, destination_dto)
+
+    async def create_connection(self, connection_dto, source_dto):
+        return await self.run(self.client.create_connection, connection_dto, source_dto)
+
+    async def delete_connection(self, connection_dto):
+        return await self.run(self.client.delete_connection, connection_dto)
+
+    async def update_connection(self, connection_dto):
+        return await self.run(self.client.update_connection, connection_dto)
+
+    async def get_configured_connections(self, workspace):
+        return await self.run(self.client.get_configured_connections, workspace)
+
+    async def get_connection(self, connection_id):
+        return await self.run(self.client.get_connection, connection_id)
@@ -1,106 +1,226 @@
+import threading
+
+import utils
 import yaml
 
+from airbyte_dto_factory import SourceDto, DestinationDto, ConnectionDto
+from validation import ValidationRunner
+from wipe import WipeEngine
+
+DTO_KINDS = {SourceDto: 'sources', DestinationDto: 'destinations', ConnectionDto: 'connections'}
+YAML_BATCH_SIZE = 100  # objects per yaml.dump call in write_yaml
+
+
+class DtoIndex(dict):
+    """
+    A dict of DTOs keyed by id which also maintains an index of ids by name, so both lookups are constant time.
+    The name index is kept up to date as DTOs are inserted, replaced or removed through the usual dict methods and
+    operators, and copies (copy, |) are DtoIndexes too.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.ids_by_name = {}  # name -> {id: None}, used as an insertion ordered set
+        self.lock = threading.RLock()
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, dto_id, dto):
+        with self.lock:
+            if dto_id in self:
+                self._unindex(dto_id)
+            super().__setitem__(dto_id, dto)
+            self.ids_by_name.setdefault(dto.name, {})[dto_id] = None
+
+    def __delitem__(self, dto_id):
+        with self.lock:
+            self._unindex(dto_id)
+            super().__delitem__(dto_id)
+
+    def pop(self, dto_id, *default):
+        with self.lock:
+            if dto_id in self:
+                self._unindex(dto_id)
+            return super().pop(dto_id, *default)
+
+    def popitem(self):
+        with self.lock:
+            dto_id, dto = super().popitem()
+            self._unindex(dto_id, dto)
+            return dto_id, dto
+
+    def setdefault(self, dto_id, dto=None):
+        with self.lock:
+            if dto_id not in self:
+                self[dto_id] = dto
+            return self[dto_id]
+
+    def update(self, *args, **kwargs):
+        with self.lock:
+            for dto_id, dto in dict(*args, **kwargs).items():
+                self[dto_id] = dto
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __or__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        r = self.copy()
+        r.update(other)
+        return r
+
+    def __ror__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        r = DtoIndex(other)
+        r.update(self)
+        return r
+
+    def copy(self):
+        """A shallow copy, with a name index of its own"""
+
+        with self.lock:
+            return DtoIndex(self)
+
+    def clear(self):
+        with self.lock:
+            super().clear()
+            self.ids_by_name.clear()
+
+    def _unindex(self, dto_id, dto=None):
+        name = (dto or self[dto_id]).name
+        ids = self.ids_by_name.get(name)
+        if ids is not None:
+            ids.pop(dto_id, None)
+            if not ids:
+                del self.ids_by_name[name]
+
+    def has_name(self, name) -> bool:
+        return name in self.ids_by_name
+
+    def name_to_id(self, name):
+        """Returns the id of the first DTO inserted with the given name, or None if not found"""
+
+        ids = self.ids_by_name.get(name)
+        return next(iter(ids)) if ids else None
+
 
 class AirbyteConfigModel:
     def __init__(self):
-        self.sources = {}
-        self.destinations = {}
-        self.connections = {}
+        self.sources = DtoIndex()
+        self.destinations = DtoIndex()
+        self.connections = DtoIndex()
         self.workspaces = {}
         self.global_config = {}
 
+    def index_for(self, kind) -> DtoIndex:
+        """Returns the index holding the given kind ('sources', 'destinations' or 'connections') or type of DTO"""
+
+        if not isinstance(kind, str):
+            kind = DTO_KINDS[type(kind)]
+        return getattr(self, kind)
+
     def has(self, dto):
         """
         Determines if the AirbyteConfigModel, which should always match the airbyte deployment, contains a given dto.
-        The match is first attempted on id, and if no match is found, is attempted on name.
+        The match is first attempted on id, and if no match is found, is attempted on name. Only DTOs of the same kind
+        are considered.
         """
+
+        index = self.index_for(dto)
         dto_id, name = dto.get_identity()
-        if dto_id and dto_id in {**self.sources, **self.destinations, **self.connections}:
+        if dto_id and dto_id in index:
             return True
-        else:  # search on name
-            for x in {**self.sources, **self.destinations, **self.connections}.values():
-                if x.get_identity()[1] == name:
-                    return True
-            return False
+        return index.has_name(name)
 
-    def name_to_id(self, dto_name):
+    def deployed_id(self, dto):
         """
-        Uses the name of a DTO object to return the associated uuid, or None if not found
+        Returns the id of the deployed object a DTO refers to, matched as in has(), or None if there's none. An id
+        which isn't deployed, such as one left in config after its object was deleted, is ignored.
         """
 
-        for x in {**self.sources, **self.destinations, **self.connections}.values():
-            if x.get_identity()[1] == dto_name:
-                return x.get_identity()[0]
+        index = self.index_for(dto)
+        dto_id, name = dto.get_identity()
+        if dto_id and dto_id in index:
+            return dto_id
+        return index.name_to_id(name)
+
+    def name_to_id(self, dto_name, kind=None):
+        """
+        Uses the name of a DTO object to return the associated uuid, or None if not found.
+        kind ('sources', 'destinations' or 'connections') limits the lookup to one kind of DTO. Without it, sources,
+        destinations and connections are tried in that order.
+        """
+
+        for index in ([self.index_for(kind)] if kind else [self.sources, self.destinations, self.connections]):
+            dto_id = index.name_to_id(dto_name)
+            if dto_id is not None:
+                return dto_id
         return None
 
     def write_yaml(self, filename):
-        payload = {'sources': [source.to_payload() for source in self.sources.values()],
-                   'destinations': [destination.to_payload() for destination in self.destinations.values()],
-                   'connections': [connection.to_payload() for connection in self.connections.values()]}
+        """
+        Writes the model to filename as a config yaml. Objects are written a batch at a time rather than built into
+        one document first, so memory use doesn't grow with the size of the deployment.
+        """
+
         with open(filename, 'w') as yaml_file:
-            yaml.safe_dump(payload, yaml_file)
-
-    def wipe_sources(self, client):
-        """Removes all sources in self.sources from the deployment and the model"""
-
-        # TODO: delete_sources would ideally return an AirbyteResponse and not a bool.
-        removed = []
-        for source in self.sources.values():
-            if client.delete_source(source):
-                removed.append(source.source_id)
-            else:
-                print("AirbyteConfigModel.wipe_sources : Unable to delete source: " + repr(source))
-        for source_id in removed:
-            self.sources.pop(source_id)
-
-    def wipe_destinations(self, client):
-        """Removes all destinations in self.destinations from deployment and the model"""
-
-        removed = []
-        for destination in self.destinations.values():
-            if client.delete_destination(destination):
-                removed.append(destination.destination_id)
-            else:
-                print("AirbyteConfigModel.wipe_destinations : Unable to delete destination: " + repr(destination))
-        for destination_id in removed:
-            self.destinations.pop(destination_id)
-
-    def wipe_connections(self, client):
+            for kind in sorted(DTO_KINDS.values()):  # the key order safe_dump would use
+                dtos = list(self.index_for(kind).values())
+                if not dtos:
+                    yaml_file.write(kind + ': []\n')
+                    continue
+                yaml_file.write(kind + ':\n')
+                for i in range(0, len(dtos), YAML_BATCH_SIZE):
+                    yaml.dump([dto.to_payload() for dto in dtos[i:i + YAML_BATCH_SIZE]], yaml_file,
+                              Dumper=utils.YamlDumper)
+
+    def wipe_sources(self, client, engine=None):
+        """Removes all sources in self.sources, and their connections, from the deployment and the model"""
+
+        return self.wipe(client, ['sources'], engine)
+
+    def wipe_destinations(self, client, engine=None):
+        """Removes all destinations in self.destinations, and their connections, from deployment and the model"""
+
+        return self.wipe(client, ['destinations'], engine)
+
+    def wipe_connections(self, client, engine=None):
         """Removes all connections in self.connections from deployment and the model"""
 
-        removed = []
-        for connection in self.connections.values():
-            if client.delete_connection(connection):
-                removed.append(connection.connection_id)
-            else:
-                print("AirbyteConfigModel.wipe_connections : Unable to delete connection: " + repr(connection))
-        for connection_id in removed:
-            self.connections.pop(connection_id)
+        return self.wipe(client, ['connections'], engine)
+
+    def wipe(self, client, kinds, engine=None):
+        """
+        Removes every object of the given kinds from deployment and the model, connections first. Returns failures.
+        """
 
-    def validate(self, client):
+        return (engine or WipeEngine(client)).wipe(self, kinds)
+
+    def validate(self, client, runner=None):
         """this function validates the model and all included connectors"""
 
         print("Validating connectors...")
-        for source in self.sources.values():
-            response = client.check_source_connection(source).payload
-            print("Source is valid: " + source.source_id + ' ' + repr(response['jobInfo']['succeeded']))
-        for destination in self.destinations.values():
-            response = client.check_destination_connection(destination).payload
-            print("Destination is valid: " + destination.destination_id + ' ' + repr(response['jobInfo']['succeeded']))
-        for connection in self.connections.values():
-            pass  # TODO: implement connection validation
-
-    def validate_sources(self, client):
-        for source in self.sources.values():
-            response = client.check_source_connection(source).payload
-            print("Source is valid: " + source.source_id + ' ' + repr(response['jobInfo']['succeeded']))
-
-    def validate_destinations(self, client):
-        for destination in self.destinations.values():
-            response = client.check_destination_connection(destination).payload
-            print("Destination is valid: " + destination.destination_id + ' ' + repr(response['jobInfo']['succeeded']))
-
-    def validate_connections(self, client):
-        for connection in self.connections.values():
-            response = client.check_connection_connection(connection).payload
-            print("connection is valid: " + connection.connection_id + ' ' + repr(response['jobInfo']['succeeded']))
+        runner = runner or ValidationRunner(client)
+        self.validate_sources(client, runner)
+        self.validate_destinations(client, runner)
+        self.validate_connections(client, runner)
+
+    def validate_sources(self, client, runner=None):
+        """Checks every source, using the given ValidationRunner or a serial one. Returns the CheckResults."""
+
+        return (runner or ValidationRunner(client)).check_sources(self.sources.values())
+
+    def validate_destinations(self, client, runner=None):
+        """Checks every destination, using the given ValidationRunner or a serial one. Returns the CheckResults."""
+
+        return (runner or ValidationRunner(client)).check_destinations(self.destinations.values())
+
+    def validate_connections(self, client, runner=None):
+        """
+        Validates every connection by checking its source and destination, each unique one only once.
+        Returns the CheckResults of the connections.
+        """
+
+        return (runner or ValidationRunner(client)).check_connections(self.connections.values(), self)
@@ -1,8 +1,100 @@
+import hashlib
+import json
+import threading
+
+MASKED_SECRET = '**********'  # the value the Airbyte API returns in place of every secret
+
+
+class FrozenDict(dict):
+    """
+    A read-only dict. Copying returns the same object, so one instance can safely be shared by many DTOs.
+    """
+
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("FrozenDict is read-only")
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+
+class FrozenList(list):
+    """A read-only list, see FrozenDict"""
+
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("FrozenList is read-only")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = clear = extend = insert = pop = remove = reverse = sort = _read_only
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return FrozenList, (list(self),)
+
+
+def freeze(value):
+    """Returns a read-only copy of a json-like value"""
+
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return FrozenList(freeze(v) for v in value)
+    return value
+
+
+class SchemaInterner:
+    """
+    Keeps one shared, read-only copy of every distinct stream jsonSchema. Connections to sources of the same type
+    carry the same schemas, so with interning a large deployment holds each of them once instead of per connection.
+    """
+
+    def __init__(self):
+        self.schemas = {}  # sha1 of the canonical json -> FrozenDict
+        self.lock = threading.Lock()
+
+    def intern(self, schema):
+        if isinstance(schema, FrozenDict) or not isinstance(schema, dict):
+            return schema
+        key = hashlib.sha1(json.dumps(schema, sort_keys=True, default=str).encode()).hexdigest()
+        with self.lock:
+            if key not in self.schemas:
+                self.schemas[key] = freeze(schema)
+            return self.schemas[key]
+
+    def intern_catalog(self, sync_catalog):
+        """Swaps the jsonSchema of every stream in sync_catalog for its shared copy, in place. Returns sync_catalog."""
+
+        for item in (sync_catalog or {}).get('streams') or []:
+            stream = item.get('stream') if isinstance(item, dict) else None
+            if isinstance(stream, dict) and 'jsonSchema' in stream:
+                stream['jsonSchema'] = self.intern(stream['jsonSchema'])
+        return sync_catalog
+
+
 class SourceDto:
     """
     Data transfer object class for Source-type Airbyte abstractions
     """
 
+    __slots__ = ('source_definition_id', 'source_id', 'workspace_id', 'connection_configuration', 'name',
+                 'source_name', 'tags')
+
     def __init__(self):
         self.source_definition_id = None
         self.source_id = None
@@ -35,6 +127,9 @@ class DestinationDto:
     Data transfer object class for Destination-type Airbyte abstractions
     """
 
+    __slots__ = ('destination_definition_id', 'destination_id', 'workspace_id', 'connection_configuration', 'name',
+                 'destination_name', 'tags')
+
     def __init__(self):
         self.destination_definition_id = None
         self.destination_id = None
@@ -67,6 +162,9 @@ class ConnectionDto:
     Data transfer object class for Connection-type Airbyte abstractions
     """
 
+    __slots__ = ('connection_id', 'name', 'prefix', 'source_id', 'source_name', 'destination_id', 'destination_name',
+                 'sync_catalog', 'schedule', 'namespace_definition', 'status')
+
     def __init__(self):
         self.connection_id = None
         self.name = 'default'
@@ -106,6 +204,8 @@ class ConnectionGroupDto:
     relevant info for making a new ConnectionDto to a dict.
     """
 
+    __slots__ = ('group_name', 'prefix', 'source_tags', 'destination_tags', 'sync_catalog', 'schedule', 'status')
+
     def __init__(self):
         self.group_name = None
         self.prefix = ''
@@ -135,6 +235,9 @@ class StreamDto:
     Data transfer object class for the stream, belongs to the connection abstraction
     """
 
+    __slots__ = ('name', 'json_schema', 'supported_sync_modes', 'source_defined_cursor', 'default_cursor_field',
+                 'source_defined_primary_key', 'namespace')
+
     def __init__(self):
         self.name = None
         self.json_schema = {}
@@ -150,6 +253,8 @@ class StreamConfigDto:
     Data transfer object class for the stream configuration, belongs to the connection abstraction
     """
 
+    __slots__ = ('sync_mode', 'cursor_field', 'destination_sync_mode', 'primary_key', 'alias_name', 'selected')
+
     def __init__(self):
         self.sync_mode = None
         self.cursor_field = []
@@ -164,6 +269,8 @@ class WorkspaceDto:
     Data transfer object class for Workspace-type Airbyte abstractions
     """
 
+    __slots__ = ()
+
 
 class AirbyteDtoFactory:
     """
@@ -173,6 +280,46 @@ class AirbyteDtoFactory:
     def __init__(self, source_definitions, destination_definitions):
         self.source_definitions = source_definitions
         self.destination_definitions = destination_definitions
+        self.source_definition_index = None  # built on first use, see index_definitions
+        self.destination_definition_index = None
+        # (kind, connector name, definition id, object name) for every definition name or id which matched nothing
+        self.unknown_definitions = []
+        self.schema_interner = SchemaInterner()
+
+    @staticmethod
+    def index_definitions(definitions, id_key) -> dict:
+        """Indexes a definitions payload by connector name and by definition id"""
+
+        r = {'by_name': {}, 'by_id': {}}
+        for definition in definitions:
+            r['by_name'].setdefault(definition['name'], definition)
+            r['by_id'][definition[id_key]] = definition
+        return r
+
+    def get_source_definition_index(self) -> dict:
+        # built lazily rather than in __init__, so definitions are only fetched when a lookup actually needs them
+        if self.source_definition_index is None:
+            self.source_definition_index = self.index_definitions(self.source_definitions['sourceDefinitions'],
+                                                                  'sourceDefinitionId')
+        return self.source_definition_index
+
+    def get_destination_definition_index(self) -> dict:
+        if self.destination_definition_index is None:
+            self.destination_definition_index = self.index_definitions(
+                self.destination_definitions['destinationDefinitions'], 'destinationDefinitionId')
+        return self.destination_definition_index
+
+    def report_unknown_definitions(self) -> bool:
+        """
+        Prints every sourceName or destinationName, or definition id, that matched no definition. Returns True if there
+        were any.
+        """
+
+        for kind, connector_name, definition_id, name in self.unknown_definitions:
+            print("Error: no " + kind + " definition " + ("named " + repr(connector_name) if connector_name is not None
+                                                           else "with id " + repr(definition_id))
+                  + " (used by " + repr(name) + ")")
+        return len(self.unknown_definitions) > 0
 
     def populate_secrets(self, secrets, new_dtos):
         # TODO: Find a better way to deal with unpredictable naming in secrets v2
@@ -201,14 +348,22 @@ class AirbyteDtoFactory:
         if 'connectionConfiguration' in source:
             r.connection_configuration = source['connectionConfiguration']
         r.name = source['name']
-        r.source_name = source['sourceName']
         if 'sourceDefinitionId' in source:
             r.source_definition_id = source['sourceDefinitionId']
+        if 'sourceName' in source:
+            r.source_name = source['sourceName']
         else:
-            for definition in self.source_definitions['sourceDefinitions']:
-                if r.source_name == definition['name']:
-                    r.source_definition_id = definition['sourceDefinitionId']
-            # TODO: handle exception where no sourceDefinitionId matches the provided source name
+            definition = self.get_source_definition_index()['by_id'].get(r.source_definition_id)
+            if definition is None:
+                self.unknown_definitions.append(('source', None, r.source_definition_id, r.name))
+            else:
+                r.source_name = definition['name']
+        if r.source_definition_id is None and r.source_name is not None:
+            definition = self.get_source_definition_index()['by_name'].get(r.source_name)
+            if definition is None:
+                self.unknown_definitions.append(('source', r.source_name, None, r.name))
+            else:
+                r.source_definition_id = definition['sourceDefinitionId']
         if 'sourceId' in source:
             r.source_id = source['sourceId']
         if 'workspaceId' in source:
@@ -224,14 +379,23 @@ class AirbyteDtoFactory:
 
         r = DestinationDto()
         r.connection_configuration = destination['connectionConfiguration']
-        r.destination_name = destination['destinationName']
         r.name = destination['name']
         if 'destinationDefinitionId' in destination:
             r.destination_definition_id = destination['destinationDefinitionId']
+        if 'destinationName' in destination:
+            r.destination_name = destination['destinationName']
         else:
-            for definition in self.destination_definitions['destinationDefinitions']:
-                if r.destination_name == definition['name']:
-                    r.destination_definition_id = definition['destinationDefinitionId']
+            definition = self.get_destination_definition_index()['by_id'].get(r.destination_definition_id)
+            if definition is None:
+                self.unknown_definitions.append(('destination', None, r.destination_definition_id, r.name))
+            else:
+                r.destination_name = definition['name']
+        if r.destination_definition_id is None and r.destination_name is not None:
+            definition = self.get_destination_definition_index()['by_name'].get(r.destination_name)
+            if definition is None:
+                self.unknown_definitions.append(('destination', r.destination_name, None, r.name))
+            else:
+                r.destination_definition_id = definition['destinationDefinitionId']
         if 'destinationId' in destination:
             r.destination_id = destination['destinationId']
         if 'workspaceId' in destination:
@@ -261,7 +425,7 @@ class AirbyteDtoFactory:
         if 'name' in connection:
             r.name = connection['name']
         if 'syncCatalog' in connection:
-            r.sync_catalog = connection['syncCatalog']
+            r.sync_catalog = self.schema_interner.intern_catalog(connection['syncCatalog'])
         if 'status' in connection:
             r.status = connection['status']
         if 'namespaceDefinition' in connection:
@@ -279,7 +443,7 @@ class AirbyteDtoFactory:
         r = ConnectionGroupDto()
         r.group_name = connection_group['groupName']
         if 'syncCatalog' in connection_group:
-            r.sync_catalog = connection_group['syncCatalog']
+            r.sync_catalog = self.schema_interner.intern_catalog(connection_group['syncCatalog'])
         r.schedule = connection_group['schedule']
         r.status = connection_group['status']
         r.source_tags = connection_group['sourceTags']
@@ -0,0 +1,114 @@
+import gzip
+import json
+import time
+
+from airbyte_dto_factory import MASKED_SECRET
+
+BACKUP_FORMAT = 'topiary-backup'
+BACKUP_VERSION = 1
+BACKUP_EXTENSIONS = ('.jsonl.gz', '.jsonl')
+ID_ATTRIBUTES = {'sources': 'source_id', 'destinations': 'destination_id', 'connections': 'connection_id'}
+
+
+def is_backup_file(name) -> bool:
+    return name is not None and name.strip().lower().endswith(BACKUP_EXTENSIONS)
+
+
+def open_backup(filename, mode):
+    """Opens a backup file for text reading ('r') or writing ('w'), gzip compressed if it ends in .gz"""
+
+    if filename.strip().lower().endswith('.gz'):
+        return gzip.open(filename, mode + 't', compresslevel=6)
+    return open(filename, mode)
+
+
+def write_backup(airbyte_model, filename):
+    """
+    Writes the model to filename as JSON lines: a header, then one {'kind', 'payload'} line per object, sources and
+    destinations before the connections which refer to them. Objects are written one at a time, never as one document.
+    Returns the number of objects written.
+    """
+
+    count = 0
+    with open_backup(filename, 'w') as f:
+        f.write(json.dumps({'format': BACKUP_FORMAT, 'version': BACKUP_VERSION, 'created_at': time.time()}) + '\n')
+        for kind in ('sources', 'destinations', 'connections'):
+            for dto in airbyte_model.index_for(kind).values():
+                f.write(json.dumps({'kind': kind, 'payload': dto.to_payload()}, separators=(',', ':')) + '\n')
+                count += 1
+    return count
+
+
+def read_backup(filename):
+    """Yields (kind, payload) for every object in a backup file, reading one line at a time"""
+
+    with open_backup(filename, 'r') as f:
+        header = json.loads(f.readline() or '{}')
+        if header.get('format') != BACKUP_FORMAT or header.get('version') != BACKUP_VERSION:
+            raise ValueError(filename + " is not a topiary backup (version " + repr(BACKUP_VERSION) + ")")
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                yield entry['kind'], entry['payload']
+
+
+def has_masked_secret(value) -> bool:
+    """True if a connector configuration holds a masked secret at any depth"""
+
+    if isinstance(value, dict):
+        return any(has_masked_secret(x) for x in value.values())
+    if isinstance(value, list):
+        return any(has_masked_secret(x) for x in value)
+    return value == MASKED_SECRET
+
+
+def drop_masked_creates(dtos, airbyte_model) -> list:
+    """
+    Removes the sources and destinations which restoring would create with masked secrets from dtos, and returns
+    them. An update may send masked secrets, which Airbyte keeps as they are, but a create would store the mask as
+    the real credential.
+    """
+
+    r = []
+    for kind in ('sources', 'destinations'):
+        kept = []
+        for dto in dtos.get(kind, []):
+            if airbyte_model.deployed_id(dto) is None and has_masked_secret(dto.connection_configuration):
+                r.append(dto)
+            else:
+                kept.append(dto)
+        if kind in dtos:
+            dtos[kind] = kept
+    return r
+
+
+def build_restore_dtos(filename, dto_factory, airbyte_model, kinds) -> dict:
+    """
+    Reads a backup into DTOs ready to apply to a deployment. Ids which the deployment doesn't have (any more) are
+    cleared, so those objects are matched by name or created. Connections refer to their source and destination by
+    name, since restoring them may give them new ids.
+    """
+
+    builders = {'sources': dto_factory.build_source_dto, 'destinations': dto_factory.build_destination_dto,
+                'connections': dto_factory.build_connection_dto}
+    names = {'sources': {}, 'destinations': {}}  # backup id -> name, for every source and destination
+    r = {kind: [] for kind in kinds}
+    for kind, payload in read_backup(filename):
+        dto = builders[kind](payload)
+        dto_id, name = dto.get_identity()
+        if kind in names:
+            names[kind][dto_id] = name
+        if kind not in kinds:
+            continue
+        if dto_id not in airbyte_model.index_for(kind):
+            setattr(dto, ID_ATTRIBUTES[kind], None)
+        if kind == 'connections':
+            dto.source_name = dto.source_name or names['sources'].get(dto.source_id)
+            dto.destination_name = dto.destination_name or names['destinations'].get(dto.destination_id)
+            if dto.source_name:
+                dto.source_id = None
+            if dto.destination_name:
+                dto.destination_id = None
+        r[kind].append(dto)
+    return r
+
@@ -0,0 +1,167 @@
+"""
+Synthetic scale benchmark: runs sync, plan, export, validate and wipe against a local fake Airbyte server, and
+reports the wall time, API calls, calls per second and peak RSS of each phase as JSON.
+
+    python topiary.py bench 2000,10,2000 --concurrency 8 --report bench.json
+
+The origin gives the number of sources, destinations and connections. Reports are comparable across commits as long
+as the scale, catalog size and concurrency are the same.
+"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+from fake_server import FakeAirbyteServer
+
+try:
+    import resource
+except ImportError:  # Windows, where peak RSS isn't reported
+    resource = None
+
+BENCH_STREAMS = 25  # streams per connection catalog, roughly what a GitHub or HubSpot source discovers
+BENCH_PROPERTIES = 20  # properties per stream
+BENCH_SOURCE_TYPES = ['GitHub', 'Postgres', 'HubSpot']
+BENCH_DESTINATION_TYPES = ['Postgres', 'BigQuery']
+
+
+def parse_scale(scale):
+    """Parses 'sources,destinations,connections' into three ints, exiting if it isn't one"""
+
+    try:
+        sources, destinations, connections = [int(x) for x in scale.split(',')]
+    except ValueError:
+        print("Error: bench needs the scale as sources,destinations,connections, for example 2000,10,2000")
+        exit(2)
+    if connections > sources * destinations or min(sources, destinations) < 1:
+        print("Error: bench can't make " + repr(connections) + " connections between " + repr(sources)
+              + " sources and " + repr(destinations) + " destinations")
+        exit(2)
+    return sources, destinations, connections
+
+
+def synthetic_catalog(source_type) -> dict:
+    """A catalog as large as a real connector's. Sources of the same type share stream schemas."""
+
+    return {'streams': [{'stream': {'name': 'stream_' + repr(s),
+                                    'jsonSchema': {'type': 'object', 'properties': {
+                                        source_type.lower() + '_field_' + repr(p): {'type': ['null', 'string']}
+                                        for p in range(BENCH_PROPERTIES)}},
+                                    'supportedSyncModes': ['full_refresh', 'incremental'],
+                                    'sourceDefinedPrimaryKey': [['id']]},
+                         'config': {'syncMode': 'full_refresh', 'destinationSyncMode': 'append', 'selected': True,
+                                    'aliasName': 'stream_' + repr(s), 'cursorField': [], 'primaryKey': [['id']]}}
+                        for s in range(BENCH_STREAMS)]}
+
+
+def synthetic_config(sources, destinations, connections) -> dict:
+    """Connection i joins source i % sources to destination (i // sources) % destinations, so no pair repeats"""
+
+    source_types = [BENCH_SOURCE_TYPES[i % len(BENCH_SOURCE_TYPES)] for i in range(sources)]
+    catalogs = {x: synthetic_catalog(x) for x in BENCH_SOURCE_TYPES}
+    return {
+        'sources': [{'name': 'source-' + repr(i), 'sourceName': source_types[i],
+                     'connectionConfiguration': {'repository': 'org/repo-' + repr(i), 'access_token': 'token'}}
+                    for i in range(sources)],
+        'destinations': [{'name': 'destination-' + repr(i),
+                          'destinationName': BENCH_DESTINATION_TYPES[i % len(BENCH_DESTINATION_TYPES)],
+                          'connectionConfiguration': {'host': 'warehouse-' + repr(i), 'password': 'password'}}
+                         for i in range(destinations)],
+        'connections': [{'name': 'connection-' + repr(i), 'sourceName': 'source-' + repr(i % sources),
+                         'destinationName': 'destination-' + repr((i // sources) % destinations),
+                         'prefix': 'bench_', 'schedule': {'units': 24, 'timeUnit': 'hours'}, 'status': 'inactive',
+                         'syncCatalog': catalogs[source_types[i % sources]]}
+                        for i in range(connections)],
+    }
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far, or None where the resource module isn't available. ru_maxrss is
+    in KiB on Linux and in bytes on macOS.
+    """
+
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_phase(name, server, argv, run) -> dict:
+    """Runs topiary with argv, with its output captured, and measures it"""
+
+    calls_before = sum(server.calls.values())
+    output = io.StringIO()
+    exit_code = 0
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        try:
+            run(argv)
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else 2
+    seconds = time.perf_counter() - start
+    calls = sum(server.calls.values()) - calls_before
+    r = {'phase': name, 'seconds': round(seconds, 3), 'api_calls': calls,
+         'calls_per_second': round(calls / seconds, 1) if seconds else None, 'peak_rss_mb': peak_rss_mb(),
+         'exit_code': exit_code}
+    print(name.ljust(9) + '{:9.2f}s {:8d} calls {:9.1f} calls/s'.format(seconds, calls, r['calls_per_second'] or 0)
+          + (' {:8.1f} MB peak RSS'.format(r['peak_rss_mb']) if r['peak_rss_mb'] is not None else '')
+          + (' (exit ' + repr(exit_code) + ')' if exit_code else ''))
+    return r
+
+
+def run_bench(args, run) -> dict:
+    """
+    Runs every phase against a fresh fake server, calling run(argv) to invoke topiary for each. Returns the report.
+    Peak RSS is the high-water mark of the whole process, fake server included, so it never goes down between
+    phases; compare the same phase across commits.
+    """
+
+    sources, destinations, connections = parse_scale(args.origin)
+    concurrency = repr(args.concurrency)
+    report = {'commit': git_commit(), 'python': platform.python_version(), 'concurrency': args.concurrency,
+              'sources': sources, 'destinations': destinations, 'connections': connections,
+              'streams': BENCH_STREAMS, 'properties': BENCH_PROPERTIES, 'phases': []}
+    previous_cache_dir = os.environ.get('TOPIARY_CACHE_DIR')
+    with tempfile.TemporaryDirectory() as directory, FakeAirbyteServer() as server:
+        os.environ['TOPIARY_CACHE_DIR'] = os.path.join(directory, 'cache')  # start cold, every time
+        config = os.path.join(directory, 'config.yml')
+        start = time.perf_counter()
+        with open(config, 'w') as f:
+            yaml.dump(synthetic_config(sources, destinations, connections), f, Dumper=yaml.SafeDumper)
+        print("Generated " + repr(sources) + " sources, " + repr(destinations) + " destinations and "
+              + repr(connections) + " connections in " + '{:.1f}'.format(time.perf_counter() - start) + "s")
+        phases = [('sync', ['sync', config, '--target', server.url, '--all', '--concurrency', concurrency]),
+                  ('plan', ['plan', config, '--target', server.url, '--all']),
+                  ('export', ['sync', server.url, '--target', os.path.join(directory, 'export.yml'), '--all']),
+                  ('validate', ['validate', server.url, '--all', '--concurrency', concurrency]),
+                  ('wipe', ['wipe', server.url, '--all', '--concurrency', concurrency])]
+        try:
+            for name, argv in phases:
+                report['phases'].append(run_phase(name, server, argv, run))
+        finally:
+            if previous_cache_dir is None:
+                os.environ.pop('TOPIARY_CACHE_DIR', None)
+            else:
+                os.environ['TOPIARY_CACHE_DIR'] = previous_cache_dir
+    if args.report_file:
+        with open(args.report_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        print("Benchmark report written to: " + args.report_file)
+    return report
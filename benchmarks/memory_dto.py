@@ -0,0 +1,91 @@
+"""
+Peak RSS of holding a deployment's connections in memory, before and after compact DTOs and schema interning.
+
+    python benchmarks/memory_dto.py --connections 4000
+
+Each mode runs in its own process, so their peak RSS can be compared. 'before' keeps every connection's catalog as
+parsed, in a DTO with a per-instance __dict__, which is how connections were held before; 'after' builds them with
+AirbyteDtoFactory.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from airbyte_dto_factory import AirbyteDtoFactory  # noqa: E402
+
+
+class LegacyConnectionDto:
+    def __init__(self, connection):
+        self.connection_id = connection['connectionId']
+        self.name = connection['name']
+        self.prefix = connection['prefix']
+        self.source_id = connection['sourceId']
+        self.source_name = None
+        self.destination_id = connection['destinationId']
+        self.destination_name = None
+        self.sync_catalog = connection['syncCatalog']
+        self.schedule = connection['schedule']
+        self.namespace_definition = None
+        self.status = connection['status']
+
+
+def synthetic_connection(i, source_types, streams, properties) -> str:
+    """Returns connection i as the json the API would send. Connections to the same source type share schemas."""
+
+    source_type = i % source_types
+    catalog = {'streams': [{'stream': {'name': 'stream_' + repr(s),
+                                       'jsonSchema': {'type': 'object', 'properties': {
+                                           'field_' + repr(source_type) + '_' + repr(p): {'type': ['null', 'string']}
+                                           for p in range(properties)}},
+                                       'supportedSyncModes': ['full_refresh', 'incremental']},
+                            'config': {'syncMode': 'full_refresh', 'destinationSyncMode': 'append',
+                                       'aliasName': 'stream_' + repr(s), 'selected': True}}
+                           for s in range(streams)]}
+    return json.dumps({'connectionId': 'connection-' + repr(i), 'name': 'connection-' + repr(i), 'prefix': '',
+                       'sourceId': 'source-' + repr(i), 'destinationId': 'destination', 'status': 'active',
+                       'schedule': {'units': 24, 'timeUnit': 'hours'}, 'syncCatalog': catalog})
+
+
+def run_mode(args):
+    factory = AirbyteDtoFactory({'sourceDefinitions': []}, {'destinationDefinitions': []})
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    connections = []
+    for i in range(args.connections):
+        payload = json.loads(synthetic_connection(i, args.source_types, args.streams, args.properties))
+        connections.append(LegacyConnectionDto(payload) if args.mode == 'before'
+                           else factory.build_connection_dto(payload))
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'mode': args.mode, 'peak_rss_kb': peak, 'model_rss_kb': peak - baseline}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, default=4000)
+    parser.add_argument('--source-types', type=int, default=10, dest='source_types')
+    parser.add_argument('--streams', type=int, default=20)
+    parser.add_argument('--properties', type=int, default=30)
+    parser.add_argument('--mode', choices=['before', 'after'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.mode:
+        return run_mode(args)
+
+    results = {}
+    for mode in ('before', 'after'):
+        output = subprocess.run([sys.executable, __file__, '--mode', mode] + sys.argv[1:],
+                                check=True, capture_output=True, text=True).stdout
+        results[mode] = json.loads(output)
+    for mode in ('before', 'after'):
+        print(mode.ljust(8) + 'peak RSS ' + '{:,}'.format(results[mode]['peak_rss_kb']).rjust(12) + ' KB, model '
+              + '{:,}'.format(results[mode]['model_rss_kb']).rjust(12) + ' KB')
+    print('model memory reduced ' + '{:.1f}'.format(results['before']['model_rss_kb'] /
+                                                     max(1, results['after']['model_rss_kb'])) + 'x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""
+Micro-benchmarks of the CPU hot paths of large deployments: building DTOs, AirbyteConfigModel.has and name_to_id,
+write_yaml and ConfigValidator.validate_config. Each operation is timed over 100, 1k, 10k and 100k objects, and a
+power law t = c * n^k is fitted to the timings from 1k objects up, so a quadratic operation shows up as k near 2.
+
+    python benchmarks/micro.py --output curves.json
+
+Exits with status 1 if any operation's exponent or its cost per object at the largest size is over the limits in
+benchmarks/thresholds.json. Cost per object depends on the machine, so those limits are loose; the exponent
+doesn't, and is what catches an accidental O(n^2). tests/test_benchmarks.py checks the same limits at 1k and 5k
+objects, so a regression fails the test suite too.
+"""
+
+import argparse
+import gc
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from airbyte_config_model import AirbyteConfigModel  # noqa: E402
+from airbyte_dto_factory import AirbyteDtoFactory  # noqa: E402
+from config_validator import ConfigValidator  # noqa: E402
+
+SIZES = [100, 1000, 10000, 100000]
+FIT_MIN_SIZE = 1000  # smaller runs are mostly fixed overhead, which would flatten the fitted exponent
+THRESHOLDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thresholds.json')
+SOURCE_DEFINITIONS = {'sourceDefinitions': [{'sourceDefinitionId': 'github-definition', 'name': 'GitHub'}]}
+DESTINATION_DEFINITIONS = {'destinationDefinitions': [{'destinationDefinitionId': 'postgres-definition',
+                                                       'name': 'Postgres'}]}
+
+
+def source_payload(i) -> dict:
+    return {'sourceId': 'source-' + repr(i), 'name': 'source-' + repr(i), 'sourceName': 'GitHub',
+            'sourceDefinitionId': 'github-definition', 'workspaceId': 'workspace',
+            'connectionConfiguration': {'repository': 'org/repo-' + repr(i), 'access_token': '**********',
+                                        'start_date': '2020-01-01T00:00:00Z'}}
+
+
+def connection_payload(i, destinations) -> dict:
+    catalog = {'streams': [{'stream': {'name': name, 'jsonSchema': {'type': 'object', 'properties': {
+                                          'id': {'type': ['null', 'integer']}, 'title': {'type': ['null', 'string']}}},
+                                      'supportedSyncModes': ['full_refresh']},
+                            'config': {'syncMode': 'full_refresh', 'destinationSyncMode': 'append', 'selected': True,
+                                       'aliasName': name}} for name in ('issues', 'commits')]}
+    return {'connectionId': 'connection-' + repr(i), 'name': 'connection-' + repr(i), 'prefix': '',
+            'sourceId': 'source-' + repr(i), 'destinationId': 'destination-' + repr(i % destinations),
+            'status': 'active', 'schedule': {'units': 24, 'timeUnit': 'hours'}, 'syncCatalog': catalog}
+
+
+class Fixture:
+    """n sources and connections, and n // 10 destinations, as payloads, DTOs and a config"""
+
+    def __init__(self, n):
+        self.n = n
+        self.factory = AirbyteDtoFactory(SOURCE_DEFINITIONS, DESTINATION_DEFINITIONS)
+        self.destinations = destinations = max(1, n // 10)
+        self.source_payloads = [source_payload(i) for i in range(n)]
+        self.connection_payloads = self.fresh_connection_payloads()
+        self.model = AirbyteConfigModel()
+        for payload in self.source_payloads:
+            dto = self.factory.build_source_dto(payload)
+            self.model.sources[dto.source_id] = dto
+        self.lookups = []  # half by id, half by name only, as configs refer to deployed objects
+        for i in range(n):
+            dto = self.factory.build_source_dto(source_payload(i))
+            if i % 2:
+                dto.source_id = None
+            self.lookups.append(dto)
+        self.config = {
+            'sources': [{k: v for k, v in x.items() if k != 'sourceId'} for x in self.source_payloads],
+            'destinations': [{'name': 'destination-' + repr(i), 'destinationName': 'Postgres',
+                              'connectionConfiguration': {'host': 'db'}} for i in range(destinations)],
+            'connections': [{'name': x['name'], 'sourceName': 'source-' + repr(i),
+                             'destinationName': 'destination-' + repr(i % destinations), 'schedule': x['schedule'],
+                             'status': x['status']} for i, x in enumerate(self.connection_payloads)]}
+
+    def fresh_connection_payloads(self) -> list:
+        """Building a connection DTO interns its catalog's schemas in place, so every run needs payloads of its own"""
+
+        return [connection_payload(i, self.destinations) for i in range(self.n)]
+
+
+def operations(directory) -> dict:
+    """
+    Returns {name: operation(fixture)}, each doing its work once for every object of the fixture. An operation may
+    instead be a (setup(fixture), operation(prepared)) pair, where setup prepares its input outside the timing.
+    """
+
+    def write_yaml(fixture):
+        fixture.model.write_yaml(os.path.join(directory, 'sources.yml'))
+
+    def validate_config(fixture):
+        assert ConfigValidator().validate_config(fixture.config)
+
+    return {
+        'build_source_dto': lambda fixture: [fixture.factory.build_source_dto(x) for x in fixture.source_payloads],
+        'build_connection_dto': (lambda fixture: (fixture.factory, fixture.fresh_connection_payloads()),
+                                 lambda prepared: [prepared[0].build_connection_dto(x) for x in prepared[1]]),
+        'model_has': lambda fixture: [fixture.model.has(x) for x in fixture.lookups],
+        'model_name_to_id': lambda fixture: [fixture.model.name_to_id(x.name, 'sources') for x in fixture.lookups],
+        'write_yaml': write_yaml,
+        'validate_config': validate_config,
+    }
+
+
+def time_operation(operation, fixture) -> float:
+    """
+    Best of a few runs, fewer for large fixtures, in seconds. As in timeit, the garbage collector is off while timing:
+    otherwise a full collection over the fixture's millions of objects lands in one run or another at random.
+    """
+
+    setup, operation = operation if isinstance(operation, tuple) else (None, operation)
+    best = None
+    for _ in range(3 if fixture.n <= 10000 else 1):
+        prepared = setup(fixture) if setup else fixture
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            operation(prepared)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def fit_exponent(points) -> float:
+    """Least squares slope of log(seconds) against log(n), over the (n, seconds) points from FIT_MIN_SIZE up"""
+
+    points = [(math.log(n), math.log(max(seconds, 1e-9))) for n, seconds in points if n >= FIT_MIN_SIZE]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, y in points) / len(points)
+    mean_y = sum(y for x, y in points) / len(points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / sum((x - mean_x) ** 2 for x, y in points)
+
+
+def check(name, curve, thresholds) -> list:
+    """Returns a message for every threshold the curve of an operation is over"""
+
+    limits = thresholds.get(name, {})
+    r = []
+    if curve['exponent'] is not None and curve['exponent'] > limits.get('max_exponent', math.inf):
+        r.append(name + " scales as n^" + '{:.2f}'.format(curve['exponent']) + ", over the n^"
+                 + repr(limits['max_exponent']) + " allowed")
+    n, seconds = curve['points'][-1]
+    us_per_object = seconds / n * 1e6
+    if us_per_object > limits.get('max_us_per_object', math.inf):
+        r.append(name + " takes " + '{:.1f}'.format(us_per_object) + "us per object at n=" + repr(n)
+                 + ", over the " + repr(limits['max_us_per_object']) + "us allowed")
+    return r
+
+
+def run(sizes, thresholds, names=None) -> dict:
+    """Times every operation at every size allowed by its max_size threshold, and returns their curves"""
+
+    curves = {}
+    with tempfile.TemporaryDirectory() as directory:
+        ops = operations(directory)
+        for n in sizes:
+            fixture = Fixture(n)
+            for name, operation in ops.items():
+                if (names and name not in names) or n > thresholds.get(name, {}).get('max_size', math.inf):
+                    continue
+                seconds = time_operation(operation, fixture)
+                curves.setdefault(name, {'points': []})['points'].append((n, seconds))
+                print(name.ljust(22) + repr(n).rjust(7) + '{:10.4f}s {:8.2f}us per object'.format(
+                    seconds, seconds / n * 1e6))
+    for curve in curves.values():
+        curve['exponent'] = fit_exponent(curve['points'])
+    return curves
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=','.join(repr(x) for x in SIZES),
+                        help='comma separated fixture sizes (default: %(default)s)')
+    parser.add_argument('--only', help='comma separated operations to run (default: all)')
+    parser.add_argument('--thresholds', default=THRESHOLDS_FILE)
+    parser.add_argument('--output', help='writes the scaling curves to this .json file')
+    args = parser.parse_args()
+
+    with open(args.thresholds) as f:
+        thresholds = json.load(f)
+    curves = run([int(x) for x in args.sizes.split(',')], thresholds, args.only.split(',') if args.only else None)
+    failures = [message for name, curve in curves.items() for message in check(name, curve, thresholds)]
+    for name, curve in curves.items():
+        print(name.ljust(22) + ' exponent ' + ('{:.2f}'.format(curve['exponent'])
+                                               if curve['exponent'] is not None else 'n/a'))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(curves, f, indent=2)
+    for message in failures:
+        print("Error: " + message)
+    exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Throughput and peak memory of exporting and importing a config yaml, with the whole-document pure python path
+(yaml.safe_dump / yaml.safe_load) against AirbyteConfigModel.write_yaml and utils.load_yaml.
+
+    python benchmarks/yaml_io.py --connections 200
+
+Peak memory is measured with tracemalloc, in a separate pass from the timing, since tracing slows python down.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import yaml  # noqa: E402
+
+import utils  # noqa: E402
+from airbyte_config_model import AirbyteConfigModel  # noqa: E402
+from airbyte_dto_factory import AirbyteDtoFactory  # noqa: E402
+from memory_dto import synthetic_connection  # noqa: E402
+
+
+def build_model(args) -> AirbyteConfigModel:
+    factory = AirbyteDtoFactory({'sourceDefinitions': []}, {'destinationDefinitions': []})
+    model = AirbyteConfigModel()
+    for i in range(args.connections):
+        connection = factory.build_connection_dto(
+            json.loads(synthetic_connection(i, args.source_types, args.streams, args.properties)))
+        model.connections[connection.connection_id] = connection
+    return model
+
+
+def whole_document_dump(model, filename):
+    payload = {'sources': [x.to_payload() for x in model.sources.values()],
+               'destinations': [x.to_payload() for x in model.destinations.values()],
+               'connections': [json.loads(json.dumps(x.to_payload())) for x in model.connections.values()]}
+    with open(filename, 'w') as f:
+        yaml.safe_dump(payload, f)
+
+
+def whole_document_load(filename):
+    with open(filename, 'r') as f:
+        return yaml.safe_load(f)
+
+
+def measure(operation, objects) -> dict:
+    start = time.perf_counter()
+    operation()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    operation()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': round(elapsed, 3), 'objects_per_second': round(objects / elapsed, 1),
+            'peak_memory_mb': round(peak / 2 ** 20, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, default=200)
+    parser.add_argument('--source-types', type=int, default=10, dest='source_types')
+    parser.add_argument('--streams', type=int, default=10)
+    parser.add_argument('--properties', type=int, default=20)
+    args = parser.parse_args()
+
+    model = build_model(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'deployment.yml')
+        results = {
+            'libyaml': utils.YamlLoader is not yaml.SafeLoader,
+            'export_whole_document': measure(lambda: whole_document_dump(model, filename), args.connections),
+            'export_streaming': measure(lambda: model.write_yaml(filename), args.connections),
+            'import_pure_python': measure(lambda: whole_document_load(filename), args.connections),
+            'import_libyaml': measure(lambda: utils.load_yaml(filename), args.connections),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import utils
+from airbyte_client import AirbyteResponse
+
+DEFINITIONS_TTL = 24 * 60 * 60  # seconds
+
+
+def write_json_atomic(path, payload):
+    """Writes payload as JSON with utils.write_atomic, so an interrupted run never leaves a truncated cache behind"""
+
+    utils.write_atomic(path, json.dumps(payload).encode())
+
+
+def read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class DefinitionsCache:
+    """
+    On-disk cache of the source and destination definitions of one Airbyte deployment, keyed by its url.
+    Each kind of definition expires ttl seconds after it was fetched.
+    """
+
+    def __init__(self, airbyte_url, cache_dir=None, ttl=DEFINITIONS_TTL):
+        self.path = os.path.join(cache_dir or utils.cache_dir(), 'definitions-' + utils.url_key(airbyte_url) + '.json')
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+    def get(self, kind):
+        """Returns the cached payload for kind ('source_definitions' or 'destination_definitions'), or None"""
+
+        entry = (read_json(self.path) or {}).get(kind)
+        if entry is None or time.time() - entry['fetched_at'] > self.ttl:
+            return None
+        return entry['payload']
+
+    def put(self, kind, payload):
+        with self.lock:
+            cached = read_json(self.path) or {}
+            cached[kind] = {'fetched_at': time.time(), 'payload': payload}
+            write_json_atomic(self.path, cached)
+
+    def invalidate(self):
+        with self.lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class LazyDefinitions:
+    """
+    Stands in for a definitions payload. The payload is only loaded, by calling loader, the first time it is read.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self.payload = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            if self.payload is None:
+                self.payload = self.loader()
+            return self.payload
+
+    def __getitem__(self, key):
+        return self.load()[key]
+
+    def __contains__(self, key):
+        return key in self.load()
+
+
+class DiscoveryCache:
+    """
+    Caches the discovered schema of each source by source id and a hash of its connection configuration, so a
+    source shared by many new connections is discovered once per run. With persist, schemas are also kept on disk, and
+    a source whose configuration hasn't changed since an earlier run isn't discovered at all. With refresh, every
+    source is discovered again (once) instead of using the disk layer.
+    """
+
+    def __init__(self, cache_dir=None, persist=True, refresh=False):
+        self.schema_dir = os.path.join(cache_dir or utils.cache_dir(), 'schemas') if persist else None
+        if self.schema_dir:
+            os.makedirs(self.schema_dir, exist_ok=True)
+        self.refresh = refresh
+        self.payloads = {}
+        self.lock = threading.Lock()
+        self.key_locks = {}
+
+    def key(self, source_dto):
+        config = json.dumps(source_dto.connection_configuration, sort_keys=True, default=str)
+        return source_dto.source_id + '-' + hashlib.sha1(config.encode()).hexdigest()[:16]
+
+    def key_lock(self, key):
+        with self.lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    def get_or_discover(self, source_dto, discover):
+        """
+        Returns the discover_schema response for a source, calling discover(source_dto) only on a cache miss.
+        Concurrent callers for the same source wait for a single discovery. Failed discoveries are not cached.
+        """
+
+        key = self.key(source_dto)
+        with self.key_lock(key):
+            if key in self.payloads:
+                return AirbyteResponse.from_payload(self.payloads[key])
+            path = os.path.join(self.schema_dir, key + '.json') if self.schema_dir else None
+            if path and not self.refresh:
+                payload = read_json(path)
+                if payload is not None:
+                    self.payloads[key] = payload
+                    return AirbyteResponse.from_payload(payload)
+            response = discover(source_dto)
+            if response.ok:
+                self.payloads[key] = response.payload
+                if path:
+                    write_json_atomic(path, response.payload)
+            return response
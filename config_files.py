@@ -0,0 +1,196 @@
+import glob
+import hashlib
+import os
+import pickle
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import yaml
+
+import utils
+
+CONFIG_DIR_KINDS = ['sources', 'destinations', 'connections']  # one subdirectory of the config directory per kind
+WRITE_WORKERS = 8
+PARALLEL_PARSE_MIN = 8  # fewer changed files than this are parsed in-process, where starting workers costs more
+
+
+def shard_filename(dto) -> str:
+    """Returns a stable, filesystem-safe file name for a DTO: its name, plus the start of its id to keep it unique"""
+
+    dto_id, name = dto.get_identity()
+    safe_name = re.sub(r'[^A-Za-z0-9._]+', '-', name or '').strip('-.') or 'unnamed'
+    return safe_name + ('-' + dto_id[:8] if dto_id else '') + '.yml'
+
+
+def write_shard(path, text) -> bool:
+    """Writes text to path unless the file already holds exactly that. Returns True if the file was written."""
+
+    data = text.encode()
+    if os.path.exists(path) and os.path.getsize(path) == len(data):
+        with open(path, 'rb') as f:
+            if hashlib.sha1(f.read()).digest() == hashlib.sha1(data).digest():
+                return False
+    utils.write_atomic(path, data)
+    return True
+
+
+def write_config_dir(airbyte_model, directory, workers=WRITE_WORKERS) -> dict:
+    """
+    Writes the model to directory as one small config yaml per object, under sources/, destinations/ and
+    connections/. Each file is a valid config on its own. Files whose content hasn't changed are left untouched, and
+    files of objects no longer in the model are removed. Returns counts of the files written, unchanged and removed.
+    """
+
+    shards = {}  # path -> (kind, dto)
+    for kind in CONFIG_DIR_KINDS:
+        os.makedirs(os.path.join(directory, kind), exist_ok=True)
+        for dto in airbyte_model.index_for(kind).values():
+            shards[os.path.join(directory, kind, shard_filename(dto))] = (kind, dto)
+
+    def write(path):
+        kind, dto = shards[path]
+        return write_shard(path, yaml.dump({kind: [dto.to_payload()]}, Dumper=utils.YamlDumper))
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        written = list(executor.map(write, shards))
+    removed = 0
+    for kind in CONFIG_DIR_KINDS:
+        for filename in os.listdir(os.path.join(directory, kind)):
+            path = os.path.join(directory, kind, filename)
+            if utils.is_yaml(filename) and path not in shards:
+                os.remove(path)
+                removed += 1
+    return {'written': written.count(True), 'unchanged': written.count(False), 'removed': removed}
+
+
+def config_files_for(origin) -> list:
+    """Returns the .yml and .yaml files of a config directory or glob, in a stable order"""
+
+    if utils.is_config_dir(origin):
+        r = []
+        for root, dirs, files in os.walk(origin):
+            dirs.sort()
+            r.extend(os.path.join(root, filename) for filename in sorted(files) if utils.is_yaml(filename))
+        return r
+    return sorted(path for path in glob.glob(origin, recursive=True) if utils.is_yaml(path) and os.path.isfile(path))
+
+
+def parse_config_file(path):
+    return utils.load_yaml(path)
+
+
+class ParsedConfigCache:
+    """
+    Keeps the parsed content of every file of a multi-file config origin on disk, keyed by path, mtime and size, so
+    a later run only parses the files which changed since. Configs can hold secrets, so only the user can read it.
+    """
+
+    def __init__(self, origin, cache_dir=None):
+        self.path = os.path.join(cache_dir or utils.cache_dir(),
+                                 'config-' + utils.url_key(os.path.abspath(origin)) + '.pickle')
+
+    @staticmethod
+    def key(path):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self) -> dict:
+        """
+        Returns the cached entries, or {} if there are none to trust. Unpickling runs code, so a file which another
+        user wrote or could have modified, as in a shared $TOPIARY_CACHE_DIR, is ignored (and replaced on save).
+        """
+
+        try:
+            with open(self.path, 'rb') as f:
+                if not self.is_private(os.fstat(f.fileno())):
+                    print("Warning: ignoring config cache " + self.path + ", which other users can modify")
+                    return {}
+                return pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError, AttributeError):
+            return {}
+
+    @staticmethod
+    def is_private(stat) -> bool:
+        """True if the file is owned by the current user and only they can write it"""
+
+        if not hasattr(os, 'getuid'):  # Windows, where the cache is under the user's profile
+            return True
+        return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
+
+    def save(self, entries):
+        utils.write_atomic(self.path, pickle.dumps(entries, protocol=pickle.HIGHEST_PROTOCOL), mode=0o600)
+
+
+def parse_config_files(files, workers=None) -> list:
+    """Parses files, on a process pool when there are enough of them to be worth starting one"""
+
+    if len(files) < PARALLEL_PARSE_MIN:
+        return [parse_config_file(path) for path in files]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(parse_config_file, files, chunksize=max(1, len(files) // 32)))
+
+
+def read_config_files(origin, cache_dir=None, use_cache=True) -> dict:
+    """
+    Reads every config yaml of a directory or glob into a single config. Files unchanged since an earlier run come
+    from the ParsedConfigCache; the others are parsed in parallel. Names defined by more than one file are reported.
+    """
+
+    files = config_files_for(origin)
+    if not files:
+        print("Error: no .yml or .yaml config files found in " + origin)
+        exit(2)
+    cache = ParsedConfigCache(origin, cache_dir) if use_cache else None
+    cached = cache.load() if cache else {}
+    entries = {}
+    for path in files:
+        entry = cached.get(path)
+        if entry is not None and entry[0] == ParsedConfigCache.key(path):
+            entries[path] = entry
+    stale = [path for path in files if path not in entries]
+    for path, config in zip(stale, parse_config_files(stale)):
+        entries[path] = (ParsedConfigCache.key(path), config)
+    if cache and stale:
+        cache.save(entries)
+    print("Read " + repr(len(files)) + " config files (" + repr(len(stale)) + " parsed, "
+          + repr(len(files) - len(stale)) + " cached)")
+    return merge_configs([(path, entries[path][1]) for path in files])
+
+
+def config_name(key, item):
+    """Returns the name an entry of a config list is known by, or None for entries which aren't named"""
+
+    if key in ('sources', 'destinations', 'connections') and isinstance(item, dict):
+        return item.get('groupName') or item.get('name')
+    return None
+
+
+def merge_configs(configs) -> dict:
+    """
+    Merges (filename, config) pairs into one config. Lists, like sources, are concatenated; anything else may only be
+    set once. Exits if two files define the same name for the same kind, listing every such name.
+    """
+
+    merged = {}
+    defined_in = {}  # (key, name) -> filename
+    duplicates = []
+    for filename, config in configs:
+        for key, value in (config or {}).items():
+            if isinstance(value, list) and isinstance(merged.get(key, []), list):
+                for item in value:
+                    name = config_name(key, item)
+                    if name is not None:
+                        if (key, name) in defined_in:
+                            duplicates.append(key[:-1] + ' ' + repr(name) + ' is defined in both '
+                                              + defined_in[(key, name)] + ' and ' + filename)
+                        defined_in.setdefault((key, name), filename)
+                merged.setdefault(key, []).extend(value)
+            elif key not in merged:
+                merged[key] = value
+            else:
+                duplicates.append(filename + ' sets ' + repr(key) + ', which another config file already set')
+    for duplicate in duplicates:
+        print("Error: " + duplicate)
+    if duplicates:
+        exit(2)
+    return merged
@@ -23,37 +23,141 @@ CONNECTION_FIELDS = {  # {fieldName: is_required}
     "syncCatalog": False
 }
 
+CONNECTION_GROUP_FIELDS = {  # {fieldName: is_required}
+    "groupName": True,
+    "sourceTags": True,
+    "destinationTags": True,
+    "prefix": True,
+    "schedule": True,
+    "status": True,
+    "syncCatalog": False
+}
+
+CONNECTION_STATUSES = ('active', 'inactive', 'deprecated')
+
 
 class ConfigValidator:
 
     def __init__(self):
         self.config_is_good = True
+        self.errors = []
 
-    def validate_config(self, config: dict) -> bool:
+    def validate_config(self, config: dict, airbyte_model=None, deployed_kinds=None) -> bool:
         """Validates that a config read from yaml is valid. Validity here means:
             - all sources have required information specified (see above or Airbyte API docs)
             - all destinations have required information specified
+            - all connections and connection groups have required information and a known status
             - all connections refer to a valid source and a valid destination
+            - no two sources, destinations or connections share a name
+        References are resolved against the sources and destinations in config, and against airbyte_model (the
+        deployment) if one is given. deployed_kinds are the kinds airbyte_model was read for (all of them by default);
+        a reference to a kind which wasn't read can't be checked, and is accepted. Every error is reported, not just
+        the first.
         Not to be confused with the unrelated --validate command line argument
         """
 
-        if 'sources' in config:
-            for source in config['sources']:
-                if not self.check_source(source):  # if source is not valid
-                    print("Error: invalid source")
-                    print(repr(source))
-                    self.config_is_good = False
-        if 'destinations' in config:
-            for destination in config['destinations']:
-                if not self.check_destination(destination):
-                    print("Error: invalid destination")
-                    print(repr(destination))
-                    self.config_is_good = False
-        if 'connections' in config and not ('sources' in config and 'destinations' in config):
-            print("Error: Connections can't be defined without at least one valid source and one valid destination")
-            self.config_is_good = False
+        self.errors = []
+        if not isinstance(config, dict):
+            self.errors.append("config is empty or not a mapping")
+        else:
+            source_names, source_ids = self.index_entries(config, 'sources', 'sourceId', SOURCE_FIELDS)
+            destination_names, destination_ids = self.index_entries(config, 'destinations', 'destinationId',
+                                                                    DESTINATION_FIELDS)
+            connection_names = set()
+            for position, connection in enumerate(config.get('connections') or []):
+                label = self.label('connection', position, connection)
+                if isinstance(connection, dict) and 'groupName' in connection:
+                    self.check_group(label, connection)
+                    continue
+                if isinstance(connection, dict):
+                    connection = self.named_references(connection)
+                if not self.check_entry(label, connection, CONNECTION_FIELDS):
+                    continue
+                self.check_status(label, connection)
+                self.check_unique(label, connection.get('name'), connection_names)
+                for kind, names, ids in (('source', source_names, source_ids),
+                                         ('destination', destination_names, destination_ids)):
+                    if airbyte_model is None or deployed_kinds is None or kind + 's' in deployed_kinds:
+                        self.check_reference(label, connection, kind, names, ids, airbyte_model)
+        for error in self.errors:
+            print("Error: " + error)
+        self.config_is_good = self.config_is_good and not self.errors
         return self.config_is_good
 
+    def index_entries(self, config, key, id_field, fields):
+        """Checks every source or destination in config, and returns the set of their names and the set of their ids"""
+
+        names, ids = set(), set()
+        for position, entry in enumerate(config.get(key) or []):
+            label = self.label(key[:-1], position, entry)
+            if self.check_entry(label, entry, fields):
+                self.check_unique(label, entry['name'], names)
+                if entry.get(id_field):
+                    ids.add(entry[id_field])
+        return names, ids
+
+    @staticmethod
+    def label(kind, position, entry) -> str:
+        name = (entry.get('groupName') or entry.get('name')) if isinstance(entry, dict) else None
+        return kind + ' #' + repr(position + 1) + (' ' + repr(name) if name else '')
+
+    def check_entry(self, label, entry, fields) -> bool:
+        if not isinstance(entry, dict):
+            self.errors.append(label + " is not a mapping")
+            return False
+        if not self.check_required(entry, fields):
+            missing = [x for x in fields if fields[x] is True and x not in entry]
+            self.errors.append(label + " is missing " + ', '.join(missing))
+            return False
+        return True
+
+    @staticmethod
+    def named_references(connection_dict) -> dict:
+        """A sourceId or destinationId stands in for the sourceName or destinationName, as in configs synced to yaml"""
+
+        r = connection_dict
+        for kind in ('source', 'destination'):
+            if r.get(kind + 'Id') and kind + 'Name' not in r:
+                r = dict(r, **{kind + 'Name': None})
+        return r
+
+    def check_unique(self, label, name, seen):
+        if name is None:
+            return
+        if name in seen:
+            self.errors.append(label + " has the same name as an earlier one")
+        seen.add(name)
+
+    def check_status(self, label, connection):
+        if connection['status'] not in CONNECTION_STATUSES:
+            self.errors.append(label + " has status " + repr(connection['status']) + ", expected one of "
+                               + ', '.join(CONNECTION_STATUSES))
+
+    def check_group(self, label, group):
+        if self.check_entry(label, group, CONNECTION_GROUP_FIELDS):
+            self.check_status(label, group)
+            for field in ('sourceTags', 'destinationTags'):
+                if not isinstance(group[field], list) or not group[field]:
+                    self.errors.append(label + " needs a non-empty list of " + field)
+
+    def check_reference(self, label, connection, kind, names, ids, airbyte_model):
+        """
+        Checks that a connection's sourceId/sourceName (or destinationId/destinationName) refers to something. An id
+        which isn't in config can only be checked against the deployment; a name may be in either.
+        """
+
+        dto_id, name = connection.get(kind + 'Id'), connection.get(kind + 'Name')
+        index = airbyte_model.index_for(kind + 's') if airbyte_model is not None else None
+        if dto_id:
+            if dto_id in ids or index is None or dto_id in index:
+                return
+            self.errors.append(label + " refers to " + kind + "Id " + repr(dto_id) + ", which doesn't exist")
+        elif name is None:
+            self.errors.append(label + " needs a " + kind + "Name or " + kind + "Id")
+        elif name not in names and not (index is not None and index.has_name(name)):
+            self.errors.append(label + " refers to " + kind + " " + repr(name) + ", which isn't "
+                               + ("in config or deployed" if index is not None else "defined in config"))
+
     def check_secrets(self, secrets):  # TODO: On hold for secrets v2
         pass
 
@@ -64,7 +168,10 @@ class ConfigValidator:
         return self.check_required(destination_dict, DESTINATION_FIELDS)
 
     def check_connection(self, connection_dict) -> bool:
-        return self.check_required(connection_dict, CONNECTION_FIELDS)
+        return self.check_required(self.named_references(connection_dict), CONNECTION_FIELDS)
+
+    def check_connection_group(self, group_dict) -> bool:
+        return self.check_required(group_dict, CONNECTION_GROUP_FIELDS)
 
     def check_required(self, input_dict: dict, parameters: dict) -> bool:
         """
@@ -0,0 +1,91 @@
+from airbyte_dto_factory import ConnectionDto
+
+
+class TagIndex:
+    """
+    Inverted index from each tag to the names of the sources (or destinations) carrying it, in the order they were
+    added. Finding everything with a set of tags intersects their posting lists, starting from the shortest, instead of
+    testing every object against the tags.
+    """
+
+    def __init__(self):
+        self.postings = {}  # tag -> {name: None}, an ordered set
+
+    def add(self, name, tags):
+        for tag in tags or []:
+            self.postings.setdefault(tag, {})[name] = None
+
+    def match(self, tags) -> list:
+        """Returns the names carrying every one of tags. No tags match nothing."""
+
+        if not tags:
+            return []
+        postings = sorted((self.postings.get(tag, {}) for tag in set(tags)), key=len)
+        return [name for name in postings[0] if all(name in posting for posting in postings[1:])]
+
+
+def build_tag_indexes(dtos_from_config, airbyte_model):
+    """Indexes the tags of the sources and destinations in config, and of any deployed ones which carry tags"""
+
+    source_index, destination_index = TagIndex(), TagIndex()
+    for index, kind in ((source_index, 'sources'), (destination_index, 'destinations')):
+        for dto in list(airbyte_model.index_for(kind).values()) + dtos_from_config.get(kind, []):
+            index.add(dto.name, dto.tags)
+    return source_index, destination_index
+
+
+def connection_pair(connection, airbyte_model):
+    """Returns (source name, destination name) for a connection given by ids, names or both. Known ids win."""
+
+    source = airbyte_model.sources.get(connection.source_id)
+    destination = airbyte_model.destinations.get(connection.destination_id)
+    return (source.name if source else connection.source_name,
+            destination.name if destination else connection.destination_name)
+
+
+def expand_connection_groups(dtos_from_config, airbyte_model) -> list:
+    """
+    Expands every group in dtos_from_config['connectionGroups'] into one ConnectionDto per pair of a source carrying
+    all its sourceTags and a destination carrying all its destinationTags. A pair already connected in config, or by
+    an earlier group, is skipped. A pair already connected in the deployment becomes an update of that connection,
+    keeping its id and name, rather than a second connection. Returns the new ConnectionDtos.
+    """
+
+    groups = dtos_from_config.get('connectionGroups', [])
+    if not groups:
+        return []
+    source_index, destination_index = build_tag_indexes(dtos_from_config, airbyte_model)
+    configured = {connection_pair(x, airbyte_model) for x in dtos_from_config.get('connections', [])}
+    deployed = {connection_pair(x, airbyte_model): x for x in airbyte_model.connections.values()}
+    r = []
+    for group in groups:
+        sources = source_index.match(group.source_tags)
+        destinations = destination_index.match(group.destination_tags)
+        if not sources or not destinations:
+            print("Warning: connection group " + repr(group.group_name) + " matches no "
+                  + ("sources" if not sources else "destinations"))
+        for source_name in sources:
+            for destination_name in destinations:
+                pair = (source_name, destination_name)
+                if pair in configured:
+                    continue
+                configured.add(pair)
+                r.append(build_group_connection(group, source_name, destination_name, deployed.get(pair)))
+    print("Expanded " + repr(len(groups)) + " connection groups into " + repr(len(r)) + " connections")
+    return r
+
+
+def build_group_connection(group, source_name, destination_name, existing=None) -> ConnectionDto:
+    r = ConnectionDto()
+    if existing is not None:
+        r.connection_id = existing.connection_id
+        r.name = existing.name
+    else:
+        r.name = group.group_name + '-' + source_name + '-' + destination_name
+    r.source_name = source_name
+    r.destination_name = destination_name
+    r.prefix = group.prefix
+    r.schedule = group.schedule
+    r.status = group.status
+    r.sync_catalog = group.sync_catalog or {}
+    return r
@@ -1,8 +1,17 @@
 from airbyte_config_model import AirbyteConfigModel
-from airbyte_client import AirbyteClient
+from airbyte_client import AirbyteClient, DEFAULT_POOL_SIZE
 from airbyte_dto_factory import AirbyteDtoFactory
+from cache import DefinitionsCache, DiscoveryCache, LazyDefinitions
+from secrets_resolver import SecretsResolver
+from snapshot import SnapshotStore, content_hash
+import backup
+import config_files
+import connection_groups
+import json
+from concurrent.futures import ThreadPoolExecutor
 import utils
-import yaml
+from validation import ValidationRunner
+from wipe import WipeEngine
 
 
 class Controller:
@@ -10,73 +19,223 @@ class Controller:
 
     def __init__(self):
         self.dto_factory = None
+        self.validation_runner = None
+        self.secrets_resolver = SecretsResolver()
+        self.concurrency = 1
+        self.timings = {}  # phase -> wall time in seconds
+        self.snapshot = None
+        self.snapshot_kinds = ([], [])  # (kinds read, kinds listed in full) by get_airbyte_configuration
+        self.unrestorable = []  # DTOs in a backup which read_backup refused to restore
 
     def instantiate_dto_factory(self, source_definitions, destination_definitions):
         self.dto_factory = AirbyteDtoFactory(source_definitions,destination_definitions)
 
     def instantiate_client(self, args) -> AirbyteClient:
+        self.concurrency = args.concurrency
+        pool_size = max(DEFAULT_POOL_SIZE, args.concurrency)
         # if origin is a deployment and target is not specified
-        if not utils.is_yaml(args.origin) and args.target is None:
-            client = AirbyteClient(args.origin)
-        # if in sync mode and source is a yaml file
-        elif utils.is_yaml(args.origin):
-            if utils.is_yaml(args.target):
+        if not utils.is_config_file(args.origin) and args.target is None:
+            client = AirbyteClient(args.origin, pool_size=pool_size)
+        # if in sync mode and source is a yaml file, or restoring a backup file
+        elif utils.is_config_file(args.origin):
+            if utils.is_yaml_target(args.target):
                 print("Fatal error: --target must be followed by a valid "
                       "Airbyte deployment url when the origin is a .yaml file")
                 exit(2)
-            client = AirbyteClient(args.target)
-        elif utils.is_yaml(args.target):
+            client = AirbyteClient(args.target, pool_size=pool_size)
+        elif utils.is_yaml_target(args.target):
             if utils.is_yaml(args.origin):
                 print("Fatal error: --target must be followed by a valid "
                       "Airbyte deployment url when the origin is a .yaml file")
                 exit(2)
-            client = AirbyteClient(args.origin)
+            client = AirbyteClient(args.origin, pool_size=pool_size)
         else:
             print("Fatal error: the origin or --target must be a valid .yaml configuration file")
             exit(2)
+        client.discovery_cache = DiscoveryCache(persist=not args.no_discovery_cache, refresh=args.refresh_discovery)
         return client
 
     def read_yaml_config(self, args):
         """get config from config.yml"""
 
         secrets = None
-        if utils.is_yaml(args.origin):
-            yaml_config = yaml.safe_load(open(args.origin, 'r'))
-        else:
-            yaml_config = yaml.safe_load(open(args.target, 'r'))
+        yaml_config = self.read_config(args.origin if utils.is_config_file(args.origin) else args.target)
         if args.secrets:
-            secrets = yaml.safe_load(open(args.secrets, 'r'))  # TODO: if no --secrets specified, skip
+            secrets = utils.load_yaml(args.secrets)  # TODO: if no --secrets specified, skip
         else:
             print("Warning: Reading yaml config but --secrets not specified. Is this intentional?")
         return yaml_config, secrets
 
-    def get_definitions(self, client):
-        """Retrieves source and destination definitions for configured sources"""
+    def read_config(self, path):
+        """Reads a config from a yaml file, or from every yaml file of a config directory or glob"""
+
+        if utils.is_config_dir(path) or utils.is_config_glob(path):  # config split over many files
+            return config_files.read_config_files(path)
+        return utils.load_yaml(path)
+
+    def read_backup(self, args, airbyte_model) -> dict:
+        """
+        Builds DTOs of the selected kinds from the backup file given as the origin, for restore. Sources and
+        destinations which would have to be created with the backup's masked secrets are reported and left out.
+        """
+
+        try:
+            dtos = backup.build_restore_dtos(args.origin, self.dto_factory, airbyte_model, utils.selected_kinds(args))
+        except (OSError, ValueError) as e:
+            print("Error: unable to read backup " + args.origin + ": " + str(e))
+            exit(2)
+        if args.secrets:  # backups only hold masked secrets, which is enough to update but not to create
+            self.dto_factory.populate_secrets(utils.load_yaml(args.secrets), dtos)
+        self.unrestorable = backup.drop_masked_creates(dtos, airbyte_model)
+        for dto in self.unrestorable:
+            print("Error: unable to restore " + type(dto).__name__[:-3].lower() + " " + repr(dto.name)
+                  + ": it isn't deployed, and the backup only holds its masked secrets. Provide them with --secrets.")
+        return dtos
+
+    def write_config(self, airbyte_model, target, workers=config_files.WRITE_WORKERS):
+        """Writes the deployment out as config, to a .yaml file or to a directory with one file per object"""
+
+        if utils.is_config_dir(target):
+            counts = config_files.write_config_dir(airbyte_model, target, workers)
+            print("Output written to: " + target + " (" + ', '.join(repr(counts[x]) + ' ' + x for x in counts)
+                  + " files)")
+        else:
+            airbyte_model.write_yaml(target)
+            print("Output written to: " + target)
+
+    def write_backup(self, airbyte_model, filename):
+        """Writes a --backup of the deployment, as a compressed backup file or as yaml depending on the extension"""
+
+        if backup.is_backup_file(filename):
+            count = backup.write_backup(airbyte_model, filename)
+            print("Backed up " + repr(count) + " objects to: " + filename)
+        else:
+            airbyte_model.write_yaml(filename)
+
+    def get_definitions(self, client, refresh=False):
+        """
+        Returns source and destination definitions for configured sources. Each is only fetched (or read from the
+        definitions cache) the first time it is actually used.
+        """
+
+        cache = DefinitionsCache(client.airbyte_url)
+        if refresh:
+            cache.invalidate()
+        return {'source_definitions': LazyDefinitions(
+                    lambda: self.fetch_definitions(client, cache, 'source_definitions', client.get_source_definitions)),
+                'destination_definitions': LazyDefinitions(
+                    lambda: self.fetch_definitions(client, cache, 'destination_definitions',
+                                                   client.get_destination_definitions))}
+
+    def fetch_definitions(self, client, cache, kind, route):
+        """Returns the definitions of the given kind from the cache, or from the deployment if not cached"""
 
-        print("Retrieving source and destination definitions from: " + client.airbyte_url)
-        available_sources = client.get_source_definitions().payload
-        available_destinations = client.get_destination_definitions().payload
-        return {'source_definitions': available_sources, 'destination_definitions': available_destinations}
+        definitions = cache.get(kind)
+        if definitions is None:
+            print("Retrieving " + kind.replace('_', ' ') + " from: " + client.airbyte_url)
+            response = route()
+            definitions = response.payload
+            if response.ok:
+                cache.put(kind, definitions)
+        return definitions
 
-    def get_airbyte_configuration(self, client, workspace):
-        """Retrieves the configuration from an airbyte deployment and returns an AirbyteConfigModel representing it"""
+    def get_airbyte_configuration(self, client, workspace, kinds=None):
+        """
+        Retrieves the configuration from an airbyte deployment and returns an AirbyteConfigModel representing it.
+        Only the given kinds are read (all of them by default), with their list calls issued concurrently. With a
+        snapshot, connections are refreshed incrementally instead of listed, see refresh_connections.
+        """
 
+        kinds = utils.KINDS if kinds is None else kinds
         print("Retrieving Airbyte configuration from: " + client.airbyte_url)
-        configured_sources = client.get_configured_sources(workspace).payload['sources']
-        configured_destinations = client.get_configured_destinations(workspace).payload['destinations']
-        configured_connections = client.get_configured_connections(workspace).payload['connections']
         airbyte_model = AirbyteConfigModel()
-        for source in configured_sources:
-            source_dto = self.dto_factory.build_source_dto(source)
-            airbyte_model.sources[source_dto.source_id] = source_dto
-        for destination in configured_destinations:
-            destination_dto = self.dto_factory.build_destination_dto(destination)
-            airbyte_model.destinations[destination_dto.destination_id] = destination_dto
-        for connection in configured_connections:
-            connection_dto = self.dto_factory.build_connection_dto(connection)
-            airbyte_model.connections[connection_dto.connection_id] = connection_dto
+        cached_connections = self.snapshot.load('connections') if self.snapshot and 'connections' in kinds else None
+        listed = [kind for kind in kinds if not (kind == 'connections' and cached_connections is not None)]
+        with utils.timer(self.timings, 'read_deployment'):
+            with ThreadPoolExecutor(max_workers=max(1, len(listed))) as executor:
+                for future in [executor.submit(self.read_kind, client, workspace, kind) for kind in listed]:
+                    kind, dtos = future.result()
+                    index = airbyte_model.index_for(kind)
+                    for dto in dtos:
+                        index[dto.get_identity()[0]] = dto
+            if cached_connections is not None and not self.refresh_connections(airbyte_model, client,
+                                                                                cached_connections):
+                listed.append('connections')
+                for dto in self.read_kind(client, workspace, 'connections')[1]:
+                    airbyte_model.connections[dto.connection_id] = dto
+        print("Read " + ', '.join(repr(len(airbyte_model.index_for(kind))) + ' ' + kind for kind in kinds)
+              + " in " + '{:.1f}'.format(self.timings['read_deployment']) + 's')
+        self.snapshot_kinds = (kinds, listed)
+        if self.snapshot:
+            self.snapshot.save(airbyte_model, kinds, listed)
         return airbyte_model
 
+    def refresh_connections(self, airbyte_model, client, cached_connections):
+        """
+        Fills the model's connections from a trusted snapshot. A connection whose source or destination changed since
+        the snapshot, and so may have a new catalog, is read again on its own. One whose source or destination is gone
+        was deleted along with it. All the others are taken from the snapshot as they are. Returns False if a
+        connection couldn't be read again, in which case the connections have to be listed after all.
+        """
+
+        changed = set()
+        for kind in ('sources', 'destinations'):
+            cached = self.snapshot.load(kind) or {}
+            for dto_id, dto in airbyte_model.index_for(kind).items():
+                if dto_id not in cached or cached[dto_id]['hash'] != content_hash(dto.to_payload()):
+                    changed.add(dto_id)
+        stale = []
+        for connection_id, entry in cached_connections.items():
+            source_id, destination_id = entry['payload']['sourceId'], entry['payload']['destinationId']
+            if source_id not in airbyte_model.sources or destination_id not in airbyte_model.destinations:
+                continue
+            if source_id in changed or destination_id in changed:
+                stale.append(connection_id)
+            else:
+                airbyte_model.connections[connection_id] = self.dto_factory.build_connection_dto(entry['payload'])
+        with utils.timer(self.timings, 'fetch_connections'):
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                responses = list(executor.map(client.get_connection, stale))
+        for connection_id, response in zip(stale, responses):
+            if response.ok:
+                connection_dto = self.dto_factory.build_connection_dto(response.payload)
+                airbyte_model.connections[connection_dto.connection_id] = connection_dto
+            elif response.status_code != 404:  # 404: deleted since the snapshot
+                print("Warning: unable to read connection " + connection_id + " again, listing all connections")
+                airbyte_model.connections.clear()
+                return False
+        print("Snapshot: reused " + repr(len(cached_connections) - len(stale)) + " connections, read "
+              + repr(len(stale)) + " again")
+        return True
+
+    def read_kind(self, client, workspace, kind):
+        """Lists the deployed objects of one kind and builds their DTOs. Returns (kind, dtos)."""
+
+        routes = {'sources': (client.get_configured_sources, self.dto_factory.build_source_dto),
+                  'destinations': (client.get_configured_destinations, self.dto_factory.build_destination_dto),
+                  'connections': (client.get_configured_connections, self.dto_factory.build_connection_dto)}
+        list_route, build_dto = routes[kind]
+        with utils.timer(self.timings, 'fetch_' + kind):
+            configured = list_route(workspace).payload[kind]
+        with utils.timer(self.timings, 'build_' + kind):
+            return kind, [build_dto(item) for item in configured]
+
+    def instantiate_snapshot(self, args, client, workspace):
+        """Sets up the snapshot store of the workspace if --snapshot is used"""
+
+        if args.snapshot:
+            self.snapshot = SnapshotStore(client.airbyte_url, workspace['workspaceId'], max_age=args.snapshot_max_age)
+
+    def invalidate_snapshot(self):
+        """Called before the first change to the deployment"""
+        if self.snapshot:
+            self.snapshot.invalidate()
+
+    def save_snapshot(self, airbyte_model):
+        """Called once every change has been made, and recorded in the model"""
+        if self.snapshot:
+            self.snapshot.save(airbyte_model, *self.snapshot_kinds)
+
     def get_workspace(self, args, client) -> str:
         """Retrieves workspace specified by the --workspace argument, or the default workspace otherwise"""
 
@@ -118,9 +277,34 @@ class Controller:
                 new_dtos['connections'] = new_connections
             if len(new_connection_groups) > 0:
                 new_dtos['connectionGroups'] = new_connection_groups
-        self.dto_factory.populate_secrets(secrets, new_dtos)
+        if self.dto_factory.report_unknown_definitions():
+            print("Error: Unknown connector names or definition ids in config. Exiting...")
+            exit(2)
+        if secrets:
+            self.dto_factory.populate_secrets(secrets, new_dtos)
+        self.resolve_secrets(new_dtos)
         return new_dtos
 
+    def resolve_secrets(self, new_dtos):
+        """
+        Replaces ${provider:location#key} placeholders in connector configurations. Exits if any can't be resolved.
+        """
+
+        with utils.timer(self.timings, 'secrets'):
+            errors = self.secrets_resolver.resolve_dtos(new_dtos)
+        for error in errors:
+            print("Error: unable to resolve secret " + error)
+        if errors:
+            exit(2)
+
+    def expand_connection_groups(self, airbyte_model, dtos_from_config) -> dict:
+        """Adds the connections described by the connection groups in config to dtos_from_config['connections']"""
+
+        expanded = connection_groups.expand_connection_groups(dtos_from_config, airbyte_model)
+        if expanded:
+            dtos_from_config.setdefault('connections', []).extend(expanded)
+        return dtos_from_config
+
     def sync_sources_to_deployment(self,
                                     airbyte_model: AirbyteConfigModel,
                                     client: AirbyteClient,
@@ -131,29 +315,40 @@ class Controller:
         """
         if 'sources' in dtos_from_config:
             for new_source in dtos_from_config['sources']:
-                if airbyte_model.has(new_source): # source already exists by name or id in the deployment
-                    if new_source.source_id is None: # if no id on the provided source
-                        new_source.source_id = airbyte_model.name_to_id(new_source.name)
-                    response = client.update_source(new_source)
-                    if response.ok:
-                        source_dto = self.dto_factory.build_source_dto(response.payload)
-                        print("Updated source: " + source_dto.source_id)
-                        airbyte_model.sources[source_dto.source_id] = source_dto
-                    else:
-                        print("Error: unable to modify source: " + new_source.source_id)
-                        print('Response code: ' + repr(response.status_code) + ' ' + response.message)
-                else:  # source does not exist
-                    response = client.create_source(new_source, workspace)
-                    if response.ok:
-                        source_dto = self.dto_factory.build_source_dto(response.payload)
-                        print("Updated source: " + source_dto.source_id)
-                        airbyte_model.sources[source_dto.source_id] = source_dto
-                    else:
-                        print("Error: unable to modify source: " + new_source.source_id)
-                        print('Response code: ' + repr(response.status_code) + ' ' + response.message)
+                self.sync_source(airbyte_model, client, workspace, new_source)
         else:
             print('Warning: --sources option used, but no sources found in provided config.yml')
 
+    def sync_source(self, airbyte_model, client, workspace, new_source) -> bool:
+        """Creates or updates a single source in the deployment"""
+
+        if self.resolve_source(airbyte_model, new_source):
+            response = client.update_source(new_source)
+        else:
+            response = client.create_source(new_source, workspace)
+        return self.record_source(airbyte_model, new_source, response)
+
+    def resolve_source(self, airbyte_model, new_source) -> bool:
+        """
+        Returns True if the source already exists by name or id in the deployment, filling in its id if needed.
+        An id which isn't deployed is dropped, so the source is matched by name or created, as the plan shows.
+        """
+
+        new_source.source_id = airbyte_model.deployed_id(new_source)
+        return new_source.source_id is not None
+
+    def record_source(self, airbyte_model, new_source, response) -> bool:
+        """Updates the model with the source returned by a create or update call"""
+
+        if response.ok:
+            source_dto = self.dto_factory.build_source_dto(response.payload)
+            print("Updated source: " + source_dto.source_id)
+            airbyte_model.sources[source_dto.source_id] = source_dto
+        else:
+            print("Error: unable to modify source: " + new_source.name)
+            print('Response code: ' + repr(response.status_code) + ' ' + response.message)
+        return response.ok
+
     def sync_destinations_to_deployment(self,
                                         airbyte_model: AirbyteConfigModel,
                                         client: AirbyteClient,
@@ -165,29 +360,39 @@ class Controller:
 
         if 'destinations' in dtos_from_config:
             for new_destination in dtos_from_config['destinations']:
-                if airbyte_model.has(new_destination):  # destination already exists by name or id in the deployment
-                    if new_destination.destination_id is None:  # if no id on the provided destination
-                        new_destination.destination_id = airbyte_model.name_to_id(new_destination.name)
-                    response = client.update_destination(new_destination)
-                    if response.ok:
-                        destination_dto = self.dto_factory.build_destination_dto(response.payload)
-                        print("Updated destination: " + destination_dto.destination_id)
-                        airbyte_model.destinations[destination_dto.destination_id] = destination_dto
-                    else:
-                        print("Error: unable to modify destination: " + new_destination.destination_id)
-                        print('Response code: ' + repr(response.status_code) + ' ' + response.message)
-                else:  # destination does not exist
-                    response = client.create_destination(new_destination, workspace)
-                    if response.ok:
-                        destination_dto = self.dto_factory.build_destination_dto(response.payload)
-                        print("Updated destination: " + destination_dto.destination_id)
-                        airbyte_model.destinations[destination_dto.destination_id] = destination_dto
-                    else:
-                        print("Error: unable to modify destination: " + new_destination.destination_id)
-                        print('Response code: ' + repr(response.status_code) + ' ' + response.message)
+                self.sync_destination(airbyte_model, client, workspace, new_destination)
         else:
             print('Warning: --destinations option used, but no destinations found in provided config.yml')
 
+    def sync_destination(self, airbyte_model, client, workspace, new_destination) -> bool:
+        """Creates or updates a single destination in the deployment"""
+
+        if self.resolve_destination(airbyte_model, new_destination):
+            response = client.update_destination(new_destination)
+        else:
+            response = client.create_destination(new_destination, workspace)
+        return self.record_destination(airbyte_model, new_destination, response)
+
+    def resolve_destination(self, airbyte_model, new_destination) -> bool:
+        """Returns True if the destination already exists by name or id in the deployment, filling in its id if
+        needed. An id which isn't deployed is dropped, as for sources.
+        """
+
+        new_destination.destination_id = airbyte_model.deployed_id(new_destination)
+        return new_destination.destination_id is not None
+
+    def record_destination(self, airbyte_model, new_destination, response) -> bool:
+        """Updates the model with the destination returned by a create or update call"""
+
+        if response.ok:
+            destination_dto = self.dto_factory.build_destination_dto(response.payload)
+            print("Updated destination: " + destination_dto.destination_id)
+            airbyte_model.destinations[destination_dto.destination_id] = destination_dto
+        else:
+            print("Error: unable to modify destination: " + new_destination.name)
+            print('Response code: ' + repr(response.status_code) + ' ' + response.message)
+        return response.ok
+
     def sync_connections_to_deployment(self,
                                         airbyte_model: AirbyteConfigModel,
                                         client: AirbyteClient,
@@ -198,82 +403,191 @@ class Controller:
         # create or modify each connection defined in yml
         if 'connections' in dtos_from_config:
             for new_connection in dtos_from_config['connections']:
-                # verify the new_connection has a valid source_id and destination_id before proceeding
-                if new_connection.source_id is None:
-                    new_connection.source_id = airbyte_model.name_to_id(new_connection.source_name)
-                if new_connection.destination_id is None:
-                    new_connection.destination_id = airbyte_model.name_to_id(new_connection.destination_name)
-                if airbyte_model.has(new_connection):  # connection already exists by name or id in the deployment
-                    if new_connection.connection_id is None:  # if no id on the provided connection
-                        new_connection.connection_id = airbyte_model.name_to_id(new_connection.name)
-                if new_connection.source_id is None or new_connection.destination_id is None:
-                    print("Error: Failed to create or update a connection : sourceId or destinationId unresolved")
-                    return
-                if new_connection.connection_id is None:  # create new connection
-                    response = client.create_connection(new_connection, airbyte_model.sources[new_connection.source_id])
-                    if response.ok:
-                        connection_dto = self.dto_factory.build_connection_dto(response.payload)
-                        print("Created connection: " + connection_dto.connection_id)
-                        airbyte_model.connections[connection_dto.connection_id] = connection_dto
-                    else:
-                        print("Error: unable to create connection: " + new_connection.name + ' '
-                              + new_connection.connection_id)
-                        print('Response code: ' + repr(response.status_code) + ' ' + response.message)
-                else:  # modify existing connection
-                    if not new_connection.sync_catalog:
-                        new_connection.sync_catalog = airbyte_model.connections[new_connection.connection_id]\
-                            .sync_catalog
-                    response = client.update_connection(new_connection)
-                    if response.ok:
-                        connection_dto = self.dto_factory.build_connection_dto(response.payload)
-                        airbyte_model.connections[connection_dto.connection_id] = connection_dto
-                        print("Updated connection: " + connection_dto.connection_id)
-                    else:
-                        print("Error: unable to modify connection: " + new_connection.name + ' '
-                              + new_connection.connection_id)
-                        print('Response code: ' + repr(response.status_code) + ' ' + response.message)
+                if not self.resolve_connection(airbyte_model, new_connection):
+                    print("Error: Failed to create or update connection " + repr(new_connection.name)
+                          + " : sourceId or destinationId unresolved")
+                    continue  # the remaining connections are still applied
+                self.sync_connection(airbyte_model, client, new_connection)
         else:
             print('Warning: --connections option used, but no connections found in provided config.yml')
 
+    def sync_connection(self, airbyte_model, client, new_connection) -> bool:
+        """Creates or updates a single, resolved connection in the deployment"""
+
+        if new_connection.connection_id is None:  # create new connection
+            response = client.create_connection(new_connection, airbyte_model.sources[new_connection.source_id])
+        else:  # modify existing connection
+            self.fill_sync_catalog(airbyte_model, new_connection)
+            response = client.update_connection(new_connection)
+        return self.record_connection(airbyte_model, new_connection, response)
+
+    def resolve_connection(self, airbyte_model, new_connection) -> bool:
+        """
+        Fills in the source, destination and connection ids of a connection from the model.
+        Returns False if the source or destination can't be resolved.
+        """
+
+        # verify the new_connection has a valid source_id and destination_id before proceeding
+        if new_connection.source_id is None:
+            new_connection.source_id = airbyte_model.name_to_id(new_connection.source_name, 'sources')
+        if new_connection.destination_id is None:
+            new_connection.destination_id = airbyte_model.name_to_id(new_connection.destination_name,
+                                                                     'destinations')
+        # an existing connection is updated by id; one whose id isn't deployed is matched by name or created
+        new_connection.connection_id = airbyte_model.deployed_id(new_connection)
+        return new_connection.source_id is not None and new_connection.destination_id is not None
+
+    def fill_sync_catalog(self, airbyte_model, new_connection):
+        """An existing connection updated without a syncCatalog keeps the catalog already deployed"""
+
+        if not new_connection.sync_catalog:
+            new_connection.sync_catalog = airbyte_model.connections[new_connection.connection_id].sync_catalog
+
+    def record_connection(self, airbyte_model, new_connection, response) -> bool:
+        """Updates the model with the connection returned by a create or update call"""
+
+        if response.ok:
+            connection_dto = self.dto_factory.build_connection_dto(response.payload)
+            airbyte_model.connections[connection_dto.connection_id] = connection_dto
+            if new_connection.connection_id is None:
+                print("Created connection: " + connection_dto.connection_id)
+            else:
+                print("Updated connection: " + connection_dto.connection_id)
+        else:
+            action = 'create' if new_connection.connection_id is None else 'modify'
+            print("Error: unable to " + action + " connection: " + new_connection.name + ' '
+                  + repr(new_connection.connection_id))
+            print('Response code: ' + repr(response.status_code) + ' ' + response.message)
+        return response.ok
 
     def wipe_sources(self, airbyte_model, client):
         """Wrapper for AirbyteConfigModel.wipe_sources"""
-        print("Wiping sources on " + client.airbyte_url)
-        airbyte_model.wipe_sources(client)
+        self.wipe(airbyte_model, client, ['sources'])
 
     def wipe_destinations(self, airbyte_model, client):
         """Wrapper for AirbyteConfigModel.wipe_destinations"""
-        print("Wiping destinations on " + client.airbyte_url)
-        airbyte_model.wipe_destinations(client)
+        self.wipe(airbyte_model, client, ['destinations'])
 
     def wipe_connections(self, airbyte_model, client):
         """Wrapper for AirbyteConfigModel.wipe_connections"""
-        print("Wiping connections on " + client.airbyte_url)
-        airbyte_model.wipe_connections(client)
+        self.wipe(airbyte_model, client, ['connections'])
 
     def wipe_all(self, airbyte_model, client):
         """Wipes all sources, destinations, and connections in the specified airbyte deployment"""
-        print("Wiping deployment: " + client.airbyte_url)
-        self.wipe_sources(airbyte_model, client)
-        self.wipe_destinations(airbyte_model, client)
-        self.wipe_connections(airbyte_model,client)
+        self.wipe(airbyte_model, client, ['sources', 'destinations', 'connections'])
+
+    def wipe(self, airbyte_model, client, kinds):
+        """
+        Deletes the selected kinds from the deployment, connections first, with up to --concurrency deletes in flight.
+        Exits if anything could not be deleted. Running the same wipe again picks up where it stopped.
+        """
+
+        if not kinds:
+            return
+        print("Wiping " + ', '.join(kinds) + " on " + client.airbyte_url)
+        engine = WipeEngine(client, workers=self.concurrency)
+        failures = airbyte_model.wipe(client, kinds, engine)
+        engine.print_summary()
+        if failures:
+            print("Error: wipe incomplete. Run it again to retry the objects which failed.")
+            exit(2)
+
+    def instantiate_validation_runner(self, client, args):
+        self.validation_runner = ValidationRunner(client, workers=args.concurrency, timeout=args.check_timeout)
+
+    def get_validation_runner(self, client) -> ValidationRunner:
+        if self.validation_runner is None:
+            self.validation_runner = ValidationRunner(client)
+        return self.validation_runner
 
     def validate_sources(self, airbyte_model, client):
         """Wrapper for AirbyteConfigModel.validate_sources"""
         print("Validating sources...")
-        airbyte_model.validate_sources(client)
+        airbyte_model.validate_sources(client, self.get_validation_runner(client))
 
     def validate_destinations(self, airbyte_model, client):
         """Wrapper for AirbyteConfigModel.validate_destinations"""
         print("Validating destinations...")
-        airbyte_model.validate_destinations(client)
+        airbyte_model.validate_destinations(client, self.get_validation_runner(client))
 
-    def validate_connections(self, airbyte_mopdel, client):
+    def write_validation_report(self, filename):
+        """
+        Prints a summary of every check run so far and, if a filename is given, writes a report to it. Nothing is
+        printed if no checks ran and no report was asked for.
+        """
+
+        if self.validation_runner is None or not (self.validation_runner.results or filename):
+            return
+        summary = self.validation_runner.summary()
+        print("Validation summary: " + ', '.join(key + ': ' + repr(value) for key, value in summary.items()))
+        if filename:
+            self.validation_runner.write_report(filename)
+            print("Validation report written to: " + filename)
+
+    def write_profile(self, client, filename=None):
+        """Prints the requests sent to each route and the time spent in each phase and, if a filename is given, writes
+        them to it as JSON"""
+
+        routes = client.stats.summary()
+        print("Route".ljust(44) + "Calls".rjust(7) + "Errors".rjust(7) + "p50 ms".rjust(9) + "p95 ms".rjust(9)
+              + "p99 ms".rjust(9) + "Total s".rjust(9) + "Sent KB".rjust(10) + "Recv KB".rjust(10) + "  Status codes")
+        for route, r in routes.items():
+            print(route[:43].ljust(44) + repr(r['calls']).rjust(7) + repr(r['errors']).rjust(7)
+                  + ''.join('{:9.1f}'.format(r[q] * 1000) for q in ('p50', 'p95', 'p99'))
+                  + '{:9.2f}'.format(r['total_seconds']) + '{:10.1f}'.format(r['bytes_sent'] / 1024)
+                  + '{:10.1f}'.format(r['bytes_received'] / 1024) + '  '
+                  + ', '.join(status + ': ' + repr(count) for status, count in r['status_codes'].items()))
+        if self.timings:
+            print("Phases: " + ', '.join(phase + ' ' + '{:.2f}'.format(seconds) + 's'
+                                         for phase, seconds in self.timings.items()))
+        if filename:
+            with open(filename, 'w') as f:
+                json.dump({'routes': routes, 'phases': self.timings, 'connections': client.connection_stats()}, f,
+                          indent=2)
+            print("Profile written to: " + filename)
+
+    def validate_connections(self, airbyte_model, client):
         """Wrapper for AirbyteConfigModel.validate_connections"""
-        pass  # TODO: implement Controller.validate_connections
+        print("Validating connections...")
+        airbyte_model.validate_connections(client, self.get_validation_runner(client))
 
     def validate_all(self, airbyte_model, client):
         """Validates all sources, destinations, and connections in the specified AirbyteConfigModel"""
         self.validate_sources(airbyte_model, client)
         self.validate_destinations(airbyte_model, client)
-        #self.validate_connections(airbyte_model, client)  # TODO: turn on
\ No newline at end of file
+        self.validate_connections(airbyte_model, client)
+
+
+class AsyncController(Controller):
+    """
+    Applies single sources, destinations and connections through an AsyncAirbyteClient, for the ApplyScheduler,
+    which runs them with many API calls in flight at once. Lookups and model updates reuse the Controller helpers and
+    run on the event loop, so only the API calls overlap. The coroutines have names of their own, so the serial
+    sync_*_to_deployment methods inherited from Controller still call the synchronous versions.
+    """
+
+    async def sync_source_async(self, airbyte_model, client, workspace, new_source) -> bool:
+        if self.resolve_source(airbyte_model, new_source):
+            response = await client.update_source(new_source)
+        else:
+            response = await client.create_source(new_source, workspace)
+        return self.record_source(airbyte_model, new_source, response)
+
+    async def sync_destination_async(self, airbyte_model, client, workspace, new_destination) -> bool:
+        if self.resolve_destination(airbyte_model, new_destination):
+            response = await client.update_destination(new_destination)
+        else:
+            response = await client.create_destination(new_destination, workspace)
+        return self.record_destination(airbyte_model, new_destination, response)
+
+    async def sync_connection_async(self, airbyte_model, client, new_connection) -> bool:
+        if not self.resolve_connection(airbyte_model, new_connection):
+            print("Error: Failed to create or update connection " + new_connection.name
+                  + " : sourceId or destinationId unresolved")
+            return False
+        if new_connection.connection_id is None:  # create new connection
+            response = await client.create_connection(new_connection, airbyte_model.sources[new_connection.source_id])
+        else:  # modify existing connection
+            self.fill_sync_catalog(airbyte_model, new_connection)
+            response = await client.update_connection(new_connection)
+        return self.record_connection(airbyte_model, new_connection, response)
@@ -0,0 +1,288 @@
+"""
+An in-memory stand-in for the Airbyte API, serving the routes AirbyteClient uses over real HTTP on localhost. Latency,
+errors and slow connector jobs can be injected, so sync, wipe and validate can be tested and benchmarked end to end
+without a live Airbyte deployment. topiary's bench mode runs against it, and the end to end tests use it too.
+"""
+
+import collections
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORKSPACE_ID = 'f3b9e848-790c-4cdd-a475-5c6bb156dc10'
+SOURCE_DEFINITIONS = [
+    {'sourceDefinitionId': 'ef69ef6e-aa7f-4af1-a01d-ef775033524e', 'name': 'GitHub'},
+    {'sourceDefinitionId': 'decd338e-5647-4c0b-adf4-da0e75f5a750', 'name': 'Postgres'},
+    {'sourceDefinitionId': '36c891d9-4bd9-43ac-bad2-10e12756272c', 'name': 'HubSpot'},
+]
+DESTINATION_DEFINITIONS = [
+    {'destinationDefinitionId': '25c5221d-dce2-4163-ade9-739ef790f503', 'name': 'Postgres'},
+    {'destinationDefinitionId': '22f6c74f-5699-40ff-833c-4a879ea40133', 'name': 'BigQuery'},
+]
+DISCOVERED_STREAMS = ['issues', 'pull_requests', 'commits']
+
+
+def discovered_catalog():
+    return {'streams': [{'stream': {'name': name, 'jsonSchema': {'type': 'object', 'properties': {
+                                        'id': {'type': ['null', 'integer']}}},
+                                    'supportedSyncModes': ['full_refresh'], 'sourceDefinedPrimaryKey': [['id']]},
+                         'config': {'syncMode': 'full_refresh', 'destinationSyncMode': 'append', 'selected': True,
+                                    'aliasName': name, 'cursorField': [], 'primaryKey': [['id']]}}
+                        for name in DISCOVERED_STREAMS]}
+
+
+class FakeAirbyteServer:
+    """
+    Serves a fake Airbyte API from a background thread. Use it as a context manager, then point an AirbyteClient at
+    server.url. Every request is delayed by latency seconds and fails with a 500 at error_rate (0 to 1, drawn from a
+    seeded random generator). check_connection jobs take check_latency seconds and discover_schema jobs
+    discover_latency seconds; ids in failing_checks fail their checks. calls counts the requests served per route, and
+    in_flight_peak is the most requests ever handled at once.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, check_latency=0.0, discover_latency=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.check_latency = check_latency
+        self.discover_latency = discover_latency
+        self.failing_checks = set()
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = collections.Counter()
+        self.in_flight = 0
+        self.in_flight_peak = 0
+        self.workspace = {'workspaceId': WORKSPACE_ID, 'slug': 'default', 'name': 'Default Workspace'}
+        self.sources = {}
+        self.destinations = {}
+        self.connections = {}
+        self.httpd = None
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        return 'http://127.0.0.1:' + repr(self.httpd.server_address[1])
+
+    def start(self):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), FakeAirbyteHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def add_source(self, name, source_name='GitHub', configuration=None) -> dict:
+        """Deploys a source directly, without a request. Returns its payload."""
+
+        return self.create('sources', {'sourceDefinitionId': self.definition_id('source', source_name),
+                                       'workspaceId': WORKSPACE_ID, 'name': name,
+                                       'connectionConfiguration': configuration or {'repository': name}})
+
+    def add_destination(self, name, destination_name='Postgres', configuration=None) -> dict:
+        return self.create('destinations', {'destinationDefinitionId': self.definition_id('destination',
+                                                                                          destination_name),
+                                            'workspaceId': WORKSPACE_ID, 'name': name,
+                                            'connectionConfiguration': configuration or {'host': name}})
+
+    def add_connection(self, name, source_id, destination_id, status='active') -> dict:
+        return self.create('connections', {'name': name, 'sourceId': source_id, 'destinationId': destination_id,
+                                           'prefix': '', 'status': status, 'syncCatalog': discovered_catalog(),
+                                           'schedule': {'units': 24, 'timeUnit': 'hours'}})
+
+    @staticmethod
+    def definition_id(kind, name):
+        definitions = SOURCE_DEFINITIONS if kind == 'source' else DESTINATION_DEFINITIONS
+        return next(x[kind + 'DefinitionId'] for x in definitions if x['name'] == name)
+
+    def index(self, kind):
+        return {'sources': self.sources, 'destinations': self.destinations, 'connections': self.connections}[kind]
+
+    def create(self, kind, payload) -> dict:
+        r = dict(payload)
+        if kind == 'sources':
+            r['sourceName'] = next(x['name'] for x in SOURCE_DEFINITIONS
+                                   if x['sourceDefinitionId'] == r['sourceDefinitionId'])
+        elif kind == 'destinations':
+            r['destinationName'] = next(x['name'] for x in DESTINATION_DEFINITIONS
+                                        if x['destinationDefinitionId'] == r['destinationDefinitionId'])
+        else:
+            r.setdefault('namespaceDefinition', 'destination')
+        r[kind[:-1] + 'Id'] = str(uuid.uuid4())
+        with self.lock:
+            self.index(kind)[r[kind[:-1] + 'Id']] = r
+        return r
+
+    def delete(self, kind, object_id) -> bool:
+        """Deletes an object, and like Airbyte, the connections of a deleted source or destination"""
+
+        with self.lock:
+            if self.index(kind).pop(object_id, None) is None:
+                return False
+            if kind != 'connections':
+                id_key = kind[:-1] + 'Id'
+                for connection_id in [x for x, c in self.connections.items() if c[id_key] == object_id]:
+                    del self.connections[connection_id]
+            return True
+
+    def handle(self, route, body):
+        """Returns (status code, payload or None) for a request to route, after any injected latency or error"""
+
+        with self.lock:
+            self.calls[route] += 1
+            self.in_flight += 1
+            self.in_flight_peak = max(self.in_flight_peak, self.in_flight)
+            failed = self.error_rate and self.random.random() < self.error_rate
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            if failed:
+                return 500, {'message': 'Injected error'}
+            handler = ROUTES.get(route)
+            if handler is None:
+                return 404, {'message': 'Unknown route ' + route}
+            return handler(self, body)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    # routes with a single handler; the per-kind ones are built by the *_route functions below
+
+    def health(self, body):
+        return 200, {'available': True}
+
+    def get_workspace(self, body):
+        return 200, self.workspace
+
+    def list_workspaces(self, body):
+        return 200, {'workspaces': [self.workspace]}
+
+    def list_source_definitions(self, body):
+        return 200, {'sourceDefinitions': [dict(x) for x in SOURCE_DEFINITIONS]}
+
+    def list_destination_definitions(self, body):
+        return 200, {'destinationDefinitions': [dict(x) for x in DESTINATION_DEFINITIONS]}
+
+    def get_specification(self, body):
+        return 200, {'sourceDefinitionId': body.get('sourceDefinitionId'), 'connectionSpecification': {}}
+
+    def discover_schema(self, body):
+        if body.get('sourceId') not in self.sources:
+            return 404, {'message': 'source not found'}
+        if self.discover_latency:
+            time.sleep(self.discover_latency)
+        return 200, {'catalog': discovered_catalog(), 'jobInfo': {'succeeded': True}}
+
+
+def list_route(kind):
+    def route(fake, body):
+        with fake.lock:
+            return 200, {kind: [dict(x) for x in fake.index(kind).values()
+                                if kind == 'connections' or x['workspaceId'] == body.get('workspaceId')]}
+    return route
+
+
+def get_route(kind):
+    def route(fake, body):
+        with fake.lock:
+            found = fake.index(kind).get(body.get(kind[:-1] + 'Id'))
+        return (200, dict(found)) if found else (404, {'message': kind[:-1] + ' not found'})
+    return route
+
+
+def create_route(kind):
+    def route(fake, body):
+        if kind == 'connections' and (body.get('sourceId') not in fake.sources
+                                      or body.get('destinationId') not in fake.destinations):
+            return 422, {'message': 'Unknown sourceId or destinationId'}
+        return 200, fake.create(kind, body)
+    return route
+
+
+def update_route(kind):
+    def route(fake, body):
+        with fake.lock:
+            found = fake.index(kind).get(body.get(kind[:-1] + 'Id'))
+            if found is None:
+                return 404, {'message': kind[:-1] + ' not found'}
+            found.update({k: v for k, v in body.items() if v is not None})
+            return 200, dict(found)
+    return route
+
+
+def delete_route(kind):
+    def route(fake, body):
+        if not fake.delete(kind, body.get(kind[:-1] + 'Id')):
+            return 404, {'message': kind[:-1] + ' not found'}
+        return 204, None
+    return route
+
+
+def check_route(kind):
+    def route(fake, body):
+        object_id = body.get(kind[:-1] + 'Id')
+        if object_id not in fake.index(kind):
+            return 404, {'message': kind[:-1] + ' not found'}
+        if fake.check_latency:
+            time.sleep(fake.check_latency)
+        succeeded = object_id not in fake.failing_checks
+        return 200, {'status': 'succeeded' if succeeded else 'failed',
+                     'message': None if succeeded else 'Injected check failure',
+                     'jobInfo': {'id': str(uuid.uuid4()), 'succeeded': succeeded}}
+    return route
+
+
+ROUTES = {
+    'api/v1/health': FakeAirbyteServer.health,
+    'api/v1/workspaces/list': FakeAirbyteServer.list_workspaces,
+    'api/v1/workspaces/get_by_slug': FakeAirbyteServer.get_workspace,
+    'api/v1/workspaces/get': FakeAirbyteServer.get_workspace,
+    'api/v1/source_definitions/list': FakeAirbyteServer.list_source_definitions,
+    'api/v1/destination_definitions/list': FakeAirbyteServer.list_destination_definitions,
+    'api/v1/source_definition_specifications/get': FakeAirbyteServer.get_specification,
+    'api/v1/sources/discover_schema': FakeAirbyteServer.discover_schema,
+    'api/v1/sources/check_connection': check_route('sources'),
+    'api/v1/destinations/check_connection': check_route('destinations'),
+    'api/v1/connections/get': get_route('connections'),
+}
+for _kind in ('sources', 'destinations', 'connections'):
+    ROUTES.update({'api/v1/' + _kind + '/list': list_route(_kind),
+                   'api/v1/' + _kind + '/create': create_route(_kind),
+                   'api/v1/' + _kind + '/update': update_route(_kind),
+                   'api/v1/' + _kind + '/delete': delete_route(_kind)})
+
+
+class FakeAirbyteHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, as the client's pooled session expects
+
+    def do_GET(self):
+        self.respond({})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        self.respond(json.loads(raw) if raw else {})
+
+    def respond(self, body):
+        status, payload = self.server.fake.handle(self.path.strip('/'), body or {})
+        data = json.dumps(payload).encode() if payload is not None else b''
+        self.send_response(status)
+        if data:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
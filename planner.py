@@ -0,0 +1,131 @@
+from airbyte_config_model import AirbyteConfigModel
+from airbyte_dto_factory import MASKED_SECRET
+
+CREATE = 'create'
+UPDATE = 'update'
+UNCHANGED = 'unchanged'
+ORPHANED = 'orphaned'
+
+COMPARED_FIELDS = {  # {kind: payload fields sent by the matching update route}
+    'sources': ('name', 'connectionConfiguration'),
+    'destinations': ('name', 'connectionConfiguration'),
+    'connections': ('prefix', 'status', 'schedule', 'syncCatalog'),
+}
+SYMBOLS = {CREATE: '+', UPDATE: '~', UNCHANGED: '=', ORPHANED: '-'}
+
+
+def normalize(value):
+    """Treats None and empty containers as the same, unset value"""
+
+    if value is None or value == {} or value == []:
+        return None
+    return value
+
+
+def diff(desired, deployed, path=''):
+    """
+    Yields the path of every field where desired differs from deployed. Dicts are compared key by key and lists of
+    equal length item by item, so a change deep inside a syncCatalog is reported where it happens. Masked secrets in
+    deployed can't be compared and are never reported.
+    """
+
+    if deployed == MASKED_SECRET:
+        return
+    if isinstance(desired, dict) and isinstance(deployed, dict):
+        for key in sorted(set(desired) | set(deployed), key=str):
+            yield from diff(desired.get(key), deployed.get(key), path + '.' + str(key) if path else str(key))
+    elif isinstance(desired, list) and isinstance(deployed, list) and len(desired) == len(deployed):
+        for i, (desired_item, deployed_item) in enumerate(zip(desired, deployed)):
+            yield from diff(desired_item, deployed_item, path + '[' + str(i) + ']')
+    elif normalize(desired) != normalize(deployed):
+        yield path
+
+
+class PlanEntry:
+    def __init__(self, kind, action, dto, changes=None):
+        self.kind = kind
+        self.action = action
+        self.dto = dto
+        self.changes = changes or []
+
+    def describe(self):
+        r = SYMBOLS[self.action] + ' ' + self.kind[:-1] + ' ' + repr(self.dto.name)
+        if self.action == UPDATE:
+            r += ' (' + ', '.join(self.changes) + ')'
+        elif self.action == ORPHANED:
+            r += ' (deployed, not in config; left untouched)'
+        return r
+
+
+class Plan:
+    """The outcome of comparing config DTOs to a deployment: what sync would create, update or leave alone"""
+
+    def __init__(self, kinds):
+        self.kinds = kinds
+        self.entries = []
+
+    def count(self, kind, action) -> int:
+        return len([x for x in self.entries if x.kind == kind and x.action == action])
+
+    def pending_dtos(self) -> dict:
+        """Returns the config DTOs which need a create or update call, in the shape of build_dtos_from_yaml_config"""
+
+        r = {kind: [] for kind in self.kinds}
+        for entry in self.entries:
+            if entry.action in (CREATE, UPDATE):
+                r[entry.kind].append(entry.dto)
+        return r
+
+    def print_plan(self, verbose=True):
+        for kind in self.kinds:
+            print(kind + ': ' + ', '.join(repr(self.count(kind, action)) + ' to ' + action
+                                          for action in (CREATE, UPDATE))
+                  + ', ' + repr(self.count(kind, UNCHANGED)) + ' unchanged, '
+                  + repr(self.count(kind, ORPHANED)) + ' orphaned')
+        if verbose:
+            for entry in self.entries:
+                if entry.action != UNCHANGED:
+                    print('  ' + entry.describe())
+
+
+class Planner:
+    """
+    Classifies each source, destination and connection in config as create, update or unchanged against an
+    AirbyteConfigModel, and each deployed object that nothing in config refers to as orphaned.
+    """
+
+    def __init__(self, airbyte_model: AirbyteConfigModel):
+        self.airbyte_model = airbyte_model
+
+    def plan(self, dtos_from_config, kinds=('sources', 'destinations', 'connections')) -> Plan:
+        r = Plan(list(kinds))
+        for kind in kinds:
+            index = self.airbyte_model.index_for(kind)
+            matched = set()
+            for dto in dtos_from_config.get(kind, []):
+                deployed_id = self.match(kind, dto)
+                if deployed_id is None:
+                    r.entries.append(PlanEntry(kind, CREATE, dto))
+                    continue
+                matched.add(deployed_id)
+                changes = self.compare(kind, dto, index[deployed_id])
+                r.entries.append(PlanEntry(kind, UPDATE if changes else UNCHANGED, dto, changes))
+            for deployed_id, deployed in index.items():
+                if deployed_id not in matched:
+                    r.entries.append(PlanEntry(kind, ORPHANED, deployed))
+        return r
+
+    def match(self, kind, dto):
+        """Returns the id of the deployed object a config DTO refers to, the same way the controller resolves it"""
+
+        return self.airbyte_model.deployed_id(dto)
+
+    def compare(self, kind, dto, deployed) -> list:
+        desired_payload = dto.to_payload()
+        deployed_payload = deployed.to_payload()
+        changes = []
+        for field in COMPARED_FIELDS[kind]:
+            if field == 'syncCatalog' and not desired_payload[field]:
+                continue  # connections without a syncCatalog in config keep the deployed catalog
+            changes.extend(diff(desired_payload[field], deployed_payload[field], field))
+        return changes
@@ -0,0 +1,90 @@
+import asyncio
+
+from airbyte_dto_factory import SourceDto, DestinationDto, ConnectionDto
+
+
+class ApplyNode:
+    """A single source, destination or connection to apply, and the nodes which have to succeed before it can run"""
+
+    def __init__(self, dto):
+        self.dto = dto
+        self.dependencies = []
+        self.succeeded = None
+
+
+class ApplyScheduler:
+    """
+    Applies sources, destinations and connections from config as a dependency graph instead of three strict phases.
+    A connection only waits on the source and destination it refers to, and only when those are being applied in the
+    same run. Every other node starts right away; the AsyncAirbyteClient's concurrency limit acts as the worker pool.
+    """
+
+    def __init__(self, controller, airbyte_model, client, workspace):
+        self.controller = controller  # an AsyncController
+        self.airbyte_model = airbyte_model
+        self.client = client  # an AsyncAirbyteClient
+        self.workspace = workspace
+        self.nodes = []
+
+    def build_graph(self, dtos_from_config, kinds=('sources', 'destinations', 'connections')):
+        """Creates a node for each dto of the selected kinds. Nodes are ordered so dependencies come first."""
+
+        source_nodes = {}  # sourceId or name -> node
+        destination_nodes = {}  # destinationId or name -> node
+        for kind in kinds:
+            if kind not in dtos_from_config:
+                print('Warning: --' + kind + ' option used, but no ' + kind + ' found in provided config.yml')
+        if 'sources' in kinds:
+            for source in dtos_from_config.get('sources', []):
+                node = self.add_node(source)
+                for key in source.get_identity():
+                    if key:
+                        source_nodes.setdefault(key, node)
+        if 'destinations' in kinds:
+            for destination in dtos_from_config.get('destinations', []):
+                node = self.add_node(destination)
+                for key in destination.get_identity():
+                    if key:
+                        destination_nodes.setdefault(key, node)
+        if 'connections' in kinds:
+            for connection in dtos_from_config.get('connections', []):
+                node = self.add_node(connection)
+                for references, nodes in (((connection.source_id, connection.source_name), source_nodes),
+                                          ((connection.destination_id, connection.destination_name),
+                                           destination_nodes)):
+                    for reference in references:
+                        if reference in nodes:
+                            node.dependencies.append(nodes[reference])
+                            break
+        return self.nodes
+
+    def add_node(self, dto) -> ApplyNode:
+        node = ApplyNode(dto)
+        self.nodes.append(node)
+        return node
+
+    async def run(self) -> bool:
+        """Applies every node as soon as its dependencies have succeeded. Returns True if every node succeeded."""
+
+        tasks = {}
+        for node in self.nodes:
+            tasks[node] = asyncio.ensure_future(self.run_node(node, [tasks[d] for d in node.dependencies]))
+        results = await asyncio.gather(*tasks.values())
+        return all(results)
+
+    async def run_node(self, node, dependencies) -> bool:
+        if dependencies and not all(await asyncio.gather(*dependencies)):
+            print("Error: Skipping connection " + node.dto.name + " : its source or destination failed to apply")
+            node.succeeded = False
+            return False
+        node.succeeded = await self.apply(node.dto)
+        return node.succeeded
+
+    async def apply(self, dto) -> bool:
+        if isinstance(dto, SourceDto):
+            return await self.controller.sync_source_async(self.airbyte_model, self.client, self.workspace, dto)
+        elif isinstance(dto, DestinationDto):
+            return await self.controller.sync_destination_async(self.airbyte_model, self.client, self.workspace, dto)
+        elif isinstance(dto, ConnectionDto):
+            return await self.controller.sync_connection_async(self.airbyte_model, self.client, dto)
+        raise TypeError("ApplyScheduler can't apply " + repr(dto))
@@ -0,0 +1,186 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import utils
+
+SECRETS_TTL = 5 * 60  # seconds a resolved secret is reused for before it's fetched again
+RESOLVE_WORKERS = 8
+PLACEHOLDER = re.compile(r'\$\{(\w+):([^}#]+)(?:#([^}]+))?\}')  # ${provider:location} or ${provider:location#key}
+VAULT_FILE_VARIABLE = 'TOPIARY_VAULT_FILE'
+
+
+class SecretError(Exception):
+    pass
+
+
+class EnvProvider:
+    """${env:NAME} is the value of the environment variable NAME"""
+
+    def fetch(self, location):
+        if location not in os.environ:
+            raise SecretError("environment variable " + location + " is not set")
+        return os.environ[location]
+
+
+class FileProvider:
+    """
+    ${file:path} is the content of a file, without surrounding whitespace. ${file:path#key} is a key of a yaml file,
+    where key can be nested, as in database.password.
+    """
+
+    def fetch(self, location):
+        try:
+            if utils.is_yaml(location):
+                return utils.load_yaml(location)
+            with open(location) as f:
+                return f.read().strip()
+        except OSError as e:
+            raise SecretError(str(e))
+
+
+class VaultProvider:
+    """
+    ${vault:path#key} is the key of the secret stored at path. This is a local stand-in for a secret store, reading
+    {path: {key: value}} from the yaml file named by $TOPIARY_VAULT_FILE. A client for a real store only has to
+    implement fetch(path), returning the secret's keys and values, and be registered in place of this one.
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename or os.environ.get(VAULT_FILE_VARIABLE)
+        self.store = None
+        self.lock = threading.Lock()
+
+    def fetch(self, location):
+        with self.lock:
+            if self.store is None:
+                if not self.filename:
+                    raise SecretError(VAULT_FILE_VARIABLE + " is not set")
+                try:
+                    self.store = utils.load_yaml(self.filename) or {}
+                except OSError as e:
+                    raise SecretError(str(e))
+        if location not in self.store:
+            raise SecretError("no secret at " + location)
+        return self.store[location]
+
+
+def default_providers() -> dict:
+    return {'env': EnvProvider(), 'file': FileProvider(), 'vault': VaultProvider()}
+
+
+def find_references(value, found):
+    """Adds every (provider, location, key) placeholder in a nested configuration to the found set"""
+
+    if isinstance(value, dict):
+        for item in value.values():
+            find_references(item, found)
+    elif isinstance(value, list):
+        for item in value:
+            find_references(item, found)
+    elif isinstance(value, str) and '${' in value:
+        found.update(PLACEHOLDER.findall(value))
+    return found
+
+
+def select_key(secret, key):
+    """Returns the (dot separated) key of a fetched secret, or the whole secret if there's no key"""
+
+    for part in key.split('.') if key else []:
+        if not isinstance(secret, dict) or part not in secret:
+            raise SecretError("no key " + repr(key))
+        secret = secret[part]
+    return secret
+
+
+class SecretsResolver:
+    """
+    Replaces ${provider:location#key} placeholders, at any depth of the connectionConfiguration of sources and
+    destinations, with secrets from pluggable providers. Each location is fetched once per resolve, however many
+    placeholders and DTOs refer to it, with up to workers fetches in flight. Fetched secrets are kept for ttl seconds,
+    so later resolves in the same process don't fetch them again.
+    """
+
+    def __init__(self, providers=None, ttl=SECRETS_TTL, workers=RESOLVE_WORKERS):
+        self.providers = providers if providers is not None else default_providers()
+        self.ttl = ttl
+        self.workers = max(1, workers)
+        self.cache = {}  # (provider, location) -> (expires_at, secret)
+        self.lock = threading.Lock()
+        self.fetches = 0
+
+    def register(self, name, provider):
+        self.providers[name] = provider
+
+    def resolve_dtos(self, new_dtos) -> list:
+        """Resolves the placeholders of the sources and destinations in new_dtos in place. Returns the errors."""
+
+        dtos = new_dtos.get('sources', []) + new_dtos.get('destinations', [])
+        references = set()
+        for dto in dtos:
+            find_references(dto.connection_configuration, references)
+        if not references:
+            return []
+        secrets, errors = self.fetch_all({(provider, location) for provider, location, key in references})
+        for dto in dtos:
+            dto.connection_configuration = self.substitute(dto.connection_configuration, secrets, errors)
+        return sorted(set(errors))
+
+    def fetch_all(self, locations):
+        """Fetches each (provider, location) concurrently. Returns ({location: secret}, [error])."""
+
+        def fetch(location):
+            try:
+                return location, self.fetch(*location), None
+            except SecretError as e:
+                return location, None, '${' + location[0] + ':' + location[1] + '}: ' + str(e)
+
+        secrets, errors = {}, []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(locations))) as executor:
+            for location, secret, error in executor.map(fetch, sorted(locations)):
+                if error is None:
+                    secrets[location] = secret
+                else:
+                    errors.append(error)
+        return secrets, errors
+
+    def fetch(self, provider, location):
+        with self.lock:
+            cached = self.cache.get((provider, location))
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        if provider not in self.providers:
+            raise SecretError("unknown secrets provider " + repr(provider))
+        secret = self.providers[provider].fetch(location)
+        with self.lock:
+            self.fetches += 1
+            self.cache[(provider, location)] = (time.monotonic() + self.ttl, secret)
+        return secret
+
+    def substitute(self, value, secrets, errors):
+        """Returns a copy of value with its placeholders replaced. A placeholder which is a whole string keeps the type
+        of the secret, so a structured secret such as a service account can be dropped in whole."""
+
+        if isinstance(value, dict):
+            return {k: self.substitute(v, secrets, errors) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.substitute(v, secrets, errors) for v in value]
+        if not isinstance(value, str) or '${' not in value:
+            return value
+
+        def lookup(match):
+            provider, location, key = match.groups()
+            try:
+                return select_key(secrets[(provider, location)], key)
+            except KeyError:  # the fetch already failed and was reported
+                return None
+            except SecretError as e:
+                errors.append(match.group(0) + ': ' + str(e))
+                return None
+
+        whole = PLACEHOLDER.fullmatch(value)
+        if whole:
+            return lookup(whole)
+        return PLACEHOLDER.sub(lambda match: str(lookup(match)), value)
@@ -0,0 +1,74 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import utils
+from cache import read_json, write_json_atomic
+
+SNAPSHOT_MAX_AGE = 60 * 60  # seconds
+SNAPSHOT_VERSION = 2
+
+
+def content_hash(payload) -> str:
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class SnapshotStore:
+    """
+    Keeps the deployed objects of one workspace on disk between runs, as {kind: {id: {'hash': .., 'payload': ..}}}.
+    A kind saved less than max_age seconds ago is trusted, so the next run only has to re-read what may have changed
+    (see Controller.refresh_connections). A run which modifies the deployment invalidates every kind before its first
+    change and saves the kinds it read from the model when it's done. The kinds it didn't read, which its changes may
+    still have touched (deleting a source deletes its connections), stay untrusted until a run reads them in full.
+    """
+
+    def __init__(self, airbyte_url, workspace_id, cache_dir=None, max_age=SNAPSHOT_MAX_AGE):
+        self.path = os.path.join(cache_dir or utils.cache_dir(),
+                                 'snapshot-' + utils.url_key(airbyte_url) + '-' + workspace_id + '.json')
+        self.max_age = max_age
+        self.lock = threading.Lock()
+
+    def load(self, kind):
+        """Returns {id: {'hash', 'payload'}} for kind if a trusted snapshot of it exists, or None"""
+
+        snapshot = read_json(self.path) or {}
+        if snapshot.get('version') != SNAPSHOT_VERSION or kind not in snapshot.get('kinds', {}):
+            return None
+        entry = snapshot['kinds'][kind]
+        if not entry['complete'] or time.time() - entry['taken_at'] > self.max_age:
+            return None
+        return entry['objects']
+
+    def save(self, airbyte_model, kinds, listed=None):
+        """
+        Stores the given kinds of airbyte_model and marks them as trusted, keeping any other kinds already in the
+        snapshot as they are. Only the kinds in listed (all of them by default) were read in full from the deployment,
+        so only those restart the max_age clock.
+        """
+
+        with self.lock:
+            snapshot = read_json(self.path) or {}
+            if snapshot.get('version') != SNAPSHOT_VERSION:
+                snapshot = {'version': SNAPSHOT_VERSION, 'kinds': {}}
+            for kind in kinds:
+                objects = {}
+                for dto_id, dto in airbyte_model.index_for(kind).items():
+                    payload = dto.to_payload()
+                    objects[dto_id] = {'hash': content_hash(payload), 'payload': payload}
+                taken_at = snapshot['kinds'].get(kind, {}).get('taken_at')
+                if listed is None or kind in listed or taken_at is None:
+                    taken_at = time.time()
+                snapshot['kinds'][kind] = {'taken_at': taken_at, 'complete': True, 'objects': objects}
+            write_json_atomic(self.path, snapshot)
+
+    def invalidate(self):
+        """Marks every kind as not to be trusted until it's saved again, which still keeps its max_age clock"""
+
+        with self.lock:
+            snapshot = read_json(self.path)
+            if snapshot is not None and snapshot.get('version') == SNAPSHOT_VERSION:
+                for entry in snapshot['kinds'].values():
+                    entry['complete'] = False
+                write_json_atomic(self.path, snapshot)
@@ -0,0 +1,212 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+import requests
+import urllib3
+
+import airbyte_client
+from tests.test_fixtures import *
+from airbyte_client import AirbyteClient, AsyncAirbyteClient
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        body = json.dumps({'status': 'ok'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _respond
+    do_POST = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.request = None
+        self.content = b'{}'
+
+    def json(self):
+        return {}
+
+
+@pytest.fixture
+def keep_alive_server():
+    server = HTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:' + str(server.server_port)
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def scripted_session(monkeypatch):
+    """Replaces Session.request with a function returning (or raising) each scripted outcome in turn"""
+
+    calls = []
+    script = [200]  # lets the health check in AirbyteClient.__init__ through
+
+    def request(self, method, url, json=None, timeout=None):
+        calls.append((method, url, timeout))
+        outcome = script.pop(0) if len(script) > 1 else script[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+    monkeypatch.setattr(requests.Session, 'request', request)
+    monkeypatch.setattr(airbyte_client.time, 'sleep', lambda seconds: None)
+    return script, calls
+
+
+def test_connection_stats__reuses_pooled_connections(keep_alive_server):
+    client = AirbyteClient(keep_alive_server)
+    for i in range(5):
+        assert client.list_workspaces().ok
+    stats = client.connection_stats()
+    assert stats['new'] == 1
+    assert stats['reused'] == 5  # the health check in __init__ plus five calls, all over one connection
+    client.close()
+
+
+def test_request__retries_5xx(scripted_session):
+    script, calls = scripted_session
+    client = AirbyteClient('http://airbyte.local', retries=3)
+    calls.clear()
+    script[:] = [502, 503, 200]
+    assert client.list_workspaces().ok
+    assert len(calls) == 3
+
+
+def test_request__gives_up_after_retries(scripted_session):
+    script, calls = scripted_session
+    client = AirbyteClient('http://airbyte.local', retries=2)
+    calls.clear()
+    script[:] = [500]
+    response = client.list_workspaces()
+    assert response.status_code == 500
+    assert len(calls) == 3
+
+
+def test_request__does_not_retry_5xx_on_create(scripted_session, dummy_source_dto):
+    script, calls = scripted_session
+    client = AirbyteClient('http://airbyte.local', retries=3)
+    calls.clear()
+    script[:] = [500, 200]
+    assert client.create_source(dummy_source_dto, {'workspaceId': 'w'}).status_code == 500
+    assert len(calls) == 1
+
+
+def test_request__retries_connection_errors(scripted_session):
+    script, calls = scripted_session
+    client = AirbyteClient('http://airbyte.local', retries=1)
+    calls.clear()
+    script[:] = [requests.exceptions.ConnectionError()]
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.list_workspaces()
+    assert len(calls) == 2
+
+
+def test_request__retries_create_only_if_never_sent(scripted_session, dummy_source_dto):
+    script, calls = scripted_session
+    client = AirbyteClient('http://airbyte.local', retries=3)
+    calls.clear()
+    script[:] = [requests.exceptions.ConnectionError('Connection reset by peer'), 200]
+    with pytest.raises(requests.exceptions.ConnectionError):  # may have been created, so not sent again
+        client.create_source(dummy_source_dto, {'workspaceId': 'w'})
+    assert len(calls) == 1
+    calls.clear()
+    refused = urllib3.exceptions.MaxRetryError(None, '/', urllib3.exceptions.NewConnectionError(None, 'refused'))
+    script[:] = [requests.exceptions.ConnectTimeout(), requests.exceptions.ConnectionError(refused), 200]
+    assert client.create_source(dummy_source_dto, {'workspaceId': 'w'}).ok
+    assert len(calls) == 3
+
+
+def test_get__reports_timeouts(scripted_session, capsys):
+    script, calls = scripted_session
+    client = AirbyteClient('http://airbyte.local', retries=0)
+    script[:] = [requests.exceptions.ReadTimeout()]
+    with pytest.raises(SystemExit):
+        client.health_check()
+    assert 'Error: Unable to connect to the Airbyte API' in capsys.readouterr().out
+
+
+def test_request__per_route_timeouts(scripted_session, dummy_source_dto):
+    script, calls = scripted_session
+    client = AirbyteClient('http://airbyte.local', timeouts={'api/v1/workspaces/list': (1, 2)})
+    calls.clear()
+    client.list_workspaces()
+    client.discover_source_schema(dummy_source_dto)
+    client.get_configured_sources({'workspaceId': 'w'})
+    assert calls[0][2] == (1, 2)
+    assert calls[1][2] == airbyte_client.ROUTE_TIMEOUTS['api/v1/sources/discover_schema']
+    assert calls[2][2] == airbyte_client.DEFAULT_TIMEOUT
+
+
+def test_request__records_route_stats(scripted_session):
+    script, calls = scripted_session
+    client = AirbyteClient('http://airbyte.local', retries=3)
+    script[:] = [502, requests.exceptions.ConnectionError(), 200]
+    assert client.list_workspaces().ok
+    summary = client.stats.summary()
+    assert summary['health']['status_codes'] == {'200': 1}
+    workspaces = summary['workspaces/list']
+    assert (workspaces['calls'], workspaces['errors']) == (3, 2)
+    assert workspaces['status_codes'] == {'502': 1, 'ConnectionError': 1, '200': 1}
+    assert workspaces['bytes_received'] == 2 * len(b'{}')
+
+
+def test_route_stats__percentiles():
+    stats = airbyte_client.RouteStats()
+    for ms in range(1, 101):
+        stats.record('sources/create', ms / 1000, 200, sent=10, received=20)
+    r = stats.summary()['sources/create']
+    assert (r['p50'], r['p95'], r['p99'], r['max']) == (0.05, 0.095, 0.099, 0.1)
+    assert (r['calls'], r['errors'], r['bytes_sent'], r['bytes_received']) == (100, 0, 1000, 2000)
+
+
+class SlowClient:
+    """Stands in for AirbyteClient, recording how many calls overlap"""
+
+    airbyte_url = 'http://airbyte.local/'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def update_source(self, source_dto):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.02)
+        with self.lock:
+            self.in_flight -= 1
+        return source_dto.name
+
+
+def test_async_client__bounded_concurrency(dummy_source_dto):
+    slow_client = SlowClient()
+    async_client = AsyncAirbyteClient(slow_client, concurrency=3)
+
+    async def update_all():
+        return await asyncio.gather(*[async_client.update_source(dummy_source_dto) for i in range(12)])
+
+    results = asyncio.run(update_all())
+    async_client.close()
+    assert results == [dummy_source_dto.name] * 12
+    assert slow_client.max_in_flight == 3
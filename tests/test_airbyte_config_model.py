@@ -3,6 +3,7 @@ from tests.test_fixtures import *
 import yaml
 import utils
 import copy
+import airbyte_config_model
 
 
 def test_airbyte_config_model__write_yaml(dummy_airbyte_config_model, dummy_source_dict,
@@ -18,6 +19,26 @@ def test_airbyte_config_model__write_yaml(dummy_airbyte_config_model, dummy_sour
     assert t['destinations'][0] == dummy_destination_dict
 
 
+def test_airbyte_config_model__write_yaml__streams_same_document(tmp_path, dummy_airbyte_config_model,
+                                                                 dummy_connection_dto, monkeypatch):
+    monkeypatch.setattr(airbyte_config_model, 'YAML_BATCH_SIZE', 2)
+    for i in range(5):  # several batches
+        connection = copy.copy(dummy_connection_dto)
+        connection.connection_id = 'connection-' + str(i)
+        dummy_airbyte_config_model.connections[connection.connection_id] = connection
+    dummy_airbyte_config_model.destinations.clear()
+    dummy_airbyte_config_model.write_yaml(str(tmp_path / 'deployment.yml'))
+    class PythonDumper(yaml.SafeDumper):  # what the whole document looked like through pure python safe_dump
+        def ignore_aliases(self, data):
+            return True
+
+    expected = yaml.dump({'sources': [x.to_payload() for x in dummy_airbyte_config_model.sources.values()],
+                          'destinations': [],
+                          'connections': [x.to_payload() for x in dummy_airbyte_config_model.connections.values()]},
+                         Dumper=PythonDumper)
+    assert open(str(tmp_path / 'deployment.yml')).read() == expected
+
+
 def test_has(dummy_airbyte_config_model, dummy_source_dto, dummy_destination_dto, dummy_connection_dto):
     dummy_source_dto = copy.copy(dummy_source_dto)
     dummy_destination_dto = copy.copy(dummy_destination_dto)
@@ -67,3 +88,38 @@ def test_name_to_id(dummy_airbyte_config_model, dummy_source_dto, dummy_destinat
            == dummy_connection_dto.connection_id
     dummy_connection_dto.name += 'mod'
     assert dummy_airbyte_config_model.name_to_id(dummy_connection_dto.name) is None
+
+
+def test_has__scoped_by_kind(dummy_airbyte_config_model, dummy_source_dto, dummy_destination_dto):
+    destination = copy.copy(dummy_destination_dto)
+    destination.destination_id = None
+    destination.name = dummy_source_dto.name  # a destination sharing its name with an existing source
+    assert dummy_airbyte_config_model.has(destination) is False
+    assert dummy_airbyte_config_model.name_to_id(dummy_source_dto.name, 'destinations') is None
+    assert dummy_airbyte_config_model.name_to_id(dummy_source_dto.name, 'sources') == dummy_source_dto.source_id
+
+
+def test_name_index__follows_updates_and_removals(dummy_airbyte_config_model, dummy_source_dto):
+    sources = dummy_airbyte_config_model.sources
+    renamed = copy.copy(dummy_source_dto)
+    renamed.name = 'renamed'
+    sources[renamed.source_id] = renamed
+    assert dummy_airbyte_config_model.name_to_id(dummy_source_dto.name, 'sources') is None
+    assert dummy_airbyte_config_model.name_to_id('renamed', 'sources') == renamed.source_id
+    sources.pop(renamed.source_id)
+    assert dummy_airbyte_config_model.name_to_id('renamed', 'sources') is None
+    assert len(sources.ids_by_name) == 0
+
+
+def test_name_index__follows_operators_and_copies(dummy_airbyte_config_model, dummy_source_dto):
+    sources = dummy_airbyte_config_model.sources
+    other = copy.copy(dummy_source_dto)
+    other.source_id, other.name = 'other-id', 'other'
+    merged = sources | {other.source_id: other}
+    assert isinstance(merged, airbyte_config_model.DtoIndex) and merged.name_to_id('other') == 'other-id'
+    assert isinstance({other.source_id: other} | sources, airbyte_config_model.DtoIndex)
+    assert not sources.has_name('other')
+    copied = sources.copy()
+    sources |= {other.source_id: other}
+    assert sources.name_to_id('other') == 'other-id'
+    assert isinstance(copied, airbyte_config_model.DtoIndex) and not copied.has_name('other')
@@ -1,5 +1,11 @@
+import copy
+import pickle
+
 import pytest
+import yaml
+
 from tests.test_fixtures import *
+import utils
 
 
 def test_source_dto__to_payload(dummy_source_dto):
@@ -148,4 +154,78 @@ def test_dto_factory__populate_secrets(dummy_airbyte_dto_factory, dummy_secrets_
     new_dtos = {'sources': [dummy_source_dto], 'destinations': [dummy_destination_dto]}
     dummy_airbyte_dto_factory.populate_secrets(dummy_secrets_dict, new_dtos)
     assert new_dtos['sources'][0].connection_configuration['access_token'] == 'ghp_SECRET_TOKEN'
-    assert new_dtos['destinations'][0].connection_configuration['password'] == 'SECRET_POSTGRES_PASSWORD'
\ No newline at end of file
+    assert new_dtos['destinations'][0].connection_configuration['password'] == 'SECRET_POSTGRES_PASSWORD'
+
+
+def test_dto_factory__definition_lookup(dummy_source_definitions, dummy_destination_definitions, dummy_source_dict,
+                                        dummy_destination_dict):
+    """
+    Test AirbyteDtoFactory definition lookups by connector name and by definition id
+    """
+    factory = AirbyteDtoFactory({'sourceDefinitions': dummy_source_definitions},
+                                {'destinationDefinitions': dummy_destination_definitions})
+    source_definition_id = dummy_source_dict.pop('sourceDefinitionId')
+    assert factory.build_source_dto(dummy_source_dict).source_definition_id == source_definition_id
+    destination_name = dummy_destination_dict.pop('destinationName')
+    assert factory.build_destination_dto(dummy_destination_dict).destination_name == destination_name
+    assert factory.report_unknown_definitions() is False
+
+
+def test_dto_factory__reports_unknown_definitions(dummy_source_definitions, dummy_destination_definitions,
+                                                  dummy_source_dict, dummy_destination_dict):
+    """
+    Test that every unknown sourceName and destinationName is collected rather than silently ignored
+    """
+    factory = AirbyteDtoFactory({'sourceDefinitions': dummy_source_definitions},
+                                {'destinationDefinitions': dummy_destination_definitions})
+    dummy_source_dict.pop('sourceDefinitionId')
+    dummy_source_dict['sourceName'] = 'NotAConnector'
+    dummy_destination_dict.pop('destinationDefinitionId')
+    dummy_destination_dict['destinationName'] = 'AlsoNotAConnector'
+    assert factory.build_source_dto(dummy_source_dict).source_definition_id is None
+    assert factory.build_destination_dto(dummy_destination_dict).destination_definition_id is None
+    assert factory.unknown_definitions == [('source', 'NotAConnector', None, 'apache/superset'),
+                                           ('destination', 'AlsoNotAConnector', None, 'devrel-rds')]
+    assert factory.report_unknown_definitions() is True
+
+
+def test_dto_factory__reports_unknown_definition_ids(dummy_source_definitions, dummy_destination_definitions,
+                                                     dummy_source_dict, dummy_destination_dict, capsys):
+    """
+    Test that a definition id matching no definition, when there's no connector name to fall back on, is reported
+    """
+    factory = AirbyteDtoFactory({'sourceDefinitions': dummy_source_definitions},
+                                {'destinationDefinitions': dummy_destination_definitions})
+    dummy_source_dict.pop('sourceName')
+    dummy_source_dict['sourceDefinitionId'] = 'stale-definition-id'
+    dummy_destination_dict.pop('destinationName')
+    dummy_destination_dict['destinationDefinitionId'] = None
+    assert factory.build_source_dto(dummy_source_dict).source_name is None
+    assert factory.build_destination_dto(dummy_destination_dict).destination_name is None
+    assert factory.unknown_definitions == [('source', None, 'stale-definition-id', 'apache/superset'),
+                                           ('destination', None, None, 'devrel-rds')]
+    assert factory.report_unknown_definitions() is True
+    assert "Error: no source definition with id 'stale-definition-id' (used by 'apache/superset')" \
+           in capsys.readouterr().out
+
+
+def test_dto_factory__interns_stream_schemas(dummy_airbyte_dto_factory, dummy_existing_connection_dict):
+    first = dummy_airbyte_dto_factory.build_connection_dto(copy.deepcopy(dummy_existing_connection_dict))
+    second = dummy_airbyte_dto_factory.build_connection_dto(copy.deepcopy(dummy_existing_connection_dict))
+    first_schemas = [x['stream']['jsonSchema'] for x in first.sync_catalog['streams']]
+    second_schemas = [x['stream']['jsonSchema'] for x in second.sync_catalog['streams']]
+    assert all(x is y for x, y in zip(first_schemas, second_schemas))
+    assert first_schemas[0] == dummy_existing_connection_dict['syncCatalog']['streams'][0]['stream']['jsonSchema']
+    with pytest.raises(TypeError):
+        first_schemas[0]['properties']['id'] = {}
+    assert copy.deepcopy(first_schemas[0]) is first_schemas[0]
+    assert pickle.loads(pickle.dumps(first_schemas[0])) == first_schemas[0]
+    assert not hasattr(first, '__dict__')
+
+
+def test_frozen_schemas__dump_to_yaml_without_aliases(dummy_airbyte_dto_factory, dummy_existing_connection_dict):
+    connections = [dummy_airbyte_dto_factory.build_connection_dto(copy.deepcopy(dummy_existing_connection_dict))
+                   for i in range(2)]
+    dumped = yaml.dump([x.to_payload() for x in connections], Dumper=utils.YamlDumper)
+    assert '&id' not in dumped and '*id' not in dumped
+    assert yaml.safe_load(dumped)[1]['syncCatalog'] == dummy_existing_connection_dict['syncCatalog']
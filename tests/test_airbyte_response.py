@@ -36,3 +36,13 @@ def test_unrecognized_response_code():
     assert airbyte_response.message == "Error: Unrecognized response code"
     assert airbyte_response.payload['attribute'] == 'value'
     assert not airbyte_response.ok
+
+
+def test_empty_body():
+    response = requests.Response()
+    response.status_code = 204
+    response._content = b''
+    airbyte_response = AirbyteResponse(response)
+
+    assert airbyte_response.payload == {}
+    assert airbyte_response.message == RESPONSE_CODES[204]
@@ -0,0 +1,72 @@
+import argparse
+import asyncio
+import gzip
+
+import pytest
+from tests.test_fixtures import *
+from tests.test_scheduler import FakeAsyncClient
+from airbyte_config_model import AirbyteConfigModel
+from backup import build_restore_dtos, is_backup_file, read_backup, write_backup
+from controller import AsyncController
+from scheduler import ApplyScheduler
+
+
+def test_backup__round_trip(tmp_path, dummy_airbyte_config_model, dummy_connection_dto):
+    filename = str(tmp_path / 'backup.jsonl.gz')
+    assert is_backup_file(filename) and not is_backup_file('config.yml')
+    assert write_backup(dummy_airbyte_config_model, filename) == 3
+    gzip.open(filename).read()  # compressed
+    entries = list(read_backup(filename))
+    assert [kind for kind, payload in entries] == ['sources', 'destinations', 'connections']
+    assert entries[2][1] == dummy_connection_dto.to_payload()
+
+
+def test_backup__rejects_other_files(tmp_path):
+    filename = str(tmp_path / 'other.jsonl')
+    open(filename, 'w').write('{"kind": "sources"}\n')
+    with pytest.raises(ValueError):
+        list(read_backup(filename))
+
+
+def test_restore__into_empty_deployment(tmp_path, dummy_airbyte_config_model, dummy_airbyte_dto_factory,
+                                        dummy_source_dto):
+    filename = str(tmp_path / 'backup.jsonl')
+    write_backup(dummy_airbyte_config_model, filename)
+    empty_model = AirbyteConfigModel()
+    kinds = ['sources', 'destinations', 'connections']
+    dtos = build_restore_dtos(filename, dummy_airbyte_dto_factory, empty_model, kinds)
+    connection = dtos['connections'][0]
+    assert dtos['sources'][0].source_id is None  # not deployed any more, so it is created again
+    assert (connection.source_id, connection.source_name) == (None, dummy_source_dto.name)
+
+    controller = AsyncController()
+    controller.dto_factory = dummy_airbyte_dto_factory
+    scheduler = ApplyScheduler(controller, empty_model, FakeAsyncClient(), {'workspaceId': 'w'})
+    scheduler.build_graph(dtos, kinds)
+    assert asyncio.run(scheduler.run())
+    restored = list(empty_model.connections.values())[0]
+    assert restored.source_id == 'id-' + dummy_source_dto.name  # points at the recreated source
+
+
+def test_restore__keeps_ids_still_deployed(tmp_path, dummy_airbyte_config_model, dummy_airbyte_dto_factory,
+                                           dummy_source_dto):
+    filename = str(tmp_path / 'backup.jsonl.gz')
+    write_backup(dummy_airbyte_config_model, filename)
+    dtos = build_restore_dtos(filename, dummy_airbyte_dto_factory, dummy_airbyte_config_model, ['sources'])
+    assert list(dtos) == ['sources']
+    assert dtos['sources'][0].source_id == dummy_source_dto.source_id
+
+
+def test_read_backup__refuses_to_create_with_masked_secrets(tmp_path, dummy_airbyte_config_model,
+                                                            dummy_airbyte_dto_factory, dummy_source_dto, capsys):
+    filename = str(tmp_path / 'backup.jsonl')
+    write_backup(dummy_airbyte_config_model, filename)  # the source's access_token is masked, as read from the API
+    controller = AsyncController()
+    controller.dto_factory = dummy_airbyte_dto_factory
+    args = argparse.Namespace(origin=filename, secrets=None, sources=True, destinations=False, connections=False,
+                              all=False)
+    dtos = controller.read_backup(args, AirbyteConfigModel())
+    assert dtos['sources'] == [] and [x.name for x in controller.unrestorable] == [dummy_source_dto.name]
+    assert "Error: unable to restore source 'apache/superset'" in capsys.readouterr().out
+    dtos = controller.read_backup(args, dummy_airbyte_config_model)  # still deployed: updated, keeping its secret
+    assert len(dtos['sources']) == 1 and controller.unrestorable == []
@@ -0,0 +1,37 @@
+import json
+
+import pytest
+from tests.test_fixtures import *
+import bench
+import topiary
+
+
+def test_parse_scale():
+    assert bench.parse_scale('20,2,40') == (20, 2, 40)
+    with pytest.raises(SystemExit):
+        bench.parse_scale('20,2')
+    with pytest.raises(SystemExit):
+        bench.parse_scale('2,2,5')  # only 4 distinct pairs
+
+
+def test_synthetic_config__valid_and_unique_pairs():
+    config = bench.synthetic_config(5, 3, 15)
+    pairs = {(x['sourceName'], x['destinationName']) for x in config['connections']}
+    assert len(pairs) == 15
+    assert len(config['connections'][0]['syncCatalog']['streams']) == bench.BENCH_STREAMS
+
+
+def test_bench__runs_every_phase(tmp_path):
+    report_file = str(tmp_path / 'bench.json')
+    topiary.main(topiary.build_parser().parse_args(['bench', '4,2,6', '--concurrency', '4', '--report', report_file]))
+    report = json.load(open(report_file))
+    assert [x['phase'] for x in report['phases']] == ['sync', 'plan', 'export', 'validate', 'wipe']
+    assert all(x['exit_code'] == 0 and x['api_calls'] > 0 for x in report['phases'])
+    sync = report['phases'][0]
+    assert sync['api_calls'] >= 4 + 2 + 6  # one create per object, at least
+
+
+def test_peak_rss_mb__optional(monkeypatch):
+    assert bench.peak_rss_mb() is None or bench.peak_rss_mb() > 0
+    monkeypatch.setattr(bench, 'resource', None)  # as on Windows
+    assert bench.peak_rss_mb() is None
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+from tests.test_fixtures import *
+from benchmarks import micro
+
+
+def test_fit_exponent():
+    assert micro.fit_exponent([(n, 2e-6 * n) for n in (100, 1000, 10000, 100000)]) == pytest.approx(1)
+    assert micro.fit_exponent([(n, 1e-9 * n * n) for n in (1000, 10000)]) == pytest.approx(2)
+    assert micro.fit_exponent([(100, 1.0), (1000, 1.0)]) is None  # one point from FIT_MIN_SIZE up
+
+
+def test_check__catches_quadratic_and_slow_operations():
+    thresholds = {'model_has': {'max_exponent': 1.35, 'max_us_per_object': 6}}
+    quadratic = {'points': [(1000, 0.001), (10000, 0.1)], 'exponent': 2.0}
+    assert micro.check('model_has', quadratic, thresholds) == [
+        "model_has scales as n^2.00, over the n^1.35 allowed",
+        "model_has takes 10.0us per object at n=10000, over the 6us allowed"]
+    assert micro.check('model_has', {'points': [(1000, 0.001)], 'exponent': None}, thresholds) == []
+
+
+def test_run__times_every_operation():
+    curves = micro.run([100, 1000], {'write_yaml': {'max_size': 100}})
+    assert sorted(curves) == sorted(micro.operations('.'))
+    assert [n for n, seconds in curves['write_yaml']['points']] == [100]
+    assert [n for n, seconds in curves['model_has']['points']] == [100, 1000]
+
+
+def test_run__within_thresholds():
+    """
+    The committed thresholds hold at test sizes. An operation over them is timed once more before the test fails, as
+    a single run this small can be thrown off by load on the machine; an O(n^2) regression fails both.
+    """
+
+    with open(micro.THRESHOLDS_FILE) as f:
+        thresholds = json.load(f)
+    sizes = [1000, 5000]
+    curves = micro.run(sizes, thresholds)
+    failed = [name for name, curve in curves.items() if micro.check(name, curve, thresholds)]
+    if failed:
+        curves.update(micro.run(sizes, thresholds, failed))
+    assert sorted(curves) == sorted(thresholds)
+    assert [message for name, curve in curves.items() for message in micro.check(name, curve, thresholds)] == []
@@ -0,0 +1,84 @@
+import copy
+import os
+
+import pytest
+from tests.test_fixtures import *
+from airbyte_client import AirbyteResponse
+from cache import DefinitionsCache, DiscoveryCache, LazyDefinitions, read_json, write_json_atomic
+import utils
+
+
+def test_definitions_cache__keyed_by_url(tmp_path, dummy_source_definitions):
+    cache = DefinitionsCache('http://airbyte-a:8000/', cache_dir=str(tmp_path))
+    cache.put('source_definitions', {'sourceDefinitions': dummy_source_definitions})
+    assert cache.get('source_definitions') == {'sourceDefinitions': dummy_source_definitions}
+    assert cache.get('destination_definitions') is None
+    assert DefinitionsCache('http://airbyte-a:8000', cache_dir=str(tmp_path)).get('source_definitions') is not None
+    assert DefinitionsCache('http://airbyte-b:8000', cache_dir=str(tmp_path)).get('source_definitions') is None
+
+
+def test_definitions_cache__ttl_and_invalidate(tmp_path):
+    cache = DefinitionsCache('http://airbyte:8000', cache_dir=str(tmp_path), ttl=-1)
+    cache.put('source_definitions', {'sourceDefinitions': []})
+    assert cache.get('source_definitions') is None  # already expired
+    cache.ttl = 60
+    assert cache.get('source_definitions') == {'sourceDefinitions': []}
+    cache.invalidate()
+    assert cache.get('source_definitions') is None
+
+
+def test_lazy_definitions__loads_once_on_first_read():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return {'sourceDefinitions': []}
+
+    definitions = LazyDefinitions(loader)
+    assert calls == []
+    assert definitions['sourceDefinitions'] == []
+    assert definitions['sourceDefinitions'] == []
+    assert calls == [1]
+
+
+class Discoverer:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, source_dto):
+        self.calls += 1
+        return AirbyteResponse.from_payload({'catalog': {'streams': [{'stream': {'name': source_dto.name}}]}})
+
+
+def test_discovery_cache__discovers_each_source_once(tmp_path, dummy_source_dto):
+    discover = Discoverer()
+    cache = DiscoveryCache(cache_dir=str(tmp_path), persist=False)
+    for i in range(20):
+        assert cache.get_or_discover(dummy_source_dto, discover).payload['catalog']['streams'][0]['stream']['name'] \
+               == dummy_source_dto.name
+    assert discover.calls == 1
+
+
+def test_discovery_cache__disk_layer_and_refresh(tmp_path, dummy_source_dto):
+    discover = Discoverer()
+    DiscoveryCache(cache_dir=str(tmp_path)).get_or_discover(dummy_source_dto, discover)
+    DiscoveryCache(cache_dir=str(tmp_path)).get_or_discover(dummy_source_dto, discover)  # a later run
+    assert discover.calls == 1
+    changed = copy.copy(dummy_source_dto)
+    changed.connection_configuration = {'access_token': '**********', 'repository': 'apache/airflow'}
+    DiscoveryCache(cache_dir=str(tmp_path)).get_or_discover(changed, discover)
+    assert discover.calls == 2
+    DiscoveryCache(cache_dir=str(tmp_path), refresh=True).get_or_discover(dummy_source_dto, discover)
+    assert discover.calls == 3
+
+
+def test_write_atomic__replaces_without_leaving_temporary_files(tmp_path, monkeypatch):
+    path = str(tmp_path / 'cached.json')
+    write_json_atomic(path, {'a': 1})
+    write_json_atomic(path, {'a': 2})
+    assert read_json(path) == {'a': 2}
+    monkeypatch.setattr(os, 'replace', lambda *args: (_ for _ in ()).throw(OSError('disk full')))
+    with pytest.raises(OSError):
+        utils.write_atomic(path, b'{"a": 3}')
+    assert read_json(path) == {'a': 2}
+    assert os.listdir(str(tmp_path)) == ['cached.json']
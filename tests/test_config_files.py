@@ -0,0 +1,99 @@
+import copy
+import os
+
+import yaml
+
+import pytest
+from tests.test_fixtures import *
+import utils
+import config_files
+from config_files import read_config_files, shard_filename, write_config_dir
+
+
+def test_config_dir__one_file_per_object(tmp_path, dummy_airbyte_config_model, dummy_source_dto):
+    directory = str(tmp_path / 'deployment') + '/'
+    assert utils.is_config_dir(directory) and not utils.is_config_dir('http://airbyte:8000/')
+    assert write_config_dir(dummy_airbyte_config_model, directory) == {'written': 3, 'unchanged': 0, 'removed': 0}
+    assert os.listdir(os.path.join(directory, 'sources')) == ['apache-superset-' + dummy_source_dto.source_id[:8]
+                                                              + '.yml']
+    config = read_config_files(directory, use_cache=False)
+    assert config['sources'] == [dummy_source_dto.to_payload()]
+    assert [len(config[kind]) for kind in ('sources', 'destinations', 'connections')] == [1, 1, 1]
+
+
+def test_config_dir__only_changed_files_are_written(tmp_path, dummy_airbyte_config_model, dummy_source_dto,
+                                                   dummy_connection_dto):
+    directory = str(tmp_path)
+    write_config_dir(dummy_airbyte_config_model, directory)
+    untouched = os.path.join(directory, 'destinations', os.listdir(os.path.join(directory, 'destinations'))[0])
+    mtime = os.stat(untouched).st_mtime_ns
+    changed = copy.copy(dummy_source_dto)
+    changed.connection_configuration = {**dummy_source_dto.connection_configuration, 'repository': 'apache/airflow'}
+    dummy_airbyte_config_model.sources[changed.source_id] = changed
+    dummy_airbyte_config_model.connections.pop(dummy_connection_dto.connection_id)
+    assert write_config_dir(dummy_airbyte_config_model, directory) == {'written': 1, 'unchanged': 1, 'removed': 1}
+    assert os.stat(untouched).st_mtime_ns == mtime
+    config = read_config_files(directory, use_cache=False)
+    assert config['sources'][0]['connectionConfiguration']['repository'] == 'apache/airflow'
+    assert 'connections' not in config
+
+
+def test_shard_filename__is_filesystem_safe(dummy_connection_dto):
+    connection = copy.copy(dummy_connection_dto)
+    connection.name = '../github: superset -> postgres'
+    assert shard_filename(connection) == 'github-superset-postgres-' + connection.connection_id[:8] + '.yml'
+
+
+def write_team_configs(directory, dummy_source_dict, count):
+    for i in range(count):
+        source = {**dummy_source_dict, 'name': 'source-' + str(i)}
+        os.makedirs(os.path.join(directory, 'team-' + str(i)), exist_ok=True)
+        yaml.safe_dump({'sources': [source]}, open(os.path.join(directory, 'team-' + str(i), 'config.yml'), 'w'))
+
+
+def test_read_config_files__glob_reparses_only_changed_files(tmp_path, dummy_source_dict, monkeypatch):
+    write_team_configs(str(tmp_path / 'teams'), dummy_source_dict, 3)
+    parsed = []
+    monkeypatch.setattr(config_files, 'parse_config_file', lambda path: parsed.append(path) or utils.load_yaml(path))
+    origin = str(tmp_path / 'teams' / '*' / 'config.yml')
+    assert utils.is_config_glob(origin) and utils.is_config_file(origin)
+    config = read_config_files(origin, cache_dir=str(tmp_path))
+    assert [x['name'] for x in config['sources']] == ['source-0', 'source-1', 'source-2']
+    assert len(parsed) == 3
+    edited = str(tmp_path / 'teams' / 'team-1' / 'config.yml')
+    yaml.safe_dump({'sources': [{**dummy_source_dict, 'name': 'renamed'}]}, open(edited, 'w'))
+    config = read_config_files(origin, cache_dir=str(tmp_path))
+    assert parsed[3:] == [edited]
+    assert [x['name'] for x in config['sources']] == ['source-0', 'renamed', 'source-2']
+    cache_file, = [x for x in os.listdir(str(tmp_path)) if x.endswith('.pickle')]
+    if os.name == 'posix':
+        assert os.stat(str(tmp_path / cache_file)).st_mode & 0o777 == 0o600  # the parsed configs may hold secrets
+
+
+def test_read_config_files__parallel_parse(tmp_path, dummy_source_dict):
+    write_team_configs(str(tmp_path / 'teams'), dummy_source_dict, config_files.PARALLEL_PARSE_MIN + 2)
+    config = read_config_files(str(tmp_path / 'teams') + '/', use_cache=False)
+    assert len(config['sources']) == config_files.PARALLEL_PARSE_MIN + 2
+
+
+def test_read_config_files__duplicate_names(tmp_path, dummy_source_dict, capsys):
+    write_team_configs(str(tmp_path / 'teams'), dummy_source_dict, 2)
+    yaml.safe_dump({'sources': [{**dummy_source_dict, 'name': 'source-0'}]},
+                   open(str(tmp_path / 'teams' / 'team-1' / 'config.yml'), 'w'))
+    with pytest.raises(SystemExit):
+        read_config_files(str(tmp_path / 'teams'), use_cache=False)
+    assert "source 'source-0' is defined in both" in capsys.readouterr().out
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid'), reason='file ownership is only checked on POSIX')
+def test_parsed_config_cache__ignores_files_others_can_write(tmp_path, dummy_source_dict, capsys):
+    write_team_configs(str(tmp_path / 'teams'), dummy_source_dict, 2)
+    origin = str(tmp_path / 'teams') + '/'
+    read_config_files(origin, cache_dir=str(tmp_path))
+    cache = config_files.ParsedConfigCache(origin, cache_dir=str(tmp_path))
+    assert len(cache.load()) == 2
+    os.chmod(cache.path, 0o666)  # as if planted in, or left open in, a shared cache directory
+    assert cache.load() == {}
+    assert 'Warning: ignoring config cache' in capsys.readouterr().out
+    read_config_files(origin, cache_dir=str(tmp_path))  # parses again, and saves a private cache
+    assert len(cache.load()) == 2
@@ -1,3 +1,4 @@
+
 import pytest
 from tests.test_fixtures import *
 
@@ -31,4 +32,60 @@ def test_check_required(dummy_config_loader, dummy_source_dict, dummy_destinatio
     dummy_new_connection_dict.pop("sourceName")
     assert dummy_config_loader.check_required(dummy_source_dict, required_source_fields) is False
     assert dummy_config_loader.check_required(dummy_destination_dict, required_destination_fields) is False
-    assert dummy_config_loader.check_required(dummy_new_connection_dict, required_connection_fields) is False
\ No newline at end of file
+    assert dummy_config_loader.check_required(dummy_new_connection_dict, required_connection_fields) is False
+
+
+def test_validate_config__reports_every_error(dummy_source_dict, dummy_destination_dict, dummy_new_connection_dict,
+                                              dummy_config_loader, capsys):
+    bad_source = dict(dummy_source_dict)
+    bad_source.pop('sourceName')
+    dangling = dict(dummy_new_connection_dict, name='dangling', sourceName='missing', status='paused')
+    config = {'sources': [dummy_source_dict, bad_source, dummy_source_dict],
+              'destinations': [dict(dummy_destination_dict, name='postgres')],
+              'connections': [dummy_new_connection_dict, dangling, 'not-a-connection']}
+    assert dummy_config_loader.validate_config(config) is False
+    assert dummy_config_loader.errors == [
+        "source #2 'apache/superset' is missing sourceName",
+        "source #3 'apache/superset' has the same name as an earlier one",
+        "connection #2 'dangling' has status 'paused', expected one of active, inactive, deprecated",
+        "connection #2 'dangling' refers to source 'missing', which isn't defined in config",
+        "connection #3 is not a mapping"]
+    assert capsys.readouterr().out.count("Error: ") == 5
+
+
+def test_validate_config__references_by_id_and_deployment(dummy_source_dict, dummy_destination_dict,
+                                                          dummy_new_connection_dict, dummy_airbyte_config_model):
+    by_id = {'sourceId': dummy_source_dict['sourceId'], 'destinationId': 'unknown-id',
+             'schedule': None, 'status': 'inactive'}
+    deployed_only = dict(dummy_new_connection_dict, name='deployed', destinationName='devrel-rds')
+    config = {'sources': [dummy_source_dict], 'connections': [by_id, deployed_only]}
+    validator = config_validator.ConfigValidator()
+    assert validator.validate_config(config) is False  # offline, only names in config resolve
+    assert validator.errors == ["connection #2 'deployed' refers to destination 'devrel-rds', which isn't defined "
+                                "in config"]
+    validator = config_validator.ConfigValidator()
+    assert validator.validate_config(config, dummy_airbyte_config_model) is False
+    assert validator.errors == ["connection #1 refers to destinationId 'unknown-id', which doesn't exist"]
+
+
+def test_validate_config__connection_groups(dummy_config_loader):
+    group = {'groupName': 'g', 'sourceTags': [], 'destinationTags': ['bq'], 'prefix': '', 'schedule': None,
+             'status': 'active'}
+    assert dummy_config_loader.validate_config({'connections': [group]}) is False
+    assert dummy_config_loader.errors == ["connection #1 'g' needs a non-empty list of sourceTags"]
+
+
+def test_validate_config__large_config(dummy_source_dict, dummy_destination_dict, dummy_new_connection_dict,
+                                       dummy_config_loader, monkeypatch):
+    """Each reference is checked once, against indexes rather than by scanning; benchmarks/micro.py times it"""
+    n = 5000
+    config = {'sources': [dict(dummy_source_dict, name='s' + str(i)) for i in range(n)],
+              'destinations': [dict(dummy_destination_dict, name='d' + str(i)) for i in range(n // 10)],
+              'connections': [dict(dummy_new_connection_dict, name='c' + str(i), sourceName='s' + str(i),
+                                   destinationName='d' + str(i % (n // 10))) for i in range(n)]}
+    checked = []
+    check_reference = dummy_config_loader.check_reference
+    monkeypatch.setattr(dummy_config_loader, 'check_reference', lambda *args: checked.append((args[2], type(args[3])))
+                        or check_reference(*args))
+    assert dummy_config_loader.validate_config(config) is True
+    assert len(checked) == 2 * n and set(checked) == {('source', set), ('destination', set)}  # names looked up in sets
@@ -0,0 +1,66 @@
+import copy
+import time
+
+import pytest
+from tests.test_fixtures import *
+from airbyte_config_model import AirbyteConfigModel
+from connection_groups import TagIndex, expand_connection_groups
+
+
+def tagged(dto, name, tags):
+    r = copy.copy(dto)
+    r.name = name
+    r.tags = tags
+    return r
+
+
+def test_tag_index__intersects_postings():
+    index = TagIndex()
+    index.add('a', ['github', 'red'])
+    index.add('b', ['github'])
+    index.add('c', ['github', 'red', 'blue'])
+    assert index.match(['github', 'red']) == ['a', 'c']
+    assert index.match(['red', 'missing']) == []
+    assert index.match([]) == []
+
+
+def test_expand__groups_into_connections(dummy_source_dto, dummy_destination_dto, dummy_connection_group_dto):
+    config = {'sources': [tagged(dummy_source_dto, 's1', ['github', 'red']),
+                          tagged(dummy_source_dto, 's2', ['github']),
+                          tagged(dummy_source_dto, 's3', ['red', 'github'])],
+              'destinations': [tagged(dummy_destination_dto, 'd1', ['postgres', 'blue'])],
+              'connectionGroups': [dummy_connection_group_dto]}
+    expanded = expand_connection_groups(config, AirbyteConfigModel())
+    assert [(x.name, x.source_name, x.destination_name, x.connection_id) for x in expanded] == \
+           [('github-to-postgres-s1-d1', 's1', 'd1', None), ('github-to-postgres-s3-d1', 's3', 'd1', None)]
+    assert expanded[0].prefix == 'github_'
+
+
+def test_expand__dedupes_configured_and_deployed(dummy_airbyte_config_model, dummy_source_dto, dummy_destination_dto,
+                                                 dummy_connection_dto, dummy_connection_group_dto):
+    configured = copy.copy(dummy_connection_dto)
+    configured.source_name, configured.destination_name = 's1', 'd1'
+    configured.source_id = configured.destination_id = None
+    config = {'sources': [tagged(dummy_source_dto, 's1', ['github', 'red']),
+                          tagged(dummy_source_dto, dummy_source_dto.name, ['github', 'red'])],
+              'destinations': [tagged(dummy_destination_dto, 'd1', ['postgres', 'blue']),
+                               tagged(dummy_destination_dto, dummy_destination_dto.name, ['postgres', 'blue'])],
+              'connections': [configured],
+              'connectionGroups': [dummy_connection_group_dto, dummy_connection_group_dto]}
+    expanded = expand_connection_groups(config, dummy_airbyte_config_model)
+    pairs = [(x.source_name, x.destination_name) for x in expanded]
+    assert pairs == [('s1', dummy_destination_dto.name), (dummy_source_dto.name, 'd1'),
+                     (dummy_source_dto.name, dummy_destination_dto.name)]
+    existing = expanded[2]  # already deployed: updated in place rather than created again
+    assert (existing.connection_id, existing.name) == (dummy_connection_dto.connection_id, dummy_connection_dto.name)
+
+
+def test_expand__large_groups(dummy_source_dto, dummy_destination_dto, dummy_connection_group_dto):
+    config = {'sources': [tagged(dummy_source_dto, 's' + str(i), ['github', 'red'] if i % 2 else ['github'])
+                          for i in range(2000)],
+              'destinations': [tagged(dummy_destination_dto, 'd' + str(i), ['postgres', 'blue']) for i in range(5)],
+              'connectionGroups': [dummy_connection_group_dto]}
+    start = time.perf_counter()
+    expanded = expand_connection_groups(config, AirbyteConfigModel())
+    assert len(expanded) == 5000
+    assert time.perf_counter() - start < 1
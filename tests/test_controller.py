@@ -0,0 +1,102 @@
+import argparse
+import copy
+import threading
+import time
+import types
+
+import pytest
+from tests.test_fixtures import *
+from airbyte_client import AirbyteResponse
+from controller import AsyncController, Controller
+import utils
+
+
+class FakeListClient:
+    """Serves one object of each kind, each list call taking 50ms. in_flight_peak is the most calls served at once."""
+
+    airbyte_url = 'http://airbyte:8000'
+
+    def __init__(self, payloads):
+        self.payloads = payloads
+        self.calls = []
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.in_flight_peak = 0
+
+    def list(self, kind):
+        with self.lock:
+            self.calls.append(kind)
+            self.in_flight += 1
+            self.in_flight_peak = max(self.in_flight_peak, self.in_flight)
+        time.sleep(0.05)
+        with self.lock:
+            self.in_flight -= 1
+        return AirbyteResponse.from_payload({kind: self.payloads[kind]})
+
+    def get_configured_sources(self, workspace):
+        return self.list('sources')
+
+    def get_configured_destinations(self, workspace):
+        return self.list('destinations')
+
+    def get_configured_connections(self, workspace):
+        return self.list('connections')
+
+
+@pytest.fixture
+def list_client(dummy_source_dict, dummy_destination_dict, dummy_existing_connection_dict):
+    return FakeListClient({'sources': [dummy_source_dict], 'destinations': [dummy_destination_dict],
+                           'connections': [dummy_existing_connection_dict]})
+
+
+def test_get_airbyte_configuration__concurrent_list_calls(list_client, dummy_airbyte_dto_factory, dummy_source_dto,
+                                                         dummy_destination_dto, dummy_connection_dto):
+    controller = Controller()
+    controller.dto_factory = dummy_airbyte_dto_factory
+    airbyte_model = controller.get_airbyte_configuration(list_client, {'workspaceId': 'ws'})
+    assert list_client.in_flight_peak > 1  # the list calls overlap
+    assert list(airbyte_model.sources) == [dummy_source_dto.source_id]
+    assert list(airbyte_model.destinations) == [dummy_destination_dto.destination_id]
+    assert list(airbyte_model.connections) == [dummy_connection_dto.connection_id]
+    assert {'read_deployment', 'fetch_sources', 'build_connections'} <= set(controller.timings)
+
+
+def test_get_airbyte_configuration__only_required_kinds(list_client, dummy_airbyte_dto_factory):
+    controller = Controller()
+    controller.dto_factory = dummy_airbyte_dto_factory
+    airbyte_model = controller.get_airbyte_configuration(list_client, {'workspaceId': 'ws'}, ['sources'])
+    assert list_client.calls == ['sources']
+    assert len(airbyte_model.sources) == 1 and not airbyte_model.destinations
+
+
+def args(mode, target=None, wipe=False, backup_file=None, **kinds):
+    return argparse.Namespace(mode=mode, target=target, wipe=wipe, backup_file=backup_file,
+                              **{x: kinds.get(x, False) for x in ('sources', 'destinations', 'connections', 'all')})
+
+
+def test_required_kinds():
+    assert utils.required_kinds(args('validate', sources=True)) == ['sources']
+    assert utils.required_kinds(args('validate', connections=True)) == ['sources', 'destinations', 'connections']
+    assert utils.required_kinds(args('wipe', destinations=True)) == ['destinations', 'connections']
+    assert utils.required_kinds(args('sync', sources=True)) == ['sources']
+    assert utils.required_kinds(args('sync', sources=True, wipe=True)) == utils.KINDS
+    assert utils.required_kinds(args('sync', target='out.yml')) == utils.KINDS
+
+
+@pytest.mark.parametrize('controller_class', [Controller, AsyncController])  # the serial path works with either
+def test_sync_connections_to_deployment__skips_unresolved(controller_class, dummy_airbyte_config_model,
+                                                          dummy_connection_dto):
+    class UpdateClient:
+        def __init__(self):
+            self.updated = []
+
+        def update_connection(self, connection):
+            self.updated.append(connection.name)
+            return AirbyteResponse(types.SimpleNamespace(status_code=500, ok=False, json=dict))
+
+    unresolved = copy.copy(dummy_connection_dto)
+    unresolved.name, unresolved.source_id, unresolved.source_name = 'unresolved', None, 'missing'
+    client = UpdateClient()
+    controller_class().sync_connections_to_deployment(dummy_airbyte_config_model, client,
+                                                      {'connections': [unresolved, copy.copy(dummy_connection_dto)]})
+    assert client.updated == [dummy_connection_dto.name]
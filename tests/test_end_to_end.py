@@ -0,0 +1,143 @@
+import json
+
+import pytest
+import yaml
+from tests.test_fixtures import *
+from fake_server import FakeAirbyteServer
+import topiary
+
+CONFIG = {
+    'sources': [{'name': 'apache/superset', 'sourceName': 'GitHub',
+                 'connectionConfiguration': {'repository': 'apache/superset', 'access_token': '${env:GH_TOKEN}'}},
+                {'name': 'apache/airflow', 'sourceName': 'GitHub',
+                 'connectionConfiguration': {'repository': 'apache/airflow', 'access_token': '${env:GH_TOKEN}'}}],
+    'destinations': [{'name': 'warehouse', 'destinationName': 'Postgres', 'connectionConfiguration': {'host': 'db'}}],
+    'connections': [{'sourceName': 'apache/superset', 'destinationName': 'warehouse', 'name': 'superset-to-warehouse',
+                     'prefix': 'github_superset_', 'schedule': {'units': 24, 'timeUnit': 'hours'},
+                     'status': 'inactive'}],
+}
+
+
+@pytest.fixture
+def fake_server(tmp_path, monkeypatch):
+    monkeypatch.setenv('TOPIARY_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setenv('GH_TOKEN', 'ghp_secret')
+    with FakeAirbyteServer() as server:
+        yield server
+
+
+def run(*argv):
+    topiary.main(topiary.build_parser().parse_args(list(argv)))
+
+
+def seed(server, sources=20, destinations=2):
+    destination_ids = [server.add_destination('d' + str(i))['destinationId'] for i in range(destinations)]
+    for i in range(sources):
+        source_id = server.add_source('s' + str(i))['sourceId']
+        server.add_connection('c' + str(i), source_id, destination_ids[i % destinations])
+
+
+def test_sync__creates_then_leaves_unchanged(fake_server, tmp_path):
+    config = tmp_path / 'config.yml'
+    config.write_text(yaml.dump(CONFIG))
+    run('sync', str(config), '--target', fake_server.url, '--all', '--concurrency', '4')
+    assert sorted(x['name'] for x in fake_server.sources.values()) == ['apache/airflow', 'apache/superset']
+    assert [x['connectionConfiguration']['access_token'] for x in fake_server.sources.values()] == ['ghp_secret'] * 2
+    connection, = fake_server.connections.values()
+    assert connection['name'] == 'superset-to-warehouse'
+    assert len(connection['syncCatalog']['streams']) == 3  # discovered, since config gives no syncCatalog
+    assert fake_server.calls['api/v1/sources/discover_schema'] == 1
+
+    fake_server.calls.clear()
+    run('sync', str(config), '--target', fake_server.url, '--all')
+    assert not [route for route in fake_server.calls if route.endswith(('/create', '/update'))]
+
+
+def test_sync__to_yaml(fake_server, tmp_path, capsys):
+    seed(fake_server, sources=3, destinations=1)
+    target = tmp_path / 'deployment.yml'
+    run('sync', fake_server.url, '--target', str(target), '--all')
+    assert 'Validation summary' not in capsys.readouterr().out  # nothing was checked
+    written = yaml.safe_load(target.read_text())
+    assert sorted(x['name'] for x in written['sources']) == ['s0', 's1', 's2']
+    assert len(written['connections']) == 3
+
+
+def test_wipe__retries_injected_errors(fake_server):
+    seed(fake_server)
+    fake_server.error_rate = 0.1
+    run('wipe', fake_server.url, '--all', '--concurrency', '8')
+    assert (fake_server.sources, fake_server.destinations, fake_server.connections) == ({}, {}, {})
+
+
+def test_wipe__concurrent_deletes_with_latency(fake_server):
+    seed(fake_server, sources=20, destinations=2)
+    fake_server.latency = 0.05
+    run('wipe', fake_server.url, '--all', '--concurrency', '10')
+    assert fake_server.sources == {}
+    assert 1 < fake_server.in_flight_peak <= 10  # deletes overlap, up to --concurrency of them
+    assert [fake_server.calls['api/v1/' + kind + '/delete'] for kind in ('connections', 'sources', 'destinations')] \
+        == [20, 20, 2]  # each object deleted once
+
+
+def test_validate__reports_failed_checks(fake_server, tmp_path):
+    seed(fake_server, sources=4, destinations=1)
+    failing = next(x['sourceId'] for x in fake_server.sources.values() if x['name'] == 's1')
+    fake_server.failing_checks.add(failing)
+    report = tmp_path / 'report.json'
+    run('validate', fake_server.url, '--all', '--concurrency', '4', '--report', str(report))
+    summary = json.loads(report.read_text())['summary']
+    assert (summary['succeeded'], summary['failed']) == (7, 2)  # s1 and the connection c1 which uses it
+    assert fake_server.calls['api/v1/sources/check_connection'] == 4  # once each, not once per connection too
+
+
+def test_profile__written_at_exit(fake_server, tmp_path):
+    seed(fake_server, sources=3, destinations=1)
+    profile = tmp_path / 'profile.json'
+    run('wipe', fake_server.url, '--all', '--profile-output', str(profile))
+    routes = json.loads(profile.read_text())['routes']
+    assert routes['connections/delete']['calls'] == 3
+    assert routes['sources/delete']['status_codes'] == {'204': 3}
+    assert routes['health']['calls'] == 1
+
+
+def test_plan_then_sync__stale_ids(fake_server, tmp_path, capsys):
+    config = tmp_path / 'config.yml'
+    config.write_text(yaml.dump(CONFIG))
+    run('sync', str(config), '--target', fake_server.url, '--all')
+    source, = [x for x in fake_server.sources.values() if x['name'] == 'apache/superset']
+    connection, = fake_server.connections.values()
+    fake_server.delete('connections', connection['connectionId'])
+    stale = {**CONFIG, 'sources': [{**CONFIG['sources'][0], 'sourceId': 'deleted-source-id'}],
+             'connections': [{**CONFIG['connections'][0], 'connectionId': connection['connectionId']}]}
+    config.write_text(yaml.dump(stale))
+    capsys.readouterr()
+
+    run('plan', str(config), '--target', fake_server.url, '--all')
+    output = capsys.readouterr().out
+    assert "+ connection 'superset-to-warehouse'" in output
+    assert "+ source" not in output  # matched by name
+    fake_server.calls.clear()
+    run('sync', str(config), '--target', fake_server.url, '--all', '--force')
+    assert 'Error' not in capsys.readouterr().out
+    assert fake_server.calls['api/v1/connections/create'] == 1
+    assert fake_server.calls['api/v1/sources/update'] == 1  # by the deployed id, not the stale one
+    assert len(fake_server.sources) == 2 and source['sourceId'] in fake_server.sources
+    assert [x['name'] for x in fake_server.connections.values()] == ['superset-to-warehouse']
+
+
+def test_sync__single_kind_with_connections_to_deployed_objects(fake_server, tmp_path):
+    fake_server.add_destination('warehouse')
+    fake_server.add_source('apache/kafka')
+    config = tmp_path / 'config.yml'
+    config.write_text(yaml.dump({
+        'sources': CONFIG['sources'],
+        'destinations': [{'name': 'lake', 'destinationName': 'Postgres', 'connectionConfiguration': {'host': 'lake'}}],
+        'connections': CONFIG['connections'] + [{'sourceName': 'apache/kafka', 'destinationName': 'lake',
+                                                 'name': 'kafka-to-lake', 'status': 'inactive',
+                                                 'schedule': {'units': 24, 'timeUnit': 'hours'}}]}))
+    run('sync', str(config), '--target', fake_server.url, '--sources')  # destinations aren't read, so not checked
+    assert len(fake_server.sources) == 3
+    run('sync', str(config), '--target', fake_server.url, '--destinations')  # and the other way around
+    assert sorted(x['name'] for x in fake_server.destinations.values()) == ['lake', 'warehouse']
+    assert fake_server.connections == {}
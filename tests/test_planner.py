@@ -0,0 +1,47 @@
+import copy
+
+import pytest
+from tests.test_fixtures import *
+from planner import Planner, diff, CREATE, UPDATE, UNCHANGED, ORPHANED
+
+
+def test_diff__reports_nested_paths():
+    desired = {'a': 1, 'b': {'c': [1, 2], 'd': 'x'}}
+    deployed = {'a': 1, 'b': {'c': [1, 3], 'd': 'x'}}
+    assert list(diff(desired, deployed)) == ['b.c[1]']
+
+
+def test_diff__ignores_masked_secrets_and_empty_values():
+    desired = {'password': 'hunter2', 'schema': None, 'tags': []}
+    deployed = {'password': '**********', 'schema': {}}
+    assert list(diff(desired, deployed)) == []
+
+
+def test_plan__classifies_dtos(dummy_airbyte_config_model, dummy_source_dto, dummy_destination_dto,
+                               dummy_connection_dto):
+    unchanged_source = copy.copy(dummy_source_dto)
+    unchanged_source.source_id = None  # matched by name
+    changed_destination = copy.copy(dummy_destination_dto)
+    changed_destination.connection_configuration = {**dummy_destination_dto.connection_configuration,
+                                                    'schema': 'other'}
+    new_source = copy.copy(dummy_source_dto)
+    new_source.source_id = None
+    new_source.name = 'new-source'
+    unchanged_connection = copy.copy(dummy_connection_dto)
+    unchanged_connection.sync_catalog = {}  # keeps the deployed catalog
+    plan = Planner(dummy_airbyte_config_model).plan({'sources': [unchanged_source, new_source],
+                                                     'destinations': [changed_destination],
+                                                     'connections': [unchanged_connection]})
+    actions = [(entry.kind, entry.action, entry.dto.name) for entry in plan.entries]
+    assert actions == [('sources', UNCHANGED, 'apache/superset'),
+                       ('sources', CREATE, 'new-source'),
+                       ('destinations', UPDATE, 'devrel-rds'),
+                       ('connections', UNCHANGED, 'superset-to-postgres')]
+    assert plan.entries[2].changes == ['connectionConfiguration.schema']
+    assert plan.pending_dtos() == {'sources': [new_source], 'destinations': [changed_destination], 'connections': []}
+
+
+def test_plan__reports_orphans(dummy_airbyte_config_model):
+    plan = Planner(dummy_airbyte_config_model).plan({'sources': []}, ['sources'])
+    assert [(entry.action, entry.dto.name) for entry in plan.entries] == [(ORPHANED, 'apache/superset')]
+    assert plan.pending_dtos() == {'sources': []}
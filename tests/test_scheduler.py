@@ -0,0 +1,125 @@
+import argparse
+import asyncio
+import copy
+import types
+
+import pytest
+from tests.test_fixtures import *
+from controller import AsyncController
+from scheduler import ApplyScheduler
+import topiary
+
+
+class FakeResponse:
+    def __init__(self, payload, ok=True):
+        self.payload = payload
+        self.ok = ok
+        self.status_code = 200 if ok else 422
+        self.message = 'fake'
+
+
+class FakeAsyncClient:
+    """Records the order API calls start and finish in. Sources named 'slow' take longer, 'broken' ones fail."""
+
+    def __init__(self):
+        self.events = []
+
+    async def call(self, name, payload, ok=True):
+        self.events.append(('start', name))
+        await asyncio.sleep(0.05 if name.startswith('slow') else 0)
+        self.events.append(('end', name))
+        return FakeResponse(payload, ok)
+
+    async def create_source(self, source_dto, workspace):
+        payload = {**source_dto.to_payload(), 'sourceId': 'id-' + source_dto.name}
+        return await self.call(source_dto.name, payload, ok=not source_dto.name.startswith('broken'))
+
+    async def update_source(self, source_dto):
+        return await self.call(source_dto.name, source_dto.to_payload())
+
+    async def create_destination(self, destination_dto, workspace):
+        payload = {**destination_dto.to_payload(), 'destinationId': 'id-' + destination_dto.name}
+        return await self.call(destination_dto.name, payload)
+
+    async def update_destination(self, destination_dto):
+        return await self.call(destination_dto.name, destination_dto.to_payload())
+
+    async def create_connection(self, connection_dto, source_dto):
+        payload = {**connection_dto.to_payload(), 'connectionId': 'id-' + connection_dto.name}
+        return await self.call(connection_dto.name, payload)
+
+    async def update_connection(self, connection_dto):
+        return await self.call(connection_dto.name, connection_dto.to_payload())
+
+
+@pytest.fixture
+def scheduler_setup(dummy_airbyte_config_model, dummy_airbyte_dto_factory):
+    controller = AsyncController()
+    controller.dto_factory = dummy_airbyte_dto_factory
+    client = FakeAsyncClient()
+    scheduler = ApplyScheduler(controller, dummy_airbyte_config_model, client, {'workspaceId': 'w'})
+    return scheduler, client
+
+
+def new_source(dummy_source_dto, name):
+    source = copy.copy(dummy_source_dto)
+    source.source_id = None
+    source.name = name
+    return source
+
+
+def new_connection(dummy_connection_dto, name, source_name):
+    connection = copy.copy(dummy_connection_dto)
+    connection.connection_id = None
+    connection.source_id = None
+    connection.source_name = source_name
+    connection.name = name
+    return connection
+
+
+def test_build_graph__connection_depends_on_its_own_source(scheduler_setup, dummy_source_dto, dummy_connection_dto):
+    scheduler, client = scheduler_setup
+    source = new_source(dummy_source_dto, 'new-source')
+    dependent = new_connection(dummy_connection_dto, 'dependent', 'new-source')
+    independent = new_connection(dummy_connection_dto, 'independent', dummy_source_dto.name)
+    nodes = scheduler.build_graph({'sources': [source], 'connections': [dependent, independent]})
+    assert [node.dto for node in nodes[1].dependencies] == [source]
+    assert nodes[2].dependencies == []  # its source and destination already exist in the deployment
+
+
+def test_run__independent_connection_does_not_wait(scheduler_setup, dummy_source_dto, dummy_connection_dto):
+    scheduler, client = scheduler_setup
+    slow = new_source(dummy_source_dto, 'slow-source')
+    dependent = new_connection(dummy_connection_dto, 'dependent', 'slow-source')
+    independent = new_connection(dummy_connection_dto, 'independent', dummy_source_dto.name)
+    scheduler.build_graph({'sources': [slow], 'connections': [dependent, independent]})
+    assert asyncio.run(scheduler.run()) is True
+    events = client.events
+    assert events.index(('end', 'independent')) < events.index(('end', 'slow-source'))
+    assert events.index(('end', 'slow-source')) < events.index(('start', 'dependent'))
+    assert dependent.source_id == 'id-slow-source'
+
+
+def test_run__skips_connections_of_failed_sources(scheduler_setup, dummy_source_dto, dummy_connection_dto):
+    scheduler, client = scheduler_setup
+    broken = new_source(dummy_source_dto, 'broken-source')
+    dependent = new_connection(dummy_connection_dto, 'dependent', 'broken-source')
+    nodes = scheduler.build_graph({'sources': [broken], 'connections': [dependent]})
+    assert asyncio.run(scheduler.run()) is False
+    assert nodes[1].succeeded is False
+    assert ('start', 'dependent') not in client.events
+
+
+def test_restore__closes_the_async_client_if_a_node_raises(monkeypatch):
+    closed = []
+
+    async def fail(self):
+        raise RuntimeError('node failed')
+
+    monkeypatch.setattr(topiary.ApplyScheduler, 'run', fail)
+    monkeypatch.setattr(topiary.AsyncAirbyteClient, 'close', lambda self: closed.append(self))
+    args = argparse.Namespace(concurrency=2, sources=True, destinations=False, connections=False, all=False)
+    with pytest.raises(RuntimeError):
+        asyncio.run(topiary.restore(args, AsyncController(), None, types.SimpleNamespace(airbyte_url='http://airbyte.local'),
+                                    {'workspaceId': 'w'}, {'sources': []}))
+    assert len(closed) == 1
@@ -0,0 +1,77 @@
+import copy
+import threading
+
+import pytest
+from tests.test_fixtures import *
+from secrets_resolver import SecretsResolver, FileProvider, VaultProvider, find_references
+
+
+class CountingProvider:
+    def __init__(self, secrets):
+        self.secrets = secrets
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def fetch(self, location):
+        with self.lock:
+            self.calls.append(location)
+        return self.secrets[location]
+
+
+def test_find_references__any_depth():
+    config = {'a': '${env:A}', 'b': [{'c': 'user:${vault:db#user}@${vault:db#password}'}], 'd': 1}
+    assert find_references(config, set()) == {('env', 'A', ''), ('vault', 'db', 'user'), ('vault', 'db', 'password')}
+
+
+def test_resolve_dtos__fetches_each_location_once(dummy_source_dto, dummy_destination_dto):
+    provider = CountingProvider({'github': {'token': 'ghp_x'}, 'db': {'password': 'hunter2', 'user': 'admin'}})
+    sources = []
+    for i in range(1000):
+        source = copy.copy(dummy_source_dto)
+        source.connection_configuration = {'repository': 'r' + str(i), 'credentials': {'token': '${vault:github#token}'}}
+        sources.append(source)
+    destination = copy.copy(dummy_destination_dto)
+    destination.connection_configuration = {'password': '${vault:db#password}', 'url': '${vault:db#user}@host',
+                                            'port': 5432}
+    resolver = SecretsResolver({'vault': provider})
+    assert resolver.resolve_dtos({'sources': sources, 'destinations': [destination]}) == []
+    assert sorted(provider.calls) == ['db', 'github']
+    assert sources[999].connection_configuration == {'repository': 'r999', 'credentials': {'token': 'ghp_x'}}
+    assert destination.connection_configuration == {'password': 'hunter2', 'url': 'admin@host', 'port': 5432}
+
+    again = copy.copy(dummy_source_dto)
+    again.connection_configuration = {'token': '${vault:github#token}'}
+    resolver.resolve_dtos({'sources': [again]})
+    assert len(provider.calls) == 2  # still cached
+    resolver.cache[('vault', 'github')] = (0, 'expired')
+    again.connection_configuration = {'token': '${vault:github#token}'}
+    resolver.resolve_dtos({'sources': [again]})
+    assert len(provider.calls) == 3
+
+
+def test_resolve_dtos__providers(dummy_source_dto, tmp_path, monkeypatch):
+    monkeypatch.setenv('TOPIARY_TEST_TOKEN', 'from-env')
+    (tmp_path / 'token.txt').write_text('from-file\n')
+    (tmp_path / 'service.yml').write_text('bigquery:\n  credentials: {type: service_account}\n')
+    (tmp_path / 'vault.yml').write_text('secret/github: {token: from-vault}\n')
+    source = copy.copy(dummy_source_dto)
+    source.connection_configuration = {'env': '${env:TOPIARY_TEST_TOKEN}', 'file': '${file:' + str(tmp_path / 'token.txt') + '}',
+                                       'json': '${file:' + str(tmp_path / 'service.yml') + '#bigquery.credentials}',
+                                       'vault': '${vault:secret/github#token}'}
+    resolver = SecretsResolver({'env': SecretsResolver().providers['env'], 'file': FileProvider(),
+                                'vault': VaultProvider(str(tmp_path / 'vault.yml'))})
+    assert resolver.resolve_dtos({'sources': [source]}) == []
+    assert source.connection_configuration == {'env': 'from-env', 'file': 'from-file',
+                                               'json': {'type': 'service_account'}, 'vault': 'from-vault'}
+
+
+def test_resolve_dtos__reports_errors(dummy_source_dto, monkeypatch):
+    monkeypatch.delenv('TOPIARY_TEST_MISSING', raising=False)
+    source = copy.copy(dummy_source_dto)
+    source.connection_configuration = {'a': '${env:TOPIARY_TEST_MISSING}', 'b': '${nope:x}',
+                                       'c': '${vault:db#missing}'}
+    resolver = SecretsResolver({'env': SecretsResolver().providers['env'], 'vault': CountingProvider({'db': {}})})
+    assert resolver.resolve_dtos({'sources': [source]}) == [
+        "${env:TOPIARY_TEST_MISSING}: environment variable TOPIARY_TEST_MISSING is not set",
+        "${nope:x}: unknown secrets provider 'nope'",
+        "${vault:db#missing}: no key 'missing'"]
@@ -0,0 +1,75 @@
+
+import pytest
+from tests.test_fixtures import *
+from tests.test_controller import FakeListClient
+from airbyte_client import AirbyteResponse
+from controller import Controller
+from snapshot import SnapshotStore
+
+
+class FakeSnapshotClient(FakeListClient):
+    def get_connection(self, connection_id):
+        self.calls.append('get_connection')
+        for connection in self.payloads['connections']:
+            if connection['connectionId'] == connection_id:
+                return AirbyteResponse.from_payload(connection)
+        response = AirbyteResponse.from_payload({})
+        response.ok, response.status_code = False, 404
+        return response
+
+
+@pytest.fixture
+def snapshot_client(dummy_source_dict, dummy_destination_dict, dummy_existing_connection_dict):
+    return FakeSnapshotClient({'sources': [dummy_source_dict], 'destinations': [dummy_destination_dict],
+                               'connections': [dummy_existing_connection_dict]})
+
+
+def read(client, dto_factory, store):
+    controller = Controller()
+    controller.dto_factory = dto_factory
+    controller.snapshot = store
+    client.calls.clear()
+    return controller.get_airbyte_configuration(client, {'workspaceId': 'ws'})
+
+
+def test_snapshot__trusted_connections_are_not_listed(tmp_path, snapshot_client, dummy_airbyte_dto_factory,
+                                                      dummy_connection_dto):
+    store = SnapshotStore(snapshot_client.airbyte_url, 'ws', cache_dir=str(tmp_path))
+    read(snapshot_client, dummy_airbyte_dto_factory, store)
+    assert sorted(snapshot_client.calls) == ['connections', 'destinations', 'sources']
+    airbyte_model = read(snapshot_client, dummy_airbyte_dto_factory, store)
+    assert sorted(snapshot_client.calls) == ['destinations', 'sources']
+    assert list(airbyte_model.connections) == [dummy_connection_dto.connection_id]
+
+
+def test_snapshot__changed_source_rereads_its_connections(tmp_path, snapshot_client, dummy_airbyte_dto_factory):
+    store = SnapshotStore(snapshot_client.airbyte_url, 'ws', cache_dir=str(tmp_path))
+    read(snapshot_client, dummy_airbyte_dto_factory, store)
+    source = snapshot_client.payloads['sources'][0]
+    source['connectionConfiguration'] = {**source['connectionConfiguration'], 'repository': 'apache/airflow'}
+    snapshot_client.payloads['connections'][0]['prefix'] = 'airflow_'
+    airbyte_model = read(snapshot_client, dummy_airbyte_dto_factory, store)
+    assert sorted(snapshot_client.calls) == ['destinations', 'get_connection', 'sources']
+    assert list(airbyte_model.connections.values())[0].prefix == 'airflow_'
+
+
+def test_snapshot__expired_or_invalidated_is_not_trusted(tmp_path, snapshot_client, dummy_airbyte_dto_factory):
+    store = SnapshotStore(snapshot_client.airbyte_url, 'ws', cache_dir=str(tmp_path), max_age=-1)
+    read(snapshot_client, dummy_airbyte_dto_factory, store)
+    read(snapshot_client, dummy_airbyte_dto_factory, store)
+    assert 'connections' in snapshot_client.calls
+    store.max_age = 60
+    store.invalidate()  # as if a run had stopped part way through its changes
+    read(snapshot_client, dummy_airbyte_dto_factory, store)
+    assert 'connections' in snapshot_client.calls
+
+
+def test_snapshot__partial_run_leaves_other_kinds_untrusted(tmp_path, snapshot_client, dummy_airbyte_dto_factory):
+    store = SnapshotStore(snapshot_client.airbyte_url, 'ws', cache_dir=str(tmp_path))
+    airbyte_model = read(snapshot_client, dummy_airbyte_dto_factory, store)
+    store.invalidate()  # a --sources run, which may have deleted connections along with their sources
+    store.save(airbyte_model, ['sources'])
+    assert store.load('sources') is not None
+    assert store.load('connections') is None
+    read(snapshot_client, dummy_airbyte_dto_factory, store)
+    assert 'connections' in snapshot_client.calls
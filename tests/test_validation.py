@@ -0,0 +1,103 @@
+import copy
+import csv
+import json
+import threading
+import time
+
+import pytest
+import requests
+from tests.test_fixtures import *
+from airbyte_client import AirbyteResponse, ROUTE_TIMEOUTS
+from validation import ValidationRunner
+
+
+class FakeCheckClient:
+    """Checks pass unless the connector is named 'failing-*', and time out if it is named 'hung-*'"""
+
+    def __init__(self):
+        self.timeouts = dict(ROUTE_TIMEOUTS)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = 0
+        self.check_timeouts = set()
+
+    def check(self, dto, timeout=None):
+        with self.lock:
+            self.calls += 1
+            self.check_timeouts.add(timeout)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+        if dto.name.startswith('hung'):
+            raise requests.exceptions.ReadTimeout()
+        succeeded = not dto.name.startswith('failing')
+        return AirbyteResponse.from_payload({'status': 'succeeded' if succeeded else 'failed',
+                                             'message': None if succeeded else 'bad credentials',
+                                             'jobInfo': {'succeeded': succeeded}})
+
+    check_source_connection = check
+    check_destination_connection = check
+
+
+def named_copies(dto, names):
+    r = []
+    for name in names:
+        copied = copy.copy(dto)
+        copied.name = name
+        r.append(copied)
+    return r
+
+
+def test_validation_runner__concurrent_checks(dummy_source_dto):
+    client = FakeCheckClient()
+    runner = ValidationRunner(client, workers=4, timeout=30, progress=False)
+    sources = named_copies(dummy_source_dto, ['s' + str(i) for i in range(12)] + ['failing-s', 'hung-s'])
+    results = runner.check_sources(sources)
+    assert [x.name for x in results] == [x.name for x in sources]
+    assert [x.status for x in results[-3:]] == ['succeeded', 'failed', 'timeout']
+    assert results[-2].message == 'bad credentials'
+    assert client.max_in_flight == 4
+    assert {read for connect, read in client.check_timeouts} == {30}
+    assert client.timeouts == ROUTE_TIMEOUTS  # passed with each check, not set on the shared client
+    assert runner.summary() == {'checked': 14, 'succeeded': 12, 'failed': 1, 'timeout': 1, 'error': 0,
+                                'dangling': 0}
+
+
+def test_validation_runner__reports(tmp_path, dummy_source_dto, dummy_destination_dto):
+    runner = ValidationRunner(FakeCheckClient(), progress=False)
+    runner.check_sources([dummy_source_dto])
+    runner.check_destinations(named_copies(dummy_destination_dto, ['failing-destination']))
+    runner.write_report(str(tmp_path / 'report.json'))
+    runner.write_report(str(tmp_path / 'report.csv'))
+    report = json.load(open(str(tmp_path / 'report.json')))
+    assert report['summary']['checked'] == 2
+    assert [(x['kind'], x['succeeded']) for x in report['results']] == [('source', True), ('destination', False)]
+    rows = list(csv.DictReader(open(str(tmp_path / 'report.csv'))))
+    assert [(x['kind'], x['status']) for x in rows] == [('source', 'succeeded'), ('destination', 'failed')]
+    assert all(float(x['latency']) >= 0 for x in rows)
+
+
+def test_validation_runner__connections_check_each_endpoint_once(dummy_airbyte_config_model, dummy_connection_dto):
+    client = FakeCheckClient()
+    runner = ValidationRunner(client, workers=2, progress=False)
+    connections = named_copies(dummy_connection_dto, ['c' + str(i) for i in range(10)])
+    dangling = copy.copy(dummy_connection_dto)
+    dangling.name = 'dangling'
+    dangling.source_id = 'missing-source-id'
+    results = runner.check_connections(connections + [dangling], dummy_airbyte_config_model)
+    assert client.calls == 2  # one source and one destination, shared by every connection
+    assert [x.status for x in results] == ['succeeded'] * 10 + ['dangling']
+    assert results[-1].message == "source 'missing-source-id' not found"
+    runner.check_connections(connections, dummy_airbyte_config_model)
+    assert client.calls == 2  # endpoints already checked in this run
+
+
+def test_validation_runner__connection_fails_with_its_endpoint(dummy_airbyte_config_model, dummy_connection_dto):
+    dummy_airbyte_config_model.sources[dummy_connection_dto.source_id].name = 'failing-source'
+    runner = ValidationRunner(FakeCheckClient(), progress=False)
+    result = runner.check_connections([dummy_connection_dto], dummy_airbyte_config_model)[0]
+    assert (result.kind, result.status) == ('connection', 'failed')
+    assert result.message == "source 'failing-source' failed"
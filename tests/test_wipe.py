@@ -0,0 +1,87 @@
+import copy
+import threading
+import time
+
+import pytest
+from tests.test_fixtures import *
+from airbyte_client import AirbyteResponse
+from wipe import WipeEngine
+
+
+class FakeDeleteClient:
+    """Records the order of deletes. Deletes of the ids in fail return a 500, and those in gone a 404."""
+
+    def __init__(self, fail=(), gone=()):
+        self.fail = set(fail)
+        self.gone = set(gone)
+        self.deleted = []
+        self.lock = threading.Lock()
+
+    def delete(self, kind, dto):
+        time.sleep(0.005)
+        dto_id = dto.get_identity()[0]
+        with self.lock:
+            self.deleted.append((kind, dto_id))
+        response = AirbyteResponse.from_payload({})
+        if dto_id in self.fail or dto_id in self.gone:
+            response.ok = False
+            response.status_code = 500 if dto_id in self.fail else 404
+            response.message = 'Error: Unrecognized response code' if dto_id in self.fail else 'Resource not found'
+        return response
+
+    def delete_connection(self, dto):
+        return self.delete('connection', dto)
+
+    def delete_source(self, dto):
+        return self.delete('source', dto)
+
+    def delete_destination(self, dto):
+        return self.delete('destination', dto)
+
+
+@pytest.fixture
+def hub_model(dummy_airbyte_config_model, dummy_connection_dto):
+    """The dummy model with 10 more connections between its one source and destination"""
+
+    for i in range(10):
+        connection = copy.copy(dummy_connection_dto)
+        connection.connection_id = 'connection-' + str(i)
+        connection.name = 'connection-' + str(i)
+        dummy_airbyte_config_model.connections[connection.connection_id] = connection
+    return dummy_airbyte_config_model
+
+
+def test_wipe__connections_before_sources_and_destinations(hub_model):
+    client = FakeDeleteClient(gone=['connection-3'])
+    failures = hub_model.wipe(client, ['sources', 'destinations', 'connections'], WipeEngine(client, workers=4))
+    assert failures == []
+    kinds = [kind for kind, dto_id in client.deleted]
+    assert kinds[:11] == ['connection'] * 11
+    assert sorted(kinds[11:]) == ['destination', 'source']
+    assert not hub_model.sources and not hub_model.destinations and not hub_model.connections
+
+
+def test_wipe__source_takes_its_connections(hub_model, dummy_destination_dto):
+    client = FakeDeleteClient()
+    hub_model.wipe_sources(client)
+    assert len(client.deleted) == 12
+    assert not hub_model.sources and not hub_model.connections
+    assert list(hub_model.destinations) == [dummy_destination_dto.destination_id]
+
+
+def test_wipe__failures_are_aggregated_and_resumable(hub_model, dummy_source_dto):
+    client = FakeDeleteClient(fail=['connection-1', 'connection-2'])
+    engine = WipeEngine(client, workers=4)
+    failures = hub_model.wipe(client, ['sources', 'destinations', 'connections'], engine)
+    assert sorted((x.kind, x.name) for x in failures) == [('connections', 'connection-1'),
+                                                          ('connections', 'connection-2'),
+                                                          ('destinations', 'devrel-rds'),
+                                                          ('sources', 'apache/superset')]
+    assert engine.deleted == 9
+    assert sorted(hub_model.connections) == ['connection-1', 'connection-2']
+    assert dummy_source_dto.source_id in hub_model.sources
+
+    client.fail.clear()  # a second run only deletes what is left
+    client.deleted.clear()
+    assert hub_model.wipe(client, ['sources', 'destinations', 'connections']) == []
+    assert len(client.deleted) == 4
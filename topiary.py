@@ -8,62 +8,95 @@ __version__ = "0.1.0"
 __license__ = "MIT"
 
 import argparse
+import asyncio
 import utils
-from airbyte_client import AirbyteClient
+import validation
+from airbyte_client import AirbyteClient, AsyncAirbyteClient
 from airbyte_config_model import AirbyteConfigModel
-from controller import Controller
+from controller import Controller, AsyncController
 from config_validator import ConfigValidator
+from planner import Planner
+from scheduler import ApplyScheduler
+from snapshot import SNAPSHOT_MAX_AGE
 
-VALID_MODES = ['wipe', 'validate', 'sync']
+VALID_MODES = ['wipe', 'validate', 'sync', 'plan', 'restore', 'check', 'bench']
 
 
 def main(args):
     """Handles arguments and setup tasks. Invokes controller methods to carry out the specified workflow"""
-    controller: Controller = Controller()
+    if args.mode == 'bench':  # runs every other workflow, against a local fake server
+        import bench  # only the bench needs it, and the fake server it runs against
+        bench.run_bench(args, lambda argv: main(build_parser().parse_args(argv)))
+        return
+    controller: Controller = AsyncController() if args.concurrency > 1 or args.mode == 'restore' else Controller()
     config_validator: ConfigValidator = ConfigValidator()
+    if args.mode == 'check':  # needs no deployment, so it can run as a pre-commit hook
+        check_config(args, controller, config_validator)
+        return
     client: AirbyteClient = controller.instantiate_client(args)
-    definitions: dict = controller.get_definitions(client)
+    try:
+        run_workflow(args, controller, config_validator, client)
+    finally:  # also when the workflow exits early, since that's often the run worth profiling
+        if args.profile or args.profile_file:
+            controller.write_profile(client, args.profile_file)
+
+
+def run_workflow(args, controller, config_validator, client):
+    """Reads what the workflow needs from the deployment, then carries out the workflow selected by args.mode"""
+    definitions: dict = controller.get_definitions(client, args.refresh_definitions)
     controller.instantiate_dto_factory(definitions['source_definitions'], definitions['destination_definitions'])
+    controller.instantiate_validation_runner(client, args)
     workspace: str = controller.get_workspace(args, client)
-    airbyte_model: AirbyteConfigModel = controller.get_airbyte_configuration(client, workspace)
+    controller.instantiate_snapshot(args, client, workspace)
+    kinds: list = utils.required_kinds(args)  # only read what the workflow needs from the deployment
+    airbyte_model: AirbyteConfigModel = controller.get_airbyte_configuration(client, workspace, kinds)
 
     # sync workflow
     if args.mode == 'sync':
-        if utils.is_yaml(args.target):  # deployment to yaml sync workflow
-            airbyte_model.write_yaml(args.target)
-            print("Output written to: " + args.target)
+        if utils.is_yaml_target(args.target):  # deployment to yaml sync workflow
+            controller.write_config(airbyte_model, args.target)
         else:  # yaml to deployment sync workflow
-            yaml_config, secrets = controller.read_yaml_config(args)
-            if not config_validator.validate_config(yaml_config):
-                print("Error: Invalid config provided as yaml. Exiting...")
-                exit(2)
-            dtos_from_config = controller.build_dtos_from_yaml_config(yaml_config, secrets)
+            dtos_from_config = load_config(args, controller, config_validator, airbyte_model)
             if args.backup_file:
-                airbyte_model.write_yaml(args.backup_file)
+                controller.write_backup(airbyte_model, args.backup_file)
+            controller.invalidate_snapshot()
             if args.wipe:
                 controller.wipe_all(airbyte_model, client)
+            controller.expand_connection_groups(airbyte_model, dtos_from_config)  # against what is left deployed
+            if not args.force:  # only issue the calls needed to bring the deployment in line with config
+                plan = Planner(airbyte_model).plan(dtos_from_config, utils.selected_kinds(args))
+                plan.print_plan(verbose=False)
+                dtos_from_config = plan.pending_dtos()
             print("Applying changes to deployment: " + client.airbyte_url)
-            if args.sources or args.all:
-                controller.sync_sources_to_deployment(airbyte_model, client, workspace, dtos_from_config)
-                if args.validate:
-                    controller.validate_sources(airbyte_model, client)
-            if args.destinations or args.all:
-                controller.sync_destinations_to_deployment(airbyte_model, client, workspace, dtos_from_config)
-                if args.validate:
-                    controller.validate_destinations(airbyte_model, client)
-            if args.connections or args.all:
-                controller.sync_connections_to_deployment(airbyte_model, client, dtos_from_config)
-                if args.validate:
-                    controller.validate_connections(airbyte_model, client)
+            if args.concurrency > 1:
+                asyncio.run(apply_concurrently(args, controller, airbyte_model, client, workspace, dtos_from_config))
+            else:
+                apply(args, controller, airbyte_model, client, workspace, dtos_from_config)
+            controller.save_snapshot(airbyte_model)
+
+    # plan workflow
+    elif args.mode == 'plan':
+        dtos_from_config = load_config(args, controller, config_validator, airbyte_model)
+        controller.expand_connection_groups(airbyte_model, dtos_from_config)
+        print("Changes needed to apply config to deployment: " + client.airbyte_url)
+        Planner(airbyte_model).plan(dtos_from_config, utils.selected_kinds(args)).print_plan()
 
     # wipe workflow
     elif args.mode == 'wipe':
-        if args.sources or args.all:
-            controller.wipe_sources(airbyte_model, client)
-        if args.destinations or args.all:
-            controller.wipe_destinations(airbyte_model, client)
-        if args.connections or args.all:
-            controller.wipe_connections(airbyte_model, client)
+        controller.invalidate_snapshot()
+        controller.wipe(airbyte_model, client, utils.selected_kinds(args))
+        controller.save_snapshot(airbyte_model)
+
+    # restore workflow
+    elif args.mode == 'restore':
+        dtos_from_backup = controller.read_backup(args, airbyte_model)
+        controller.invalidate_snapshot()
+        print("Restoring " + args.origin + " to deployment: " + client.airbyte_url)
+        if not asyncio.run(restore(args, controller, airbyte_model, client, workspace, dtos_from_backup)) \
+                or controller.unrestorable:
+            print("Error: some objects could not be restored. Run the restore again to retry them.")
+            exit(2)
+        controller.save_snapshot(airbyte_model)
 
     # validate workflow
     elif args.mode == 'validate':
@@ -72,20 +105,96 @@ def main(args):
         if args.destinations or args.all:
             controller.validate_destinations(airbyte_model, client)
         if args.connections or args.all:
-            #  Q: what does it mean to validate a connection beyond validating its source and destination?
-            pass  # TODO: Implement Controller.validate_connections ?
+            controller.validate_connections(airbyte_model, client)
     else:
         print("main: unrecognized mode " + args.mode)
+    controller.write_validation_report(args.report_file)
 
 
-if __name__ == "__main__":
-    """ This is executed when run from the command line """
+def load_config(args, controller, config_validator, airbyte_model=None):
+    """Reads and validates the yaml config, then builds DTOs from it"""
+
+    yaml_config, secrets = controller.read_yaml_config(args)
+    if not config_validator.validate_config(yaml_config, airbyte_model, utils.required_kinds(args)):
+        print("Error: Invalid config provided as yaml. Exiting...")
+        exit(2)
+    return controller.build_dtos_from_yaml_config(yaml_config, secrets)
+
+
+def check_config(args, controller, config_validator):
+    """Validates the config given as the origin on its own, without reading a deployment. Exits 2 if it's invalid."""
+
+    yaml_config = controller.read_config(args.origin)
+    if not config_validator.validate_config(yaml_config):
+        print("Error: " + repr(len(config_validator.errors)) + " problems found in " + args.origin)
+        exit(2)
+    print("Config is valid: " + ', '.join(repr(len(yaml_config.get(key) or [])) + ' ' + key
+                                          for key in ('sources', 'destinations', 'connections')))
+
+
+def apply(args, controller, airbyte_model, client, workspace, dtos_from_config):
+    """Applies the selected object kinds to the deployment one API call at a time"""
+
+    if args.sources or args.all:
+        controller.sync_sources_to_deployment(airbyte_model, client, workspace, dtos_from_config)
+        if args.validate:
+            controller.validate_sources(airbyte_model, client)
+    if args.destinations or args.all:
+        controller.sync_destinations_to_deployment(airbyte_model, client, workspace, dtos_from_config)
+        if args.validate:
+            controller.validate_destinations(airbyte_model, client)
+    if args.connections or args.all:
+        controller.sync_connections_to_deployment(airbyte_model, client, dtos_from_config)
+        if args.validate:
+            controller.validate_connections(airbyte_model, client)
+
+
+async def apply_concurrently(args, controller, airbyte_model, client, workspace, dtos_from_config):
+    """
+    Applies the selected object kinds to the deployment with up to --concurrency API calls in flight. Each connection
+    starts as soon as its own source and destination are in place rather than after every source and destination.
+    """
+
+    kinds = utils.selected_kinds(args)
+    async_client = AsyncAirbyteClient(client, args.concurrency)
+    scheduler = ApplyScheduler(controller, airbyte_model, async_client, workspace)
+    scheduler.build_graph(dtos_from_config, kinds)
+    try:
+        await scheduler.run()
+    finally:
+        async_client.close()  # shuts its threads down, even if a node raised
+    if args.validate:
+        if 'sources' in kinds:
+            controller.validate_sources(airbyte_model, client)
+        if 'destinations' in kinds:
+            controller.validate_destinations(airbyte_model, client)
+        if 'connections' in kinds:
+            controller.validate_connections(airbyte_model, client)
+
+
+async def restore(args, controller, airbyte_model, client, workspace, dtos_from_backup) -> bool:
+    """
+    Replays a backup into the deployment with up to --concurrency API calls in flight. Sources and destinations are
+    restored before the connections which use them. Returns True if everything was restored.
+    """
+
+    async_client = AsyncAirbyteClient(client, args.concurrency)
+    scheduler = ApplyScheduler(controller, airbyte_model, async_client, workspace)
+    scheduler.build_graph(dtos_from_backup, utils.selected_kinds(args))
+    try:
+        return await scheduler.run()
+    finally:
+        async_client.close()
+
+
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser()
 
     # Required positional argument
     #parser.add_argument("arg", help="Required positional argument")
-    parser.add_argument("mode", help="Operating mode. Choices are sync, validate, wipe")
-    parser.add_argument("origin", help="location of the source Airbyte deployment or yaml file")
+    parser.add_argument("mode", help="Operating mode. Choices are sync, plan, validate, wipe, restore, check, bench")
+    parser.add_argument("origin", help="location of the source Airbyte deployment, yaml file or backup file. For "
+                                       "bench, the number of sources,destinations,connections to generate")
 
     # Optional argument flag which defaults to False
     parser.add_argument("-s", "--sources", action="store_true", default=False,
@@ -98,23 +207,55 @@ if __name__ == "__main__":
                         help="syncs sources, destinations, and connections")
     parser.add_argument("-w", "--wipe", action="store_true", default=False,
                         help="deletes all connectors on the target")
+    parser.add_argument("-f", "--force", action="store_true", default=False,
+                        help="sends every configured object to the deployment, even those the plan finds unchanged")
+    parser.add_argument("--refresh-definitions", action="store_true", default=False, dest="refresh_definitions",
+                        help="ignores cached source and destination definitions and fetches them again")
+    parser.add_argument("--refresh-discovery", action="store_true", default=False, dest="refresh_discovery",
+                        help="discovers source schemas again instead of reusing schemas discovered in earlier runs")
+    parser.add_argument("--no-discovery-cache", action="store_true", default=False, dest="no_discovery_cache",
+                        help="keeps discovered source schemas in memory for this run only")
     parser.add_argument("-v", "--validate", action="store_true", default=False,
                         help="validates all connectors on the destination after applying changes")
 
     # Optional argument which requires a parameter (eg. -d test)
     parser.add_argument("--target", action="store", dest="target",
-                        help="specifies the airbyte deployment or yaml file to modify")
+                        help="specifies the airbyte deployment, yaml file or config directory (dir/) to modify")
     parser.add_argument("--backup", action="store", dest="backup_file",
-                        help="specifies a .yaml file to backup the configuration of the target before syncing")
+                        help="specifies a .yaml, .jsonl or .jsonl.gz file to backup the configuration of the target "
+                             "before syncing")
     parser.add_argument("--secrets", action="store", dest="secrets",
                         help="specifies a .yaml file containing the secrets for each source and destination type")
     parser.add_argument("--workspace", action="store", dest="workspace_slug",
                         help="species the workspace name (slug). Allows use of a non-default workspace")
+    parser.add_argument("--snapshot", action="store_true", default=False,
+                        help="keeps a snapshot of the deployment between runs, and only reads again what may have "
+                             "changed since")
+    parser.add_argument("--snapshot-max-age", action="store", dest="snapshot_max_age", type=float,
+                        default=SNAPSHOT_MAX_AGE,
+                        help="seconds a snapshot is trusted for before the deployment is read in full again")
+    parser.add_argument("--concurrency", action="store", dest="concurrency", type=int, default=1,
+                        help="number of API calls to keep in flight when applying changes or validating "
+                             "(default: 1, serial)")
+    parser.add_argument("--check-timeout", action="store", dest="check_timeout", type=float,
+                        default=validation.CHECK_TIMEOUT,
+                        help="seconds to wait for each source or destination check before marking it timed out")
+    parser.add_argument("--profile", action="store_true", default=False,
+                        help="prints the calls, latency percentiles, bytes and status codes of every API route, and "
+                             "the time spent in each phase, at exit")
+    parser.add_argument("--profile-output", action="store", dest="profile_file",
+                        help="writes the --profile report to a .json file")
+    parser.add_argument("--report", action="store", dest="report_file",
+                        help="writes the result of every check to a .json or .csv file, or the bench report to a "
+                             ".json file")
     # Specify output of "--version"
     parser.add_argument(
         "--version",
         action="version",
         version="%(prog)s (version {version})".format(version=__version__))
+    return parser
 
-    args = parser.parse_args()
-    main(args)
+
+if __name__ == "__main__":
+    """ This is executed when run from the command line """
+    main(build_parser().parse_args())
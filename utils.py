@@ -1,5 +1,146 @@
+import contextlib
+import hashlib
+import os
+import threading
+import time
+
+import yaml
+
+import backup
+from airbyte_dto_factory import FrozenDict, FrozenList
+
+KINDS = ['sources', 'destinations', 'connections']
+
+
 def is_yaml(name):
     if name.strip().split('.')[-1] == 'yml' or name.strip().split('.')[-1] == 'yaml':
         return True
     else:
-        return False
\ No newline at end of file
+        return False
+
+
+def is_config_dir(name):
+    """True for a directory of config yaml files, written as dir/ or naming an existing directory"""
+
+    return name is not None and '://' not in name and (name.endswith(('/', os.sep)) or os.path.isdir(name))
+
+
+def is_config_glob(name):
+    """True for a glob pattern matching config yaml files, like 'teams/*/config.yml' or 'config/**/*.yml'"""
+
+    return name is not None and '://' not in name and any(c in name for c in '*?[')
+
+
+def is_yaml_target(name):
+    """True for the places a deployment can be written out to as config: a .yaml file or a config directory"""
+
+    return name is not None and (is_yaml(name) or is_config_dir(name))
+
+
+def is_config_file(name):
+    """
+    True for the places topiary can read configuration from: .yaml config, config directories and globs, and backup
+    files
+    """
+
+    return is_yaml_target(name) or is_config_glob(name) or (name is not None and backup.is_backup_file(name))
+
+
+def selected_kinds(args):
+    """Returns the object kinds selected with --sources, --destinations, --connections or --all"""
+
+    kinds = []
+    if args.sources or args.all:
+        kinds.append('sources')
+    if args.destinations or args.all:
+        kinds.append('destinations')
+    if args.connections or args.all:
+        kinds.append('connections')
+    return kinds
+
+
+def required_kinds(args):
+    """
+    Returns the object kinds which have to be read from the deployment for the selected workflow. Connections need
+    their sources and destinations, a wipe needs the connections it may have to delete first, and writing the whole
+    deployment out (yaml target, --backup or --wipe) needs everything.
+    """
+
+    kinds = set(selected_kinds(args))
+    if args.mode == 'sync' and (is_yaml_target(args.target) or args.wipe or args.backup_file):
+        kinds.update(KINDS)
+    if 'connections' in kinds:
+        kinds.update(['sources', 'destinations'])
+    if args.mode == 'wipe' and kinds:
+        kinds.add('connections')
+    return [kind for kind in KINDS if kind in kinds]
+
+
+@contextlib.contextmanager
+def timer(timings, phase):
+    """Adds the wall time spent in the with block to timings[phase], in seconds"""
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - start
+
+
+def cache_dir():
+    """Returns the directory topiary keeps its caches in, creating it if needed. Override with $TOPIARY_CACHE_DIR."""
+
+    r = os.environ.get('TOPIARY_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'topiary')
+    os.makedirs(r, exist_ok=True)
+    return r
+
+
+def write_atomic(path, data, mode=0o666):
+    """
+    Writes data (bytes) to a temporary file next to path, then renames it over path, so an interrupted run never
+    leaves a truncated file behind. The file is created with mode, less the umask; pass 0o600 for anything which may
+    hold secrets.
+    """
+
+    tmp_path = path + '.' + str(os.getpid()) + '-' + str(threading.get_ident()) + '.tmp'
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(tmp_path)  # left behind by a crashed run; O_EXCL below needs it gone, and it may have another mode
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), mode)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+def url_key(url):
+    """Returns a short, filename-safe key identifying an Airbyte deployment by its url"""
+
+    return hashlib.sha1(url.strip('/').encode()).hexdigest()[:16]
+
+
+# libyaml's C loader and dumper are many times faster than the pure python ones, when PyYAML was built with it
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+SafeDumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+
+class YamlDumper(SafeDumper):
+    """
+    Safe dumper which writes shared objects, like the interned stream schemas, out in full every time instead of as
+    anchors and aliases, so the yaml stays readable and editable per object.
+    """
+
+    def ignore_aliases(self, data):
+        return True
+
+
+YamlDumper.add_representer(FrozenDict, yaml.SafeDumper.represent_dict)
+YamlDumper.add_representer(FrozenList, yaml.SafeDumper.represent_list)
+
+
+def load_yaml(filename):
+    with open(filename, 'r') as f:
+        return yaml.load(f, Loader=YamlLoader)
@@ -0,0 +1,161 @@
+import csv
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+CHECK_TIMEOUT = 600  # seconds
+CHECK_ROUTES = {'source': 'api/v1/sources/check_connection', 'destination': 'api/v1/destinations/check_connection'}
+REPORT_FIELDS = ['kind', 'id', 'name', 'status', 'succeeded', 'latency', 'message']
+
+
+class CheckResult:
+    """The outcome of checking a single source, destination or connection"""
+
+    def __init__(self, kind, dto):
+        self.kind = kind
+        self.id, self.name = dto.get_identity()
+        self.status = None  # 'succeeded', 'failed', 'timeout', 'error' or, for connections, 'dangling'
+        self.succeeded = False
+        self.latency = None
+        self.message = ''
+
+    def to_dict(self):
+        return {'kind': self.kind, 'id': self.id, 'name': self.name, 'status': self.status,
+                'succeeded': self.succeeded, 'latency': self.latency, 'message': self.message}
+
+
+class ValidationRunner:
+    """
+    Checks sources and destinations on a worker pool. Every check has a deadline of timeout seconds, enforced as the
+    read timeout of the check_connection routes, so a hung connector job can't hold up the run. Results accumulate
+    across calls and can be written out as a JSON or CSV report.
+    """
+
+    def __init__(self, client, workers=1, timeout=CHECK_TIMEOUT, progress=True):
+        self.client = client
+        self.workers = max(1, workers)
+        self.progress = progress
+        self.results = []
+        self.endpoint_results = {}  # (kind, id) -> CheckResult, so an endpoint is only checked once per run
+        self.lock = threading.Lock()
+        # (connect, read) timeouts passed with each check, leaving the client's own timeouts for its other calls
+        self.timeouts = {kind: (client.timeouts.get(route, (5, timeout))[0], timeout)
+                         for kind, route in CHECK_ROUTES.items()}
+
+    def check_sources(self, sources) -> list:
+        return self.run('source', self.client.check_source_connection, list(sources))
+
+    def check_destinations(self, destinations) -> list:
+        return self.run('destination', self.client.check_destination_connection, list(destinations))
+
+    def check_connections(self, connections, airbyte_model) -> list:
+        """
+        Validates connections by checking their source and destination. References are resolved against the model
+        first, so dangling connections are found without any API calls. Each unique source and destination is then
+        checked once, however many connections share it, and not at all if it was already checked in this run.
+        """
+
+        connections = list(connections)
+        endpoints = {'source': {}, 'destination': {}}  # kind -> {id: dto} still to be checked
+        for connection in connections:
+            for kind, dto in self.endpoints(connection, airbyte_model):
+                if dto is not None and (kind, dto.get_identity()[0]) not in self.endpoint_results:
+                    endpoints[kind][dto.get_identity()[0]] = dto
+        self.check_sources(endpoints['source'].values())
+        self.check_destinations(endpoints['destination'].values())
+
+        r = []
+        for connection in connections:
+            result = CheckResult('connection', connection)
+            problems = []
+            for kind, dto in self.endpoints(connection, airbyte_model):
+                if dto is None:
+                    problems.append(kind + ' ' + repr(getattr(connection, kind + '_id')) + ' not found')
+                else:
+                    endpoint_result = self.endpoint_results[(kind, dto.get_identity()[0])]
+                    if not endpoint_result.succeeded:
+                        problems.append(kind + ' ' + repr(endpoint_result.name) + ' ' + endpoint_result.status)
+            result.succeeded = not problems
+            result.status = 'succeeded' if result.succeeded else \
+                ('dangling' if any(x.endswith('not found') for x in problems) else 'failed')
+            result.latency = 0.0
+            result.message = '; '.join(problems)
+            if self.progress:
+                print("Connection " + repr(result.name) + ' (' + str(result.id) + '): ' + result.status
+                      + (' - ' + result.message if problems else ''))
+            r.append(result)
+        with self.lock:
+            self.results.extend(r)
+        return r
+
+    @staticmethod
+    def endpoints(connection, airbyte_model):
+        """Returns the deployed source and destination of a connection, with None for any which doesn't exist"""
+
+        return [('source', airbyte_model.sources.get(connection.source_id)),
+                ('destination', airbyte_model.destinations.get(connection.destination_id))]
+
+    def run(self, kind, check, dtos) -> list:
+        """Checks each dto with check, reporting progress as checks finish. Returns the results in dto order."""
+
+        done = [0]
+
+        def check_one(dto):
+            result = self.check(kind, check, dto)
+            with self.lock:
+                done[0] += 1
+                self.results.append(result)
+                self.endpoint_results[(kind, result.id)] = result
+                if self.progress:
+                    print('[' + repr(done[0]) + '/' + repr(len(dtos)) + '] ' + kind.capitalize() + ' '
+                          + repr(result.name) + ' (' + str(result.id) + '): ' + result.status
+                          + ' in ' + '{:.1f}'.format(result.latency) + 's'
+                          + (' - ' + result.message if result.message and not result.succeeded else ''))
+            return result
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(check_one, dtos))
+
+    def check(self, kind, check, dto) -> CheckResult:
+        r = CheckResult(kind, dto)
+        start = time.perf_counter()
+        try:
+            response = check(dto, timeout=self.timeouts[kind])
+            if response.ok:
+                job_info = response.payload.get('jobInfo', {})
+                r.succeeded = bool(job_info.get('succeeded'))
+                r.status = 'succeeded' if r.succeeded else 'failed'
+                r.message = response.payload.get('message') or ''
+            else:
+                r.status = 'failed'
+                r.message = repr(response.status_code) + ' ' + response.message
+        except requests.exceptions.Timeout:
+            r.status = 'timeout'
+            r.message = 'no result within the check deadline'
+        except requests.exceptions.RequestException as e:
+            r.status = 'error'
+            r.message = repr(e)
+        r.latency = time.perf_counter() - start
+        return r
+
+    def summary(self) -> dict:
+        r = {'checked': len(self.results)}
+        for status in ('succeeded', 'failed', 'timeout', 'error', 'dangling'):
+            r[status] = len([x for x in self.results if x.status == status])
+        return r
+
+    def write_report(self, filename):
+        """Writes every result to filename, as CSV if it ends in .csv and as JSON otherwise"""
+
+        rows = [x.to_dict() for x in self.results]
+        if filename.strip().lower().endswith('.csv'):
+            with open(filename, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            with open(filename, 'w') as f:
+                json.dump({'summary': self.summary(), 'results': rows}, f, indent=2)
@@ -0,0 +1,87 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DTO_DELETES = {'connections': 'delete_connection', 'sources': 'delete_source', 'destinations': 'delete_destination'}
+WIPE_TIERS = [['connections'], ['sources', 'destinations']]  # connections go first, so the server never cascades
+
+
+class WipeFailure:
+    """An object which could not be deleted, and why"""
+
+    def __init__(self, kind, dto, message):
+        self.kind = kind
+        self.id, self.name = dto.get_identity()
+        self.message = message
+
+    def __repr__(self):
+        return self.kind[:-1] + ' ' + repr(self.name) + ' (' + str(self.id) + '): ' + self.message
+
+
+class WipeEngine:
+    """
+    Deletes objects from a deployment in dependency order: first the connections, then the sources and destinations,
+    with up to workers deletes in flight inside each tier. Wiping a source or destination also deletes its
+    connections. An object the deployment no longer has counts as deleted, so an interrupted wipe can simply be run
+    again. A source or destination whose connections could not all be deleted is left in place.
+    """
+
+    def __init__(self, client, workers=1):
+        self.client = client
+        self.workers = max(1, workers)
+        self.failures = []
+        self.deleted = 0
+        self.lock = threading.Lock()
+
+    def wipe(self, airbyte_model, kinds) -> list:
+        """
+        Deletes every object of the given kinds in airbyte_model, and removes them from the model. Returns failures.
+        """
+
+        doomed = {kind: dict(airbyte_model.index_for(kind)) if kind in kinds else {} for kind in DTO_DELETES}
+        for connection_id, connection in airbyte_model.connections.items():
+            if connection.source_id in doomed['sources'] or connection.destination_id in doomed['destinations']:
+                doomed['connections'][connection_id] = connection
+        for tier in WIPE_TIERS:
+            if tier == ['sources', 'destinations']:
+                self.spare_blocked(airbyte_model, doomed)
+            jobs = [(kind, dto) for kind in tier for dto in doomed[kind].values()]
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                deleted = list(executor.map(lambda job: self.delete(*job), jobs))
+            for (kind, dto), ok in zip(jobs, deleted):
+                if ok:
+                    airbyte_model.index_for(kind).pop(dto.get_identity()[0], None)
+        return self.failures
+
+    def spare_blocked(self, airbyte_model, doomed):
+        """Drops sources and destinations which still have connections from the next tier, and reports them"""
+
+        for connection in airbyte_model.connections.values():
+            for kind, dto_id in (('sources', connection.source_id), ('destinations', connection.destination_id)):
+                if dto_id in doomed[kind]:
+                    self.failures.append(WipeFailure(kind, doomed[kind].pop(dto_id),
+                                                     'connection ' + repr(connection.name) + ' still uses it'))
+
+    def delete(self, kind, dto) -> bool:
+        try:
+            response = getattr(self.client, DTO_DELETES[kind])(dto)
+        except requests.exceptions.RequestException as e:
+            return self.record(kind, dto, repr(e))
+        if response.ok or response.status_code == 404:  # 404: deleted by an earlier, interrupted wipe
+            return self.record(kind, dto)
+        return self.record(kind, dto, repr(response.status_code) + ' ' + response.message)
+
+    def record(self, kind, dto, error=None) -> bool:
+        with self.lock:
+            if error is None:
+                self.deleted += 1
+            else:
+                self.failures.append(WipeFailure(kind, dto, error))
+        return error is None
+
+    def print_summary(self):
+        print("Deleted " + repr(self.deleted) + " objects, " + repr(len(self.failures)) + " failed")
+        for failure in self.failures:
+            print("Error: unable to delete " + repr(failure))
+